@@ -19,6 +19,8 @@
 from __future__ import annotations  # for |
 
 import argparse
+import atexit
+import bisect
 import calendar
 import codecs
 import collections
@@ -27,7 +29,9 @@ import email.message
 import json
 import locale
 import logging
+import multiprocessing
 import os
+import pathlib
 import platform
 import random
 import re
@@ -43,12 +47,13 @@ import threading
 import time
 import unicodedata
 import webbrowser
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
 from enum import Enum
-from itertools import chain
-from functools import total_ordering
+from itertools import chain, islice
+from functools import lru_cache, total_ordering
 from subprocess import DEVNULL, PIPE, Popen
 from typing import Any, Dict, List, Optional, Tuple, NamedTuple, TypeAlias, TypeVar
-from collections.abc import Sequence, Set, Callable
+from collections.abc import Sequence, Set, Callable, Iterable, Iterator
 from warnings import warn
 import xml.etree.ElementTree as ET
 from urllib.parse import urlparse  # urllib3.util.parse_url() encodes netloc
@@ -71,18 +76,62 @@ __license__ = 'GPLv3'
 INTERRUPTED = False  # Received SIGINT
 DELIM = ','  # Delimiter used to store tags in DB
 SKIP_MIMES = {'.pdf', '.txt'}
+VACUUM_FREE_PAGES = 256  # Free pages tolerated in DB file before reclaiming space
+VACUUM_FREE_RATIO = 0.25  # Part of DB file that can be free before a full VACUUM (w/o incremental auto-vacuum)
+DB_PROFILES = {  # SQLite performance settings for DB connections (None leaves the current journal mode)
+    'default': {},
+    'fast': {'mmap_size': 256 << 20, 'cache_size': -(64 << 10), 'temp_store': 'MEMORY', 'synchronous': 'NORMAL', 'journal_mode': 'WAL'},
+    'safe': {'mmap_size': 0, 'cache_size': -(8 << 10), 'temp_store': 'MEMORY', 'synchronous': 'FULL', 'journal_mode': None},
+    'readonly': {'mmap_size': 1 << 30, 'cache_size': -(64 << 10), 'temp_store': 'MEMORY', 'synchronous': 'OFF', 'journal_mode': None},
+}
+FIXTAGS_CHUNK = 10000  # Records processed per chunk (and transaction) by fixtags()
+FIXTAGS_PARALLEL = 200000  # DB size from which fixtags() canonicalizes tags in a process pool
+REGEX_PARALLEL = 200000  # DB size from which regex searches are sharded among worker processes (with processes=0)
+REGEX_SHARDS = 4  # id ranges per worker process in a sharded regex search
 PROMPTMSG = 'buku (? for help): '  # Prompt message string
 
 strip_delim = lambda s, delim=DELIM, sub=' ': str(s).replace(delim, sub)
 taglist = lambda ss: sorted(set(s.lower().strip() for s in ss if (s or '').strip()))
 parse_order = lambda order: [s for ss in order for s in re.split(r'\s*,\s*', ss.strip()) if s]
-like_escape = lambda s, c='`': s.replace(c, c+c).replace('_', c+'_').replace('%', c+'%')
 split_by_marker = lambda s: re.split(r'\s+(?=[.:>#*])', s)
+# SQL table-valued expression splitting a DELIM-wrapped tags column (e.g. NEW.tags) into separate values
+sql_split_tags = lambda column: f"json_each('[' || replace(json_quote(trim({column}, '{DELIM}')), '{DELIM}', '\",\"') || ']')"
+# SQL expression extracting netloc of a URL column, same as get_netloc() (without Python callbacks, so that triggers
+# using it work in any SQLite client): leading C0 controls/spaces and tabs/newlines are skipped, a valid scheme
+# is cut off, and netloc is taken from '//' up to '/', '?' or '#' (with '//' implied if there's no scheme)
+sql_netloc = lambda column: (
+    "(SELECT NULLIF(CASE WHEN (instr(host, '[') > 0) != (instr(host, ']') > 0) THEN '' ELSE host END, '') FROM "
+    "(SELECT substr(rest, 1, instr(replace(replace(rest, '?', '/'), '#', '/') || '/', '/') - 1) AS host FROM "
+    "(SELECT CASE WHEN substr(hier, 1, 2) = '//' THEN substr(hier, 3) END AS rest FROM "
+    "(SELECT CASE WHEN p > 1 AND substr(u, 1, p - 1) GLOB '[A-Za-z]*' AND substr(u, 1, p - 1) NOT GLOB '*[^A-Za-z0-9+.-]*' "
+    "THEN substr(u, p + 1) WHEN substr(u, 1, 2) = '//' THEN u ELSE '//' || u END AS hier FROM "
+    "(SELECT u, instr(u, ':') AS p FROM (SELECT ltrim(replace(replace(replace("
+    f"{column}, char(9), ''), char(10), ''), char(13), ''), ' ' || char({', '.join(map(str, range(1, 32)))})) AS u))))))")
 
 def taglist_str(tag_str, convert=None):
     tags = taglist(tag_str.split(DELIM))
     return delim_wrap(DELIM.join(tags if not convert else taglist(convert(tags))))
 
+def fix_tags(rows):
+    """Returns (tags, id) pairs of (id, tags) rows whose tags aren't in canonical form (as parsed by parse_tags())."""
+    return [(tags, id) for id, oldtags in rows for tags in [parse_tags([oldtags])] if tags != oldtags]
+
+def mp_context():
+    """Multiprocessing context for sharded search workers (not forking, which is unsafe in a multi-threaded process)."""
+    return multiprocessing.get_context('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+def search_shard(dbfile, query, args):
+    """Returns all rows of a search query, running it in a separate read-only connection (for sharded search)."""
+    conn, cur = BukuDb.initdb(dbfile, readonly=True, db_profile='readonly')
+    try:
+        return cur.execute(query, args).fetchall()
+    finally:
+        conn.close()
+
+def merge_tags(tags, extra):
+    """Appends extra tags to a DB tags string (same as BukuDb.append_tag_at_index())."""
+    return (tags if not extra or extra == DELIM else parse_tags([(tags or DELIM) + extra[1:]]))
+
 def filter_from(values, subset, *, exclude=False):
     subset, exclude = set(subset), bool(exclude)
     return [x for x in values if (x in subset) != exclude]
@@ -135,6 +184,7 @@ MYPROXY = None  # Default proxy
 TEXT_BROWSERS = ['elinks', 'links', 'links2', 'lynx', 'w3m', 'www-browser']
 IGNORE_FF_BOOKMARK_FOLDERS = frozenset(["placesRoot", "bookmarksMenuFolder"])
 PERMANENT_REDIRECTS = {301, 308}
+SQL_PROFILER = None  # SqlProfiler used for new DB connections (see enable_sql_profiling())
 
 SCHEME_HTTP = 'http'
 
@@ -406,6 +456,13 @@ class FetchResult(NamedTuple):
         return DELIM.join(taglist((keywords and self.keywords or '').split(DELIM) + [_redirect, _error]))
 
 
+class AddRecsResult(NamedTuple):
+    added: int = 0                      # new bookmarks
+    updated: int = 0                    # existing bookmarks that were modified
+    skipped: int = 0                    # invalid entries, and existing bookmarks left unchanged
+    error: Optional[str] = None         # error that stopped the insertion (counts cover records processed before it)
+
+
 class BookmarkVar(NamedTuple):
     """Bookmark data named tuple"""
     id: int
@@ -434,6 +491,502 @@ class BookmarkVar(NamedTuple):
 bookmark_vars = lambda xs: ((x if isinstance(x, BookmarkVar) else BookmarkVar(*x)) for x in xs)
 
 
+class SearchResults(Sequence):
+    """Search results fetched lazily, a page at a time (with the number of matches counted only when requested).
+
+    search is a BukuDb search method supporting limit, offset, count_only & randomize parameters;
+    other arguments are passed to it as-is. Fetched pages are cached."""
+
+    def __init__(self, search: Callable[..., Any], *args, page_size: int = 10, **kwargs):
+        self._search, self._args, self._kwargs = search, args, kwargs
+        self.page_size = max(1, page_size)
+        self._pages: Dict[int, List[BookmarkVar]] = {}
+        self._count: Optional[int] = None
+
+    def _page(self, n: int) -> List[BookmarkVar]:
+        if n not in self._pages:
+            self._pages[n] = page = self._search(*self._args, **self._kwargs, limit=self.page_size, offset=n * self.page_size)
+            if len(page) < self.page_size and (page or n == 0):  # the last page
+                self._count = n * self.page_size + len(page)
+        return self._pages[n]
+
+    @property
+    def known_count(self) -> Optional[int]:
+        """Number of matches if it's known already (i.e. without counting them), otherwise None."""
+        return self._count
+
+    def __len__(self) -> int:
+        if self._count is None:
+            self._count = self._search(*self._args, **self._kwargs, count_only=True)
+        return self._count
+
+    def __bool__(self) -> bool:
+        return bool(self._page(0))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if (index.start or 0) < 0 or index.stop is None or index.stop < 0 or (index.step or 1) < 0:
+                return [self[i] for i in range(*index.indices(len(self)))]
+            items = []
+            for i in range(index.start or 0, index.stop, index.step or 1):
+                page = self._page(i // self.page_size)
+                if i % self.page_size >= len(page):
+                    break
+                items += [page[i % self.page_size]]
+            return items
+        if index < 0:
+            index += len(self)
+        page = self._page(max(0, index) // self.page_size)
+        if index < 0 or index % self.page_size >= len(page):
+            raise IndexError('search result index out of range')
+        return page[index % self.page_size]
+
+    def __iter__(self) -> Iterator[BookmarkVar]:
+        n, page = 0, self._page(0)
+        while True:
+            yield from page
+            if len(page) < self.page_size:
+                return
+            n, page = n + 1, self._page(n + 1)
+
+    def sample(self, size: int) -> List[BookmarkVar]:
+        """Picks up to size random matches (within the DB)."""
+        return self._search(*self._args, **self._kwargs, limit=size, randomize=True)
+
+    def tolist(self) -> List[BookmarkVar]:
+        """Returns all matches, fetching them with a single query (unless all pages are cached already)."""
+        if self._count is not None and all(n in self._pages for n in range(0, -(-self._count // self.page_size))):
+            return list(self)
+        items = self._search(*self._args, **self._kwargs)
+        self._count = len(items)
+        self._pages = {n: items[i:i + self.page_size] for n, i in enumerate(range(0, max(1, len(items)), self.page_size))}
+        return items
+
+
+_ASCII_LOWER = {c: c + 32 for c in range(ord('A'), ord('Z') + 1)}  # SQLite LOWER() & LIKE only fold ASCII letters
+_WORD = re.compile(r'\w+')
+
+
+class MemoryIndex:
+    """A resident in-memory copy of bookmarks, for serving repeated (interactive) searches without querying the DB.
+
+    Records are stored as columns (along with ASCII-lowercased copies of text fields) and interned tags;
+    an inverted index of word tokens (for narrowing down non-deep searches) is built on first use.
+    All data is reloaded once the DB changes (as reported by PRAGMA data_version, or by the connection itself).
+
+    Search methods return the same results as their BukuDb counterparts; queries that can't be served
+    from memory (ranked by the full-text index, or with exclusion keywords) are passed on to the DB."""
+
+    FIELDS = ('url', 'metadata', 'tags', 'desc')
+
+    def __init__(self, bdb: 'BukuDb'):
+        self.bdb = bdb
+        self._state = None
+        self._last = (None, [])  # (key, results) of the last search
+
+    def _db_state(self):
+        with self.bdb.lock:
+            return self.bdb.cur.execute('PRAGMA data_version').fetchone()[0], self.bdb.conn.total_changes
+
+    def load(self, force: bool = False) -> bool:
+        """(Re)loads bookmarks from the DB if it changed since the last load (or if force is True).
+        Returns True if the data was reloaded."""
+        state = self._db_state()
+        if state == self._state and not force:
+            return False
+        with self.bdb.lock:
+            rows = self.bdb.cur.execute('SELECT id, url, metadata, tags, desc, flags, netloc FROM bookmarks ORDER BY id').fetchall()
+        self.records = [BookmarkVar(*row[:6]) for row in rows]
+        self.netlocs = [row[6] for row in rows]
+        self.raw = {field: [row[i] for row in rows] for i, field in enumerate(self.FIELDS, 1)}
+        self.lower = {field: [s and s.translate(_ASCII_LOWER) for s in values] for field, values in self.raw.items()}
+        self.tag_ids: Dict[str, int] = {}  # ASCII-lowercased name -> tag id
+        self.tag_names: List[str] = []     # tag id -> name (as first encountered)
+        self.row_tags: List[Tuple[int, ...]] = []
+        for tags in self.raw['tags']:
+            ids = set()
+            for name in (tags or '').strip(DELIM).split(DELIM):
+                if name:
+                    key = name.translate(_ASCII_LOWER)
+                    if key not in self.tag_ids:
+                        self.tag_ids[key] = len(self.tag_names)
+                        self.tag_names += [name]
+                    ids.add(self.tag_ids[key])
+            self.row_tags += [tuple(ids)]
+        self._joined, self._tag_rows, self._tag_all, self._postings, self._nonascii = {}, None, None, None, None
+        self._state, self._last = state, (None, [])
+        return True
+
+    def _find(self, field: str, param: str) -> List[int]:
+        """Rows where the (lowercased) field contains param; same as SQL LIKE for non-wildcard patterns."""
+        if field not in self._joined:
+            values, starts, pos = [s or '' for s in self.lower[field]], [], 0
+            for s in values:
+                starts += [pos]
+                pos += len(s) + 1
+            self._joined[field] = ('\0'.join(values), starts)
+        text, starts = self._joined[field]
+        rows, pos = [], text.find(param)
+        while pos >= 0:
+            rows += [bisect.bisect_right(starts, pos) - 1]
+            pos = (text.find(param, starts[rows[-1] + 1]) if rows[-1] + 1 < len(starts) else -1)
+        return rows
+
+    def _candidates(self, field: str, param: str) -> Optional[Set[int]]:
+        """Narrows down rows for a non-deep (word boundary) match of param via the token index
+        (returns None if it can't be used for param)."""
+        if not param.isascii():
+            return None
+        if self._postings is None:
+            postings, self._nonascii = collections.defaultdict(list), set()
+            for row in range(len(self.records)):
+                text = ' '.join(self.raw[k][row] or '' for k in self.FIELDS)
+                if not text.isascii():  # case-insensitive matching of non-ASCII text is not limited to ASCII tokens
+                    self._nonascii.add(row)
+                    continue
+                for token in set(_WORD.findall(text.lower())):
+                    postings[token].append(row)
+            self._postings = dict(postings)
+        _bounded = (lambda c: field == 'tags' or c.isalnum())
+        tokens = {m[0].lower() for m in _WORD.finditer(param)
+                  if (m.start() > 0 or _bounded(param[0])) and (m.end() < len(param) or _bounded(param[-1]))}
+        if not tokens:
+            return None
+        rows = None
+        for token in sorted(tokens, key=lambda s: len(self._postings.get(s, ()))):
+            rows = (set(self._postings.get(token, ())) if rows is None else rows.intersection(self._postings.get(token, ())))
+            if not rows:
+                break
+        return rows | self._nonascii
+
+    @staticmethod
+    def _like_regex(pattern: str) -> re.Pattern:
+        """Converts a LIKE pattern (with '%' & '_' being wildcards) into a regex for searching values
+        (ignoring case of ASCII letters only, same as SQLite)."""
+        return re.compile('.*'.join('.'.join(map(re.escape, s.split('_'))) for s in pattern.split('%')),
+                          re.DOTALL | re.IGNORECASE | re.ASCII)
+
+    def _like(self, values: List[Optional[str]], pattern: str, rows: Iterable[int]) -> List[int]:
+        """Rows where (lowercased) values match pattern with LIKE semantics."""
+        regex = self._like_regex(pattern)
+        return [row for row in rows if values[row] is not None and regex.search(values[row])]
+
+    def _match(self, tokens, regex: bool) -> Set[int]:
+        """Rows matched by a search clause (see BukuDb._search_clause())."""
+        matched = set()
+        for (field, _, *params), conditions in zip(tokens, self.bdb._search_conditions(tokens, regex=regex)):
+            rows = None
+            for (_, op, arg), param in zip(conditions, params):
+                if op == 'LIKE' and not re.search('[%_\0]', arg):
+                    found = self._find(field, arg.translate(_ASCII_LOWER))
+                    rows = set(found if rows is None else rows.intersection(found))
+                elif op == 'LIKE':
+                    rows = set(self._like(self.lower[field], arg, (range(len(self.records)) if rows is None else rows)))
+                else:
+                    narrowed = (None if regex else self._candidates(field, param))
+                    rows = (narrowed if rows is None else rows if narrowed is None else rows & narrowed)
+                    values, pattern = self.raw[field], compile_regex(arg)
+                    rows = {row for row in (range(len(self.records)) if rows is None else rows)
+                            if values[row] is not None and pattern.search(values[row])}
+                if not rows:
+                    break
+            matched |= rows or set()
+        return matched
+
+    def _sort_key(self, order: List[str]) -> Callable[[int], list]:
+        """Row sorting key mirroring BukuDb._order_keys() (SQL NULLs being sorted first)."""
+        keys = self.bdb._ordering(order)
+        keys += ([] if any(field == 'id' for field, _ in keys) else [('id', True)])
+        tags, getters = self.lower['tags'], []
+        for field, asc in keys:
+            if field.startswith('#'):
+                get = (lambda row, regex=self._like_regex(f'%,{field[1:]},%'):
+                       tags[row] and int(bool(regex.search(tags[row]))))
+            elif field == 'netloc':  # COLLATE NOCASE
+                get = (lambda row: self.netlocs[row] and self.netlocs[row].translate(_ASCII_LOWER))
+            elif field in self.lower:
+                get = self.lower[field].__getitem__
+            else:
+                get = (lambda row, field=field: getattr(self.records[row], field))
+            getters += [(get, asc)]
+        return lambda row: [SortKey((value is not None, value), ascending=asc) for get, asc in getters for value in [get(row)]]
+
+    def _results(self, key: tuple, search: Callable[[], Tuple[List[int], Dict[int, int]]],
+                 order: List[str], limit: Optional[int], offset: int, count_only: bool, randomize: bool) -> List[BookmarkVar] | int:
+        """Runs search (producing a list of rows and their scores), caching ranked results of the last query for paging."""
+        self.load()
+        if self._last[0] != key:
+            rows, scores = search()
+            _key = self._sort_key(order)
+            rows.sort(key=(_key if not scores else lambda row: [-scores[row]] + _key(row)))
+            self._last = (key, [self.records[row] for row in rows])
+        results = self._last[1]
+        if count_only:
+            return len(results)
+        if randomize:
+            results = random.sample(results, len(results) if limit is None else min(offset + limit, len(results)))
+        return results[offset:(None if limit is None else offset + limit)]
+
+    def searchdb(
+            self,
+            keywords: List[str],
+            all_keywords: bool = False,
+            deep: bool = False,
+            regex: bool = False,
+            markers: bool = False,
+            order: List[str] = ['+id'],
+            *,
+            limit: Optional[int] = None,
+            offset: int = 0,
+            count_only: bool = False,
+            randomize: bool = False,
+    ) -> List[BookmarkVar] | int:
+        """Same as BukuDb.searchdb()."""
+        paging = {'limit': limit, 'offset': offset, 'count_only': count_only, 'randomize': randomize}
+        if self.bdb._has_table('bookmarks_fts'):  # results are ranked by relevance
+            return self.bdb.searchdb(keywords, all_keywords, deep, regex, markers, order, **paging)
+
+        def search():
+            tokenlists = [self.bdb._search_tokens(s, deep=deep, markers=markers) for s in keywords]
+            clauses = [self._match(tokens, regex) for tokens in tokenlists if tokens]
+            if not clauses:
+                return [], {}
+            if regex or not all_keywords:
+                scores = collections.Counter(row for rows in clauses for row in rows)
+                return list(scores), scores
+            if keywords == ['blank']:
+                return [row for row, x in enumerate(self.records) if x.title == '' or x.tags_raw == DELIM], {}
+            if keywords == ['immutable']:
+                return [row for row, x in enumerate(self.records) if x.flags & FLAG_IMMUTABLE], {}
+            return list(set.intersection(*clauses)), {}
+
+        try:
+            return self._results(('searchdb', tuple(keywords), all_keywords, deep, regex, markers, tuple(order)),
+                                 search, order, **paging)
+        except re.error as e:
+            LOGERR(e)
+            return (0 if count_only else [])
+
+    def search_by_tag(
+            self,
+            tags: Optional[str],
+            order: List[str] = ['+id'],
+            *,
+            without: Optional[List[str]] = None,
+            deep: bool = False,
+            markers: bool = False,
+            limit: Optional[int] = None,
+            offset: int = 0,
+            count_only: bool = False,
+            randomize: bool = False,
+    ) -> List[BookmarkVar] | int:
+        """Same as BukuDb.search_by_tag()."""
+        paging = {'limit': limit, 'offset': offset, 'count_only': count_only, 'randomize': randomize}
+        if without:
+            return self.bdb.search_by_tag(tags, order, without=without, deep=deep, markers=markers, **paging)
+        if tags is None or tags in ('', DELIM):
+            return (0 if count_only else [])
+        qargs, search_operator, excluded_tags = prep_tag_search(tags)
+        if search_operator is None:
+            LOGERR("Cannot use both '+' and ',' in same search")
+            return (0 if count_only else [])
+
+        def search():
+            _tags = [s.strip(DELIM) for s in qargs]
+            if search_operator == 'AND':  # an empty tag is matched by any record
+                _tags = [s for s in _tags if s]
+            if _tags and all(_tags):  # looking up interned tags
+                if self._tag_rows is None:
+                    self._tag_rows = [[] for _ in self.tag_names]
+                    for row, ids in enumerate(self.row_tags):
+                        for id in ids:
+                            self._tag_rows[id].append(row)
+                ids = [self.tag_ids.get(s.translate(_ASCII_LOWER)) for s in _tags]
+                scores = collections.Counter(row for id in ids if id is not None for row in self._tag_rows[id])
+                rows = [row for row, score in scores.items() if search_operator != 'AND' or score == len(_tags)]
+            else:
+                matched = [set(self._like(self.lower['tags'], f'%{tag}%', range(len(self.records)))) for tag in qargs]
+                if search_operator == 'AND':
+                    rows, scores = list(set.intersection(*matched)), None
+                else:
+                    scores = collections.Counter(row for rows in matched for row in rows)
+                    rows = list(scores)
+            if excluded_tags:
+                pattern, values = compile_regex(excluded_tags), self.raw['tags']
+                rows = [row for row in rows if values[row] is None or not pattern.search(values[row])]
+            return rows, (scores if search_operator != 'AND' else {})
+
+        return self._results(('search_by_tag', tags, tuple(order)), search, order, **paging)
+
+    def get_tag_all(self):
+        """Same as BukuDb.get_tag_all() (except for tag names being spelled as in the earliest bookmark)."""
+        self.load()
+        if self._tag_all is None:
+            counts = collections.Counter(self.tag_names[id] for ids in self.row_tags for id in ids)
+            untagged = sum(1 for ids in self.row_tags if not ids)
+            unique_tags = sorted(counts)
+            dic = ({'': untagged} if untagged else {})
+            dic.update((tag, counts[tag]) for tag in unique_tags)
+            self._tag_all = (unique_tags, dic)
+        return list(self._tag_all[0]), dict(self._tag_all[1])
+
+    def sample(self, size: int) -> List[BookmarkVar]:
+        """Picks up to size random bookmarks."""
+        self.load()
+        return random.sample(self.records, min(size, len(self.records)))
+
+
+class SqlProfiler:
+    """Collects timing statistics (and query plans) of SQL statements executed via profiled connections.
+
+    Statements are grouped by their text (with whitespace collapsed, and lists of placeholders shortened);
+    for each one, number of calls, wall time (including fetching results), number of rows returned,
+    shapes of passed arguments, and its query plan (with full-table scans flagged) are recorded.
+    """
+
+    def __init__(self, *, explain: bool = True):
+        self.explain = explain
+        self.stats = {}  # type: Dict[str, Dict[str, Any]]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(sql: str) -> str:
+        return re.sub(r'\?(\s*,\s*\?)+', '?, ...', ' '.join(sql.split()))
+
+    @staticmethod
+    def args_shape(args, many: int = 0) -> str:
+        shape = ('{' + ', '.join(f'{k}: {type(v).__name__}' for k, v in args.items()) + '}' if isinstance(args, dict) else
+                 '(' + ', '.join(type(v).__name__ for v in (args or ())) + ')')
+        return (shape if not many else f'{many} × {shape}')
+
+    def _plan(self, conn: sqlite3.Connection, sql: str, args) -> Optional[List[str]]:
+        if not re.match(r'\s*(SELECT|WITH|INSERT|UPDATE|DELETE|REPLACE)\b', sql, re.IGNORECASE):
+            return None
+        try:
+            return [row[-1] for row in sqlite3.Cursor(conn).execute('EXPLAIN QUERY PLAN ' + sql, args or ())]
+        except sqlite3.Error:
+            return None
+
+    def record(self, conn: sqlite3.Connection, sql: str, args=None, *, many: int = 0, elapsed: float = 0, rows: int = 0):
+        """Accounts for a statement execution (or fetching more of its results, if called with the same stats)."""
+        key = self.normalize(sql)
+        with self._lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                plan = (self._plan(conn, sql, args) if self.explain else None)
+                stats = self.stats[key] = {'statement': key, 'calls': 0, 'time': 0.0, 'max_time': 0.0, 'rows': 0,
+                                           'args': set(), 'plan': plan,
+                                           'full_scans': [m[1] for m in (re.fullmatch(r'SCAN ([^\s(]\S*)', s) for s in plan or []) if m]}
+            stats['calls'] += 1
+            stats['args'].add(self.args_shape(args, many))
+            stats['time'] += elapsed
+            stats['max_time'] = max(stats['max_time'], elapsed)
+            stats['rows'] += rows
+            return stats
+
+    def report(self, limit: int = 20, file=None):
+        """Prints a summary table of the slowest statements (to stderr by default)."""
+        with self._lock:
+            stats = sorted(self.stats.values(), key=lambda x: -x['time'])
+        file = file or sys.stderr
+        print(f'SQL profile: {sum(x["calls"] for x in stats)} calls of {len(stats)} statements, '
+              f'{sum(x["time"] for x in stats) * 1000:.1f} ms total', file=file)
+        print(f'{"calls":>7} {"total ms":>10} {"max ms":>9} {"rows":>8}  statement', file=file)
+        for x in stats[:limit]:
+            scans = ('' if not x['full_scans'] else f'  [SCAN {", ".join(x["full_scans"])}]')
+            print(f'{x["calls"]:>7} {x["time"] * 1000:>10.2f} {x["max_time"] * 1000:>9.2f} {x["rows"]:>8}  '
+                  f'{textwrap.shorten(x["statement"], 100, placeholder=" ...")}{scans}', file=file)
+
+    def dump(self, filepath: str):
+        """Writes collected statistics into a JSON file."""
+        with self._lock:
+            stats = [{**x, 'time': round(x['time'] * 1000, 3), 'max_time': round(x['max_time'] * 1000, 3), 'args': sorted(x['args'])}
+                     for x in sorted(self.stats.values(), key=lambda x: -x['time'])]
+        with open(filepath, 'w', encoding='utf-8') as fp:
+            json.dump({'unit': 'ms', 'statements': stats}, fp, indent=2, ensure_ascii=False)
+
+
+class _ProfilingCursor(sqlite3.Cursor):
+    _stats = None
+
+    def _run(self, method, sql, args, many=0):
+        start = time.perf_counter()
+        try:
+            return method(self, sql, *args)
+        finally:
+            self._stats = self.connection.profiler.record(self.connection, sql, (args or [None])[0], many=many,
+                                                          elapsed=time.perf_counter() - start)
+
+    def execute(self, sql, *args):
+        return self._run(sqlite3.Cursor.execute, sql, args)
+
+    def executemany(self, sql, rows):
+        rows = list(rows)
+        return self._run(lambda cur, sql, *_: sqlite3.Cursor.executemany(cur, sql, rows), sql, rows[:1], many=len(rows))
+
+    def executescript(self, script):
+        return self._run(lambda cur, sql: sqlite3.Cursor.executescript(cur, sql), script, ())
+
+    def _fetched(self, method, *args):
+        start = time.perf_counter()
+        result = method(self, *args)
+        if self._stats is not None:
+            with self.connection.profiler._lock:
+                self._stats['time'] += time.perf_counter() - start
+                self._stats['rows'] += (len(result) if isinstance(result, list) else result is not None)
+        return result
+
+    def fetchone(self):
+        return self._fetched(sqlite3.Cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._fetched(sqlite3.Cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._fetched(sqlite3.Cursor.fetchall)
+
+    def __next__(self):
+        row = self._fetched(sqlite3.Cursor.fetchone)
+        if row is None:
+            raise StopIteration
+        return row
+
+
+class _ProfilingConnection(sqlite3.Connection):
+    profiler = None  # type: SqlProfiler
+
+    def cursor(self, factory=_ProfilingCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, *args):
+        return self.cursor().execute(sql, *args)
+
+    def executemany(self, sql, rows):
+        return self.cursor().executemany(sql, rows)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            self.profiler.record(self, 'COMMIT', elapsed=time.perf_counter() - start)
+
+
+def enable_sql_profiling(dump: Optional[str] = None, *, explain: bool = True) -> SqlProfiler:
+    """Enables SQL profiling for BukuDb instances created afterwards (unless already enabled).
+    A summary is printed to stderr on exit; collected statistics are also written to a JSON file if specified."""
+    global SQL_PROFILER
+    if SQL_PROFILER is None:
+        SQL_PROFILER = SqlProfiler(explain=explain)
+        atexit.register(SQL_PROFILER.report)
+        if dump:
+            atexit.register(SQL_PROFILER.dump, dump)
+    return SQL_PROFILER
+
+
 class BukuDb:
     """Abstracts all database operations.
 
@@ -453,7 +1006,9 @@ class BukuDb:
 
     def __init__(
             self, json: Optional[str] = None, field_filter: int = 0, chatty: bool = False,
-            dbfile: Optional[str] = None, colorize: bool = True, default_scheme: str = SCHEME_HTTP) -> None:
+            dbfile: Optional[str] = None, colorize: bool = True, default_scheme: str = SCHEME_HTTP,
+            readonly: bool = False, profiler: Optional[SqlProfiler] = None, db_profile: Optional[str] = None,
+            immutable: bool = False) -> None:
         """Database initialization API.
 
         Parameters
@@ -470,16 +1025,39 @@ class BukuDb:
             Indicates whether color should be used in output. Default is True.
         default_scheme : str
             Scheme to assume if missing from bookmark's URI. Default is http.
+        readonly : bool
+            Open an existing DB for reading only (skipping initialization). Default is False.
+        profiler : SqlProfiler, optional
+            Collect statistics of executed SQL statements. Defaults to the one enabled via
+            enable_sql_profiling() or $BUKU_PROFILE_SQL (a path to a .json file to dump them into, or 1).
+        db_profile : str, optional
+            Name of SQLite performance profile (one of DB_PROFILES; 'readonly' implies readonly=True).
+            Defaults to $BUKU_DB_PROFILE, or 'default' (which leaves SQLite defaults).
+        immutable : bool
+            Open the DB as immutable (implies readonly=True; SQLite skips all locking and change detection,
+            so the DB file must not be modified while in use). Default is False.
         """
 
+        if not (profiler or SQL_PROFILER) and os.environ.get('BUKU_PROFILE_SQL', '0') != '0':
+            _dump = os.environ['BUKU_PROFILE_SQL']
+            enable_sql_profiling(_dump if _dump.endswith('.json') else None)
+        self.profiler = profiler or SQL_PROFILER
+        db_profile = db_profile or os.environ.get('BUKU_DB_PROFILE') or 'default'
+        if db_profile not in DB_PROFILES:
+            LOGERR('Unknown DB profile: %s', db_profile)
+            db_profile = 'default'
+        self.readonly = readonly or immutable or db_profile == 'readonly'
+        self.db_profile = db_profile
         self.json = json
         self.field_filter = field_filter
         self.chatty = chatty
         self.colorize = colorize
-        self.conn, self.cur = BukuDb.initdb(dbfile, self.chatty)
+        self.conn, self.cur = BukuDb.initdb(dbfile, self.chatty, readonly=self.readonly, immutable=immutable,
+                                            profiler=self.profiler, db_profile=db_profile)
         self.lock = threading.RLock()  # repeatable lock, only blocks *concurrent* access
         self._to_export = None  # type: Optional[Dict[str, str | BookmarkVar]]
         self._to_delete = None  # type: Optional[int | Sequence[int] | Set[int] | range]
+        self._sharded = (None, None, [])  # (key, DB state, matches) of the last sharded search
         self.default_scheme = default_scheme
 
     @staticmethod
@@ -510,7 +1088,8 @@ class BukuDb:
         return (os.path.join(data_home, 'buku') if data_home else os.getcwd())
 
     @staticmethod
-    def initdb(dbfile: Optional[str] = None, chatty: bool = False) -> Tuple[sqlite3.Connection, sqlite3.Cursor]:
+    def initdb(dbfile: Optional[str] = None, chatty: bool = False, *, readonly: bool = False, immutable: bool = False,
+               profiler: Optional[SqlProfiler] = None, db_profile: str = 'default') -> Tuple[sqlite3.Connection, sqlite3.Cursor]:
         """Initialize the database connection.
 
         Create DB file and/or bookmarks table if they don't exist.
@@ -522,6 +1101,14 @@ class BukuDb:
             Custom database file path (including filename).
         chatty : bool
             If True, shows informative message on DB creation.
+        readonly : bool
+            If True, opens an existing DB in read-only mode, without creating/updating the schema.
+        immutable : bool
+            If True, opens an existing DB as immutable (read-only, without locking).
+        profiler : SqlProfiler, optional
+            If specified, statements executed via the connection are profiled.
+        db_profile : str
+            Name of SQLite performance profile to apply (see DB_PROFILES). Default is 'default'.
 
         Returns
         -------
@@ -561,29 +1148,277 @@ class BukuDb:
 
         try:
             # Create a connection
-            conn = sqlite3.connect(dbfile, check_same_thread=False)
-            conn.create_function('REGEXP', 2, regexp)
-            conn.create_function('NETLOC', 1, get_netloc)
+            factory = (_ProfilingConnection if profiler else sqlite3.Connection)
+            if readonly or immutable:
+                _params = ('mode=ro&immutable=1' if immutable else 'mode=ro')
+                conn = sqlite3.connect(f'file:{dbfile}?{_params}', uri=True, check_same_thread=False, factory=factory)
+            else:
+                conn = sqlite3.connect(dbfile, uri=True, check_same_thread=False, factory=factory)  # (URIs are used in ATTACH)
+            if profiler:
+                conn.profiler = profiler
+            conn.create_function('REGEXP', 2, regexp, deterministic=True)
+            conn.create_function('MERGE_TAGS', 2, merge_tags, deterministic=True)
+            conn.create_function('PARSE_TAGS', 1, lambda tags: parse_tags([tags]), deterministic=True)
             cur = conn.cursor()
-
-            # Create table if it doesn't exist
-            # flags: designed to be extended in future using bitwise masks
-            # Masks:
-            #     0b00000001: set title immutable
-            cur.execute('CREATE TABLE if not exists bookmarks ('
-                        'id integer PRIMARY KEY, '
-                        'URL text NOT NULL UNIQUE, '
-                        'metadata text default \'\', '
-                        'tags text default \',\', '
-                        'desc text default \'\', '
-                        'flags integer default 0)')
-            conn.commit()
+            for pragma, value in DB_PROFILES[db_profile].items():
+                if value is not None and not ((readonly or immutable) and pragma == 'journal_mode'):
+                    cur.execute(f'PRAGMA {pragma} = {value}')
+            BukuDb._migrate(conn, cur, readonly=readonly or immutable)
         except Exception as e:
             LOGERR('initdb(): %s', e)
             raise e
 
         return (conn, cur)
 
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection, cur: sqlite3.Cursor, *, readonly: bool = False):
+        """Upgrade the DB schema to the current version.
+
+        Each of BukuDb.MIGRATIONS is applied (in order, in a separate transaction) unless
+        PRAGMA user_version says it was already; so an up-to-date DB only costs a single PRAGMA query.
+        Migration steps are idempotent, since DBs created before versioning was introduced have user_version 0.
+
+        A read-only DB file can't be upgraded; instead, the missing parts of its schema are emulated
+        by temporary tables (and views) of the connection, filled in from bookmarks when it's opened.
+
+        Parameters
+        ----------
+        conn : sqlite3.Connection
+            DB connection (with custom SQL functions registered).
+        cur : sqlite3.Cursor
+            Cursor of the DB connection.
+        readonly : bool
+            True if the connection is read-only. Default is False.
+        """
+
+        version = cur.execute('PRAGMA user_version').fetchone()[0]
+        if version >= len(BukuDb.MIGRATIONS):
+            return
+        if readonly:
+            LOGDBG('Emulating DB schema version %d (file version is %d)', len(BukuDb.MIGRATIONS), version)
+            for step in BukuDb.MIGRATIONS[max(1, version):]:  # bookmarks table is required to exist
+                step(cur, temp=True)
+            return
+        if version == 0:  # only takes effect in a new DB (or on next VACUUM of an existing one)
+            cur.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        for version, step in enumerate(BukuDb.MIGRATIONS[version:], start=version + 1):
+            LOGDBG('Upgrading DB schema to version %d', version)
+            try:
+                cur.execute('BEGIN')
+                step(cur)
+                cur.execute(f'PRAGMA user_version = {version}')
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    @staticmethod
+    def _init_bookmarks_table(cur: sqlite3.Cursor):
+        """Create bookmarks table if it doesn't exist.
+
+        Parameters
+        ----------
+        cur : sqlite3.Cursor
+            Cursor of the DB connection.
+        """
+
+        # flags: designed to be extended in future using bitwise masks
+        # Masks:
+        #     0b00000001: set title immutable
+        cur.execute('CREATE TABLE if not exists bookmarks ('
+                    'id integer PRIMARY KEY, '
+                    'URL text NOT NULL UNIQUE, '
+                    'metadata text default \'\', '
+                    'tags text default \',\', '
+                    'desc text default \'\', '
+                    'flags integer default 0)')
+
+    @staticmethod
+    def _init_netloc_column(cur: sqlite3.Cursor, temp: bool = False):
+        """Add the indexed netloc column to bookmarks table if it doesn't exist.
+
+        The column stores netloc of the URL (see sql_netloc()) and is kept in sync with it by triggers,
+        so ordering and grouping by netloc doesn't require parsing every URL.
+        Existing records are filled in when the column is first added.
+
+        Parameters
+        ----------
+        cur : sqlite3.Cursor
+            Cursor of the DB connection.
+        temp : bool
+            If True, bookmarks table is shadowed by a temporary view calculating netloc, for a read-only connection.
+        """
+
+        missing = not any(name == 'netloc' for _, name, *_ in cur.execute('PRAGMA main.table_info(bookmarks)'))
+        if temp:
+            if missing:
+                cur.execute(f'CREATE TEMP VIEW bookmarks AS SELECT *, {sql_netloc("url")} COLLATE NOCASE AS netloc FROM main.bookmarks')
+            return
+        if missing:
+            cur.execute('ALTER TABLE bookmarks ADD COLUMN netloc text COLLATE NOCASE')
+            cur.execute(f'UPDATE bookmarks SET netloc = {sql_netloc("url")}')
+        cur.execute('CREATE INDEX if not exists bookmarks_netloc ON bookmarks (netloc)')
+
+        _netloc = sql_netloc('NEW.url')
+        _sync = f'WHEN NEW.netloc IS NOT {_netloc} BEGIN UPDATE bookmarks SET netloc = {_netloc} WHERE id = NEW.id; END'
+        cur.execute(f'CREATE TRIGGER if not exists bookmarks_netloc_insert AFTER INSERT ON bookmarks {_sync}')
+        cur.execute(f'CREATE TRIGGER if not exists bookmarks_netloc_update AFTER UPDATE OF url, netloc ON bookmarks {_sync}')
+
+    @staticmethod
+    def _init_tag_index(cur: sqlite3.Cursor, temp: bool = False):
+        """Create the normalized tag index (tags & bookmark_tags tables) if it doesn't exist.
+
+        The index mirrors bookmarks.tags and is kept in sync with it by triggers,
+        so tag lookups can be done via indexed joins instead of scanning all records.
+        Existing records are indexed when the tables are first created.
+
+        Parameters
+        ----------
+        cur : sqlite3.Cursor
+            Cursor of the DB connection.
+        temp : bool
+            If True, the tables are created as temporary ones (a snapshot, without triggers), for a read-only connection.
+        """
+
+        exists = cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'bookmark_tags'").fetchone()
+        if temp and exists:
+            return
+        cur.execute(f'CREATE {"TEMP " if temp else ""}TABLE if not exists tags ('
+                    'id integer PRIMARY KEY, '
+                    'name text NOT NULL COLLATE NOCASE UNIQUE)')
+        cur.execute(f'CREATE {"TEMP " if temp else ""}TABLE if not exists bookmark_tags ('
+                    'tag_id integer NOT NULL, '
+                    'bookmark_id integer NOT NULL, '
+                    'PRIMARY KEY (tag_id, bookmark_id)) WITHOUT ROWID')
+        cur.execute('CREATE INDEX if not exists bookmark_tags_bookmark_id ON bookmark_tags (bookmark_id)')
+
+        # statements indexing tags of rec (selected from source); avoiding 'OR IGNORE' as it's overridden by
+        # the conflict resolution of the triggering statement (e.g. 'INSERT OR REPLACE', or an upsert)
+        _link = lambda rec, source='': [
+            f"INSERT INTO tags (name) SELECT MIN(value) FROM {source}{sql_split_tags(rec + '.tags')} AS tag "
+            "WHERE value != '' AND NOT EXISTS (SELECT 1 FROM tags WHERE name = tag.value) GROUP BY LOWER(value)",
+            'INSERT INTO bookmark_tags (tag_id, bookmark_id) '
+            f'SELECT DISTINCT tags.id, {rec}.id FROM {source}{sql_split_tags(rec + ".tags")} AS tag JOIN tags ON tags.name = tag.value '
+            f'WHERE NOT EXISTS (SELECT 1 FROM bookmark_tags WHERE tag_id = tags.id AND bookmark_id = {rec}.id)']
+        if not exists:  # indexing records added before the tag index existed
+            for query in _link('bookmarks', 'bookmarks, '):
+                cur.execute(query)
+        if temp:
+            return
+
+        _body = lambda *queries: 'BEGIN ' + ''.join(f'{query}; ' for query in queries) + 'END'
+        cur.execute('CREATE TRIGGER if not exists bookmarks_tags_insert AFTER INSERT ON bookmarks ' +
+                    _body(*_link('NEW')))
+        cur.execute('CREATE TRIGGER if not exists bookmarks_tags_update AFTER UPDATE OF tags ON bookmarks '
+                    'WHEN OLD.tags IS NOT NEW.tags ' + _body(
+                        'DELETE FROM bookmark_tags WHERE bookmark_id = OLD.id AND tag_id NOT IN ('
+                        f'SELECT tags.id FROM {sql_split_tags("NEW.tags")} AS tag JOIN tags ON tags.name = tag.value)',
+                        'UPDATE bookmark_tags SET bookmark_id = NEW.id WHERE bookmark_id = OLD.id AND OLD.id != NEW.id',
+                        *_link('NEW')))
+        cur.execute('CREATE TRIGGER if not exists bookmarks_tags_move AFTER UPDATE OF id ON bookmarks '
+                    'WHEN OLD.id != NEW.id AND OLD.tags IS NEW.tags ' +
+                    _body('UPDATE bookmark_tags SET bookmark_id = NEW.id WHERE bookmark_id = OLD.id'))
+        cur.execute('CREATE TRIGGER if not exists bookmarks_tags_delete AFTER DELETE ON bookmarks ' +
+                    _body('DELETE FROM bookmark_tags WHERE bookmark_id = OLD.id'))
+        cur.execute('CREATE TRIGGER if not exists bookmark_tags_cleanup AFTER DELETE ON bookmark_tags '
+                    'WHEN NOT EXISTS (SELECT 1 FROM bookmark_tags WHERE tag_id = OLD.tag_id) ' +
+                    _body('DELETE FROM tags WHERE id = OLD.tag_id'))
+
+    @staticmethod
+    def _init_tag_counts(cur: sqlite3.Cursor, temp: bool = False):
+        """Create the tag statistics table (tag_counts) if it doesn't exist.
+
+        The table holds the number of bookmarks for each tag (tag_id 0 stands for untagged bookmarks),
+        and is kept up to date by triggers on tag index changes, so listing tags doesn't depend on DB size.
+        Existing records are counted when the table is first created.
+
+        Parameters
+        ----------
+        cur : sqlite3.Cursor
+            Cursor of the DB connection.
+        temp : bool
+            If True, the table is created as a temporary one (a snapshot, without triggers), for a read-only connection.
+        """
+
+        exists = cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tag_counts'").fetchone()
+        if temp and exists:
+            return
+        cur.execute(f'CREATE {"TEMP " if temp else ""}TABLE if not exists tag_counts ('
+                    'tag_id integer PRIMARY KEY, '
+                    'count integer NOT NULL DEFAULT 0)')
+
+        if not exists:  # counting records added before the table existed
+            cur.execute('INSERT INTO tag_counts (tag_id, count) SELECT tag_id, COUNT(*) FROM bookmark_tags GROUP BY tag_id')
+            cur.execute('INSERT INTO tag_counts (tag_id, count) SELECT 0, COUNT(*) FROM bookmarks WHERE NOT EXISTS '
+                        '(SELECT 1 FROM bookmark_tags WHERE bookmark_id = bookmarks.id)')
+        if temp:
+            return
+
+        _untagged = lambda rec: f"NOT EXISTS (SELECT 1 FROM {sql_split_tags(rec + '.tags')} WHERE value != '')"
+        _body = lambda *queries: 'BEGIN ' + ''.join(f'{query}; ' for query in queries) + 'END'
+        cur.execute('CREATE TRIGGER if not exists bookmark_tags_count_insert AFTER INSERT ON bookmark_tags ' + _body(
+            'INSERT INTO tag_counts (tag_id) SELECT NEW.tag_id WHERE NOT EXISTS (SELECT 1 FROM tag_counts WHERE tag_id = NEW.tag_id)',
+            'UPDATE tag_counts SET count = count + 1 WHERE tag_id = NEW.tag_id'))
+        cur.execute('CREATE TRIGGER if not exists bookmark_tags_count_delete AFTER DELETE ON bookmark_tags ' + _body(
+            'UPDATE tag_counts SET count = count - 1 WHERE tag_id = OLD.tag_id',
+            'DELETE FROM tag_counts WHERE tag_id = OLD.tag_id AND count <= 0'))
+        cur.execute('CREATE TRIGGER if not exists bookmarks_untagged_insert AFTER INSERT ON bookmarks ' +
+                    _body(f'UPDATE tag_counts SET count = count + 1 WHERE tag_id = 0 AND {_untagged("NEW")}'))
+        cur.execute('CREATE TRIGGER if not exists bookmarks_untagged_update AFTER UPDATE OF tags ON bookmarks '
+                    'WHEN OLD.tags IS NOT NEW.tags ' +
+                    _body(f'UPDATE tag_counts SET count = count + ({_untagged("NEW")}) - ({_untagged("OLD")}) WHERE tag_id = 0'))
+        cur.execute('CREATE TRIGGER if not exists bookmarks_untagged_delete AFTER DELETE ON bookmarks ' +
+                    _body(f'UPDATE tag_counts SET count = count - 1 WHERE tag_id = 0 AND {_untagged("OLD")}'))
+
+    @staticmethod
+    def _init_tag_pairs(cur: sqlite3.Cursor, temp: bool = False):
+        """Create the tag co-occurrence table (tag_pairs) if it doesn't exist.
+
+        For each pair of tags (stored in both directions) it holds the number of bookmarks having both,
+        and is kept up to date by triggers on tag index changes (used for related tags suggestions).
+        Existing records are counted when the table is first created.
+
+        Parameters
+        ----------
+        cur : sqlite3.Cursor
+            Cursor of the DB connection.
+        temp : bool
+            If True, the table is created as a temporary one (a snapshot, without triggers), for a read-only connection.
+        """
+
+        exists = cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tag_pairs'").fetchone()
+        if temp and exists:
+            return
+        cur.execute(f'CREATE {"TEMP " if temp else ""}TABLE if not exists tag_pairs ('
+                    'tag_id integer NOT NULL, '
+                    'other_id integer NOT NULL, '
+                    'count integer NOT NULL DEFAULT 0, '
+                    'PRIMARY KEY (tag_id, other_id)) WITHOUT ROWID')
+
+        if not exists:  # counting records added before the table existed
+            cur.execute('INSERT INTO tag_pairs (tag_id, other_id, count) SELECT bt.tag_id, other.tag_id, COUNT(*) '
+                        'FROM bookmark_tags AS bt JOIN bookmark_tags AS other ON other.bookmark_id = bt.bookmark_id '
+                        'WHERE other.tag_id != bt.tag_id GROUP BY bt.tag_id, other.tag_id')
+        if temp:
+            return
+
+        # other tags of the same bookmark (as in the tag index after the change)
+        _others = lambda rec: f'SELECT tag_id FROM bookmark_tags WHERE bookmark_id = {rec}.bookmark_id AND tag_id != {rec}.tag_id'
+        _pairs = lambda rec, query: [f'{query} WHERE tag_id = {rec}.tag_id AND other_id IN ({_others(rec)})',
+                                     f'{query} WHERE other_id = {rec}.tag_id AND tag_id IN ({_others(rec)})']
+        _body = lambda *queries: 'BEGIN ' + ''.join(f'{query}; ' for query in queries) + 'END'
+        # (unlike 'OR IGNORE', an upsert isn't overridden by the conflict resolution of the triggering statement)
+        _upsert = ' ON CONFLICT (tag_id, other_id) DO UPDATE SET count = count + 1'
+        cur.execute('CREATE TRIGGER if not exists bookmark_tags_pairs_insert AFTER INSERT ON bookmark_tags ' + _body(
+            f'INSERT INTO tag_pairs (tag_id, other_id, count) SELECT NEW.tag_id, tag_id, 1 FROM ({_others("NEW")}) WHERE true' + _upsert,
+            f'INSERT INTO tag_pairs (tag_id, other_id, count) SELECT tag_id, NEW.tag_id, 1 FROM ({_others("NEW")}) WHERE true' + _upsert))
+        cur.execute('CREATE TRIGGER if not exists bookmark_tags_pairs_delete AFTER DELETE ON bookmark_tags ' + _body(
+            *_pairs('OLD', 'UPDATE tag_pairs SET count = count - 1'),
+            *[query + ' AND count <= 0' for query in _pairs('OLD', 'DELETE FROM tag_pairs')]))
+
+    # DB schema upgrade steps, applied in order (see BukuDb._migrate()); append new ones at the end
+    MIGRATIONS = (_init_bookmarks_table, _init_netloc_column, _init_tag_index, _init_tag_counts, _init_tag_pairs)
+
     @property
     def dbfile(self) -> str:
         return next(path for _, name, path in self.conn.execute('PRAGMA database_list') if name == 'main')
@@ -622,14 +1457,21 @@ class BukuDb:
         order = self._ordering(fields, for_db=False)
         return sorted(bookmark_vars(records), key=lambda x: [SortKey(get(x, k), ascending=asc) for k, asc in order])
 
-    def _order(self, fields=['+id'], ignore_case=True) -> str:
-        """Converts field list to SQL 'ORDER BY' parameters. (See also BukuDb._ordering().)"""
+    def _order_keys(self, fields=['+id'], ignore_case=True) -> List[Tuple[str, bool]]:
+        """Converts field list to SQL ordering expressions (unique in combination, as id is always included)."""
         text_fields = (set() if not ignore_case else {'url', 'desc', 'metadata', 'tags'})
         get = lambda field: ("tags LIKE '%,{0},%'".format(field[1:].replace("'", "''")) if field.startswith('#') else
-                             'LOWER(NETLOC(url))' if field == 'netloc' else field if field not in text_fields else f'LOWER({field})')
-        return ', '.join(f'{get(field)} {"ASC" if direction else "DESC"}' for field, direction in self._ordering(fields))
+                             'netloc' if field == 'netloc' else field if field not in text_fields else f'LOWER({field})')
+        order = self._ordering(fields)
+        order += ([] if any(field == 'id' for field, _ in order) else [('id', True)])  # ties are resolved by index (as in a table scan)
+        return [(get(field), direction) for field, direction in order]
+
+    def _order(self, fields=['+id'], ignore_case=True) -> str:
+        """Converts field list to SQL 'ORDER BY' parameters. (See also BukuDb._ordering().)"""
+        return ', '.join(f'{key} {"ASC" if direction else "DESC"}' for key, direction in self._order_keys(fields, ignore_case))
 
-    def get_rec_all(self, *, lock: bool = True, order: List[str] = ['id'], ignore_case: bool = True):
+    def get_rec_all(self, *, lock: bool = True, order: List[str] = ['id'], ignore_case: bool = True,
+                    limit: Optional[int] = None, offset: int = 0, count_only: bool = False):
         """Get all the bookmarks in the database.
 
         Parameters
@@ -640,14 +1482,121 @@ class BukuDb:
             Order description (fields from JSON export or DB, prepended with '+'/'-' for ASC/DESC).
         ignore_case : bool
             Whether to ignore case when applying order (True by default).
+        limit : int, optional
+            Maximum number of records to return. Default is None (no limit).
+        offset : int
+            Number of leading records to skip. Default is 0.
+        count_only : bool
+            True to return the number of records instead (ignoring limit & offset). Default is False.
 
         Returns
         -------
-        list
-            A list of tuples representing bookmark records.
+        list or int
+            A list of tuples representing bookmark records (or their number if count_only is True).
         """
 
-        return self._fetch(f'SELECT * FROM bookmarks ORDER BY {self._order(order, ignore_case)}', lock=lock)
+        if count_only:
+            with (self.lock if lock else contextlib.nullcontext()):
+                return self.cur.execute('SELECT COUNT(*) FROM bookmarks').fetchone()[0]
+        query = f'SELECT id, url, metadata, tags, desc, flags FROM bookmarks ORDER BY {self._order(order, ignore_case)}'
+        if limit is None and not offset:
+            return self._fetch(query, lock=lock)
+        return self._fetch(query + ' LIMIT ? OFFSET ?', (-1 if limit is None else limit), offset, lock=lock)
+
+    def iter_rec(self, order: List[str] = ['+id'], *, after: Optional[int] = None, limit: Optional[int] = None,
+                 indices: Optional[range] = None, batch_size: int = 1000, ignore_case: bool = True) -> Iterator[BookmarkVar]:
+        """Iterate over bookmarks in the database, fetching them in batches.
+
+        When ordered by id, batches are retrieved via keyset pagination (i.e. each one continues
+        after the last retrieved record in the specified order), so memory usage doesn't depend
+        on DB size, and the DB is not locked between batches. Other orderings aren't indexed (so each
+        such query would re-sort the whole table); in this case, batches are fetched from a single
+        sorted query instead (which keeps the DB read-locked until the iteration is finished).
+
+        Parameters
+        ----------
+        order : list of str
+            Order description (fields from JSON export or DB, prepended with '+'/'-' for ASC/DESC).
+        after : int, optional
+            DB index of the record to continue after (in the specified order).
+        limit : int, optional
+            Maximum number of records to retrieve.
+        indices : range, optional
+            Range of DB indices to restrict the iteration to.
+        batch_size : int
+            Number of records fetched per query (1000 by default).
+        ignore_case : bool
+            Whether to ignore case when applying order (True by default).
+
+        Yields
+        ------
+        BookmarkVar
+            Bookmark records.
+        """
+
+        keys = self._order_keys(order, ignore_case)
+        _order = ', '.join(f'{key} {"ASC" if direction else "DESC"}' for key, direction in keys)
+        query = f'SELECT id, url, metadata, tags, desc, flags, {", ".join(key for key, _ in keys)} FROM bookmarks'
+        base = ([] if not indices else [('id BETWEEN ? AND ?', [indices.start, indices.stop - 1])])
+        last = None
+        if after is not None:
+            with self.lock:
+                last = self.cur.execute(f'SELECT {", ".join(key for key, _ in keys)} FROM bookmarks WHERE id = ?', (after,)).fetchone()
+            if last is None:
+                return
+        if keys[0][0] != 'id':
+            yield from self._iter_sorted(query, _order, base + ([] if last is None else [self._keyset_clause(keys, last)]),
+                                         limit=limit, batch_size=batch_size)
+            return
+        while limit is None or limit > 0:
+            clauses = base + ([] if last is None else [self._keyset_clause(keys, last)])
+            where = ' AND '.join(clause for clause, _ in clauses)
+            batch = (batch_size if limit is None else min(batch_size, limit))
+            with self.lock:
+                self.cur.execute(query + (where and f' WHERE {where}') + f' ORDER BY {_order} LIMIT {int(batch)}',
+                                 [arg for _, args in clauses for arg in args])
+                rows = self.cur.fetchall()
+            for row in rows:
+                yield BookmarkVar(*row[:len(BookmarkVar._fields)])
+            if len(rows) < batch:
+                return
+            last = rows[-1][len(BookmarkVar._fields):]
+            limit = (None if limit is None else limit - len(rows))
+
+    def _iter_sorted(self, query: str, order: str, clauses: List[Tuple[str, List[Any]]], *,
+                     limit: Optional[int], batch_size: int) -> Iterator[BookmarkVar]:
+        """Fetches results of a single sorted query in batches (see BukuDb.iter_rec())."""
+        where = ' AND '.join(clause for clause, _ in clauses)
+        cur = self.conn.cursor()
+        try:
+            with self.lock:
+                cur.execute(query + (where and f' WHERE {where}') + f' ORDER BY {order}' +
+                            ('' if limit is None else f' LIMIT {int(limit)}'), [arg for _, args in clauses for arg in args])
+            while True:
+                with self.lock:
+                    rows = cur.fetchmany(batch_size)
+                for row in rows:
+                    yield BookmarkVar(*row[:len(BookmarkVar._fields)])
+                if len(rows) < batch_size:
+                    return
+        finally:
+            cur.close()
+
+    @staticmethod
+    def _keyset_clause(keys: List[Tuple[str, bool]], values: Sequence[Any]) -> Tuple[str, List[Any]]:
+        """Builds a condition selecting rows that come after given key values (NULLs are ordered first, as in SQLite)."""
+        options, args = [], []
+        keys = [(f'({key})', asc) for key, asc in keys]  # LIKE has lower precedence than comparisons
+        for i, ((key, asc), value) in enumerate(zip(keys, values)):
+            prefix = [f'{_key} IS ?' for _key, _ in keys[:i]]
+            if value is None:
+                after = (f'{key} IS NOT NULL' if asc else None)  # nothing comes after NULL in DESC order
+            else:
+                after = (f'{key} > ?' if asc else f'({key} < ? OR {key} IS NULL)')
+            if after:
+                options += ['(' + ' AND '.join(prefix + [after]) + ')']
+                args += list(values[:i]) + ([] if value is None else [value])
+        return '(' + (' OR '.join(options) or 'false') + ')', args
 
     def get_rec_by_id(self, index: int, *, lock: bool = True) -> Optional[BookmarkVar]:
         """Get a bookmark from database by its ID.
@@ -665,7 +1614,7 @@ class BukuDb:
             Bookmark data, or None if index is not found.
         """
 
-        return self._fetch_first('SELECT * FROM bookmarks WHERE id = ?', index, lock=lock)
+        return self._fetch_first('SELECT id, url, metadata, tags, desc, flags FROM bookmarks WHERE id = ?', index, lock=lock)
 
     def get_rec_all_by_ids(self, indices: Ints, *, lock: bool = True, order: List[str] = ['id']):
         """Get all the bookmarks in the database.
@@ -686,8 +1635,8 @@ class BukuDb:
         """
 
         _order, placeholder = self._order(order), ', '.join(['?'] * len(indices))
-        return indices and self._fetch(f'SELECT * FROM bookmarks WHERE id IN ({placeholder}) ORDER BY {_order}',
-                                       *list(indices), lock=lock)
+        return indices and self._fetch('SELECT id, url, metadata, tags, desc, flags FROM bookmarks '
+                                       f'WHERE id IN ({placeholder}) ORDER BY {_order}', *list(indices), lock=lock)
 
     def get_rec_id(self, url: str, *, lock: bool = True):
         """Check if URL already exists in DB.
@@ -705,7 +1654,7 @@ class BukuDb:
             DB index, or None if URL not found in DB.
         """
 
-        row = self._fetch_first('SELECT * FROM bookmarks WHERE url = ?', url, lock=lock)
+        row = self._fetch_first('SELECT id, url, metadata, tags, desc, flags FROM bookmarks WHERE url = ?', url, lock=lock)
         return row and row.id
 
     def get_rec_ids(self, urls: Values[str], *, lock: bool = True):
@@ -753,24 +1702,105 @@ class BukuDb:
         with self.lock:
             return self.get_max_id(lock=False)
 
-    def reorder(self, order: List[str], *, ignore_case=True):
+    def reorder(self, order: List[str], *, ignore_case=True, vacuum: bool = False) -> bool:
         """Change indices of all records in DB to match the specified order.
 
+        New indices are calculated within SQLite (via a window function); the records
+        (and their tag index entries) are then rewritten in the new order with triggers
+        suspended, and search indices (if any) are rebuilt.
+
         Parameters
         ----------
         order : list of str
             Order description (fields from JSON export or DB, prepended with '+'/'-' for ASC/DESC).
         ignore_case : bool
             Whether to ignore case when applying order (True by default).
+        vacuum : bool
+            Whether to VACUUM the DB afterwards (False by default).
+
+        Returns
+        -------
+        bool
+            True on success, False on failure.
         """
+        _fields = 'url, metadata, tags, desc, flags, netloc'
         with self.lock:
-            sorted_urls = [x.url for x in self.get_rec_all(lock=False, order=order, ignore_case=ignore_case)]
-            self.cur.execute('UPDATE bookmarks SET id = -id')
-            for idx, url in enumerate(sorted_urls, start=1):
-                self.cur.execute('UPDATE bookmarks SET id = ? WHERE url = ?', (idx, url))
-            self.conn.commit()
+            try:
+                self.cur.execute('CREATE TEMP TABLE reorder_ids (old integer PRIMARY KEY, new integer NOT NULL)')
+                self.cur.execute('INSERT INTO temp.reorder_ids (old, new) '
+                                 f'SELECT id, ROW_NUMBER() OVER (ORDER BY {self._order(order, ignore_case)}) FROM bookmarks')
+                if self.cur.execute('SELECT 1 FROM temp.reorder_ids WHERE old != new LIMIT 1').fetchone():
+                    self.cur.execute(f'CREATE TEMP TABLE reordered AS SELECT new AS id, {_fields} '
+                                     'FROM bookmarks JOIN temp.reorder_ids ON old = id')
+                    self.cur.execute('CREATE TEMP TABLE reordered_tags AS SELECT tag_id, new AS bookmark_id '
+                                     'FROM bookmark_tags JOIN temp.reorder_ids ON old = bookmark_id')
+                    # the contents don't change, so none of the triggers need to fire
+                    triggers = self.cur.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' "
+                                                "AND tbl_name IN ('bookmarks', 'bookmark_tags')").fetchall()
+                    for name, _ in triggers:
+                        self.cur.execute(f'DROP TRIGGER {name}')
+                    self.cur.execute('DELETE FROM bookmarks')
+                    self.cur.execute('DELETE FROM bookmark_tags')
+                    self.cur.execute(f'INSERT INTO bookmarks (id, {_fields}) SELECT id, {_fields} FROM temp.reordered ORDER BY id')
+                    self.cur.execute('INSERT INTO bookmark_tags (tag_id, bookmark_id) '
+                                     'SELECT tag_id, bookmark_id FROM temp.reordered_tags ORDER BY tag_id, bookmark_id')
+                    for _, sql in triggers:
+                        self.cur.execute(sql)
+                    for table in ('bookmarks_fts', 'bookmarks_trigram'):
+                        if self._has_table(table):
+                            self.cur.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+                self.conn.commit()
+            except sqlite3.Error as e:
+                LOGERR('reorder(): %s', e)
+                self.conn.rollback()
+                return False
+            finally:
+                for table in ('reorder_ids', 'reordered', 'reordered_tags'):
+                    self.cur.execute(f'DROP TABLE IF EXISTS temp.{table}')
+            if vacuum:
+                self.cur.execute('VACUUM')
+            return True
+
+    def _reclaim_space(self):
+        """Releases free pages of the DB file once there's enough of them. (Must be called under lock, outside of a transaction.)
+
+        With incremental auto-vacuum, only the free pages are released (which is cheap);
+        otherwise a full VACUUM is done once they make up a significant part of the file
+        (also switching the DB to incremental auto-vacuum)."""
+        _pragma = lambda name: self.cur.execute(f'PRAGMA {name}').fetchone()[0]
+        free = _pragma('freelist_count')
+        if free <= VACUUM_FREE_PAGES:
+            return
+        if _pragma('auto_vacuum') == 2:  # INCREMENTAL
+            self.cur.executescript('PRAGMA incremental_vacuum')  # (execute() only releases a single page)
+        elif free > _pragma('page_count') * VACUUM_FREE_RATIO:
+            self.cur.execute('PRAGMA auto_vacuum = INCREMENTAL')
             self.cur.execute('VACUUM')
 
+    def maintain(self) -> bool:
+        """Reclaim unused space in the DB file and update query planner statistics.
+
+        A DB created without incremental auto-vacuum is converted to it (via a full VACUUM).
+
+        Returns
+        -------
+        bool
+            True on success, False on failure.
+        """
+        with self.lock:
+            try:
+                self.conn.commit()
+                if self.cur.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                    self.cur.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                    self.cur.execute('VACUUM')
+                else:
+                    self.cur.executescript('PRAGMA incremental_vacuum')
+                self.cur.execute('PRAGMA optimize')
+                return True
+            except sqlite3.Error as e:
+                LOGERR('maintain(): %s', e)
+                return False
+
     def add_rec(
             self,
             url: str,
@@ -885,6 +1915,91 @@ class BukuDb:
             LOGERR('add_rec(): %s', e)
             return None
 
+    def add_recs(self, records: Iterable[Sequence[Any]], on_conflict: str = 'skip', *,
+                 chunk_size: int = 10000, delay_commit: bool = False) -> AddRecsResult:
+        """Add multiple bookmarks at once (without fetching data from web).
+
+        Records are inserted in chunks, each in a single transaction;
+        conflicts with existing URLs are resolved by the DB. On failure, the chunk is rolled back and
+        the remaining records are not processed (while the earlier chunks stay committed).
+
+        Parameters
+        ----------
+        records : iterable of tuples
+            Bookmark data: (url, title, tags, desc, immutable).
+            Trailing values may be omitted; extra values are ignored (so importer output can be passed as is).
+        on_conflict : str
+            Handling of records whose URL is already in DB: 'skip' (default) keeps the existing bookmark,
+            'merge_tags' appends the new tags to it, and 'replace' overwrites its title, tags, description & flags.
+        chunk_size : int
+            Number of records inserted per transaction. Default is 10000.
+        delay_commit : bool
+            True if records should not be committed to the DB,
+            leaving commit responsibility to caller. Default is False.
+
+        Returns
+        -------
+        AddRecsResult
+            Numbers of added, updated & skipped records (along with the error message on failure).
+        """
+
+        query = 'INSERT INTO bookmarks(URL, metadata, tags, desc, flags) VALUES (?, ?, ?, ?, ?) ' + self._on_conflict(on_conflict)
+        skipped = 0
+
+        def _rows():
+            nonlocal skipped
+            for record in records:
+                url, title, tags, desc, immutable = (tuple(record) + (None,) * 5)[:5]
+                if not url:
+                    LOGERR('Invalid URL')
+                    skipped += 1
+                    continue
+                yield (url, title or '', taglist_str((tags or '') + DELIM), desc or '', FLAG_IMMUTABLE if immutable else FLAG_NONE)
+
+        rows, result = _rows(), AddRecsResult()
+        while chunk := list(islice(rows, chunk_size)):
+            with self.lock:
+                try:
+                    counts = self._upsert(query, chunk)
+                except Exception as e:
+                    LOGERR('add_recs(): %s', e)
+                    if not delay_commit:
+                        self.conn.rollback()
+                    return result._replace(skipped=result.skipped + skipped, error=str(e))
+                if not delay_commit:
+                    self.conn.commit()
+            result = AddRecsResult(*map(sum, zip(result[:3], counts)))
+        return result._replace(skipped=result.skipped + skipped)
+
+    @staticmethod
+    def _on_conflict(on_conflict: str) -> str:
+        """Builds the upsert clause for inserting into bookmarks table ('skip', 'merge_tags' or 'replace' existing URLs)."""
+        _fields = ('metadata', 'tags', 'desc', 'flags')
+        _new = ', '.join(f'excluded.{field}' for field in _fields)
+        updates = {'skip': 'NOTHING',
+                   'merge_tags': 'UPDATE SET tags = MERGE_TAGS(tags, excluded.tags) WHERE MERGE_TAGS(tags, excluded.tags) IS NOT tags',
+                   'replace': f'UPDATE SET ({", ".join(_fields)}) = ({_new}) WHERE ({", ".join(_fields)}) IS NOT ({_new})'}
+        if on_conflict not in updates:
+            raise ValueError(f'Invalid conflict resolution: {on_conflict}')
+        return f'ON CONFLICT(URL) DO {updates[on_conflict]}'
+
+    def _upsert(self, query: str, rows: Optional[List[Sequence[Any]]] = None, *, args: Sequence[Any] = (),
+                table: str = 'bookmarks', urls: str = '', total: int = 0) -> AddRecsResult:
+        """Runs an upsert into bookmarks table (for each of given rows starting with URL, or once for an 'INSERT ... SELECT'
+        of total rows, with their URLs selected by the urls query using the same args), and counts the results.
+        New URLs are counted beforehand via the URL index. (Must be called under lock.)"""
+        if rows is not None:
+            urls, args = 'SELECT value AS url FROM json_each(?)', [json.dumps([row[0] for row in rows])]
+        added = self.cur.execute(f'SELECT COUNT(DISTINCT src.url) FROM ({urls}) AS src '
+                                 f'WHERE NOT EXISTS (SELECT 1 FROM {table} AS bm WHERE bm.URL = src.url)', args).fetchone()[0]
+        if rows is None:
+            self.cur.execute(query, args)
+        else:
+            self.cur.executemany(query, rows)
+            total = len(rows)
+        changed = self.cur.rowcount  # excludes changes made by triggers
+        return AddRecsResult(added, changed - added, total - changed)
+
     def append_tag_at_index(self, index, tags_in, delay_commit=False):
         """Append tags to bookmark tagset at index.
 
@@ -936,6 +2051,56 @@ class BukuDb:
 
         return True
 
+    def rewrite_tags(self, rewrites: Dict[str, Optional[str | Sequence[str]]], index: Optional[IntOrInts] = None,
+                     *, delay_commit: bool = False) -> Optional[int]:
+        """Rename, delete or merge any number of tags in a single pass over affected records (and a single transaction).
+
+        Parameters
+        ----------
+        rewrites : dict
+            {tag: replacement} mapping (tags are matched case-insensitively). A replacement is a list of tags
+            (or a DELIM-separated string of them); an empty one (or None) deletes the tag.
+            Mapping several tags onto the same one merges them.
+        index : int | int[] | int{} | range, optional
+            DB index(es) of bookmark records to update. 0 or empty indicates all records.
+        delay_commit : bool
+            True if records should not be committed to the DB,
+            leaving commit responsibility to caller. Default is False.
+
+        Returns
+        -------
+        int | None
+            Number of updated records; None on failure.
+        """
+
+        _replacement = lambda new: (DELIM.join(new) if new and not isinstance(new, str) else new or '')
+        rows = [(tag.strip(), _replacement(new)) for tag, new in rewrites.items() if tag and tag.strip()]
+        if any(DELIM in tag for tag, _ in rows):
+            LOGERR('Tags cannot contain delimiter (%s)', DELIM)
+            return None
+        if not rows:
+            return 0
+        indices = (None if not index else [index] if isinstance(index, int) else list(index))
+        query = (f"UPDATE bookmarks SET tags = PARSE_TAGS((SELECT group_concat(COALESCE(rw.replacement, tag.value), '{DELIM}') "
+                 f"FROM {sql_split_tags('bookmarks.tags')} AS tag LEFT JOIN temp.tag_rewrites AS rw ON rw.name = tag.value)) "
+                 'WHERE id IN (SELECT bookmark_id FROM temp.tag_rewrites AS rw JOIN tags ON tags.name = rw.name '
+                 'JOIN bookmark_tags ON tag_id = tags.id)' + ('' if not indices else ' AND id IN (SELECT value FROM json_each(?))'))
+        with self.lock:
+            try:
+                self.cur.execute('CREATE TEMP TABLE tag_rewrites (name text PRIMARY KEY COLLATE NOCASE, replacement text NOT NULL)')
+                self.cur.executemany('INSERT OR REPLACE INTO temp.tag_rewrites (name, replacement) VALUES (?, ?)', rows)
+                self.cur.execute(query, (() if not indices else (json.dumps(indices),)))
+                count = self.cur.rowcount
+                if not delay_commit:
+                    self.conn.commit()
+                return count
+            except sqlite3.Error as e:
+                LOGERR('rewrite_tags(): %s', e)
+                self.conn.rollback()
+                return None
+            finally:
+                self.cur.execute('DROP TABLE IF EXISTS temp.tag_rewrites')
+
     def delete_tag_at_index(self, index, tags_in, delay_commit=False, chatty=True):
         """Delete tags from bookmark tagset at index.
 
@@ -960,57 +2125,23 @@ class BukuDb:
         if tags_in is None or tags_in == DELIM:
             return True
 
-        tags_to_delete = tags_in.strip(DELIM).split(DELIM)
         indices = (None if not index else [index] if isinstance(index, int) else index)
-
-        if len(indices or []) != 1:
-            if not indices and chatty:
-                resp = read_in('Delete the tag(s) from ALL bookmarks? (y/n): ')
-                if resp != 'y':
-                    return False
-
-            query = "UPDATE bookmarks SET tags = replace(tags, ?, ?) WHERE tags LIKE ? ESCAPE '`'"
-            if indices:
-                query += ' AND id IN ({})'.format(', '.join(['?'] * len(indices)))
-
-            count = 0
-            with self.lock:
-                for tag in tags_to_delete:
-                    tag = delim_wrap(tag)
-                    args = (tag, DELIM, '%'+like_escape(tag, '`')+'%') + tuple(indices or [])
-                    self.cur.execute(query, args)
-                    count += self.cur.rowcount
-
-                if count > 0 and not delay_commit:
-                    self.conn.commit()
-                    if self.chatty:
-                        print('%d record(s) updated' % count)
-
-            return True
-
-        # Process a single index
-        # Use SELECT and UPDATE to handle multiple tags at once
-        with self.lock:
-            query = 'SELECT id, tags FROM bookmarks WHERE id = ? LIMIT 1'
-            self.cur.execute(query, list(indices))
-            resultset = self.cur.fetchall()
-            if not resultset:
+        single = len(indices or []) == 1
+        if not indices and chatty:
+            resp = read_in('Delete the tag(s) from ALL bookmarks? (y/n): ')
+            if resp != 'y':
                 return False
+        if single and not self.get_rec_by_id(next(iter(indices))):
+            return False
 
-            query = 'UPDATE bookmarks SET tags = ? WHERE id = ?'
-            for row in resultset:
-                tags = row[1]
-
-                for tag in tags_to_delete:
-                    tags = tags.replace(delim_wrap(tag), DELIM)
-
-                self.cur.execute(query, (parse_tags([tags]), row[0],))
-                if self.chatty and not delay_commit:
-                    self.print_rec(row[0])
-
-                if not delay_commit:
-                    self.conn.commit()
-
+        count = self.rewrite_tags({tag: None for tag in tags_in.strip(DELIM).split(DELIM)}, indices, delay_commit=delay_commit)
+        if count is None:
+            return False
+        if self.chatty and not delay_commit:
+            if single:
+                self.print_rec(next(iter(indices)))
+            elif count > 0:
+                print('%d record(s) updated' % count)
         return True
 
     def update_rec(
@@ -1469,11 +2600,7 @@ class BukuDb:
     def commit_delete(self, apply: bool = True, retain_order: bool = False):
         """Commit delayed delete commands."""
         if apply and self._to_delete is not None:
-            with self.lock:
-                for id in sorted(set(self._to_delete), reverse=True):
-                    self.delete_rec(id, delay_commit=True, chatty=False, retain_order=retain_order)
-                self.conn.commit()
-                self.cur.execute('VACUUM')
+            self.delete_recs(self._to_delete, retain_order=retain_order)
         self._to_delete = None
 
     def edit_update_rec(self, index, immutable=None):
@@ -1535,7 +2662,7 @@ class BukuDb:
         -------
         list
         """
-        q0 = 'SELECT * FROM bookmarks'
+        q0 = 'SELECT id, url, metadata, tags, desc, flags FROM bookmarks'
         if ids:
             q0 += ' WHERE id in ('
             for idx in ids:
@@ -1563,6 +2690,61 @@ class BukuDb:
             LOGERR(e)
             return []
 
+    def _has_table(self, name: str) -> bool:
+        with self.lock:
+            self.cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+            return bool(self.cur.fetchone())
+
+    def enable_fts(self, enable: bool = True, *, trigram: bool = False) -> bool:
+        """Create (or drop) a full-text search index.
+
+        The index is an FTS5 table over title, URL, description and tags,
+        kept in sync with the bookmarks table by triggers. When the (word-based)
+        full-text index is present, searchdb() uses it for non-deep, non-regex searches
+        (ranking results by BM25); the trigram index is used for narrowing down
+        other non-regex searches (including deep ones) without affecting the results.
+
+        Parameters
+        ----------
+        enable : bool
+            True to build the index (if it doesn't exist yet), False to drop it.
+            Default is True.
+        trigram : bool
+            True to manage the trigram (substring) index instead of the full-text one.
+            Default is False.
+
+        Returns
+        -------
+        bool
+            True on success, False on failure.
+        """
+
+        table = ('bookmarks_trigram' if trigram else 'bookmarks_fts')
+        _fields = 'metadata, url, desc, tags'
+        _values = lambda rec: ', '.join(f'{rec}.{field}' for field in _fields.split(', '))
+        _delete = f"INSERT INTO {table} ({table}, rowid, {_fields}) VALUES ('delete', OLD.id, {_values('OLD')}); "
+        _insert = f'INSERT INTO {table} (rowid, {_fields}) VALUES (NEW.id, {_values("NEW")}); '
+        with self.lock:
+            try:
+                if not enable:
+                    for trigger in ('insert', 'update', 'delete'):
+                        self.cur.execute(f'DROP TRIGGER IF EXISTS {table}_{trigger}')
+                    self.cur.execute(f'DROP TABLE IF EXISTS {table}')
+                elif not self._has_table(table):
+                    self.cur.execute(f"CREATE VIRTUAL TABLE {table} USING fts5({_fields}, content='bookmarks', content_rowid='id'" +
+                                     (", tokenize='trigram')" if trigram else ')'))
+                    self.cur.execute(f'CREATE TRIGGER {table}_insert AFTER INSERT ON bookmarks BEGIN {_insert}END')
+                    self.cur.execute(f'CREATE TRIGGER {table}_update AFTER UPDATE OF id, {_fields} ON bookmarks '
+                                     f'BEGIN {_delete}{_insert}END')
+                    self.cur.execute(f'CREATE TRIGGER {table}_delete AFTER DELETE ON bookmarks BEGIN {_delete}END')
+                    self.cur.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+                self.conn.commit()
+                return True
+            except sqlite3.OperationalError as e:
+                self.conn.rollback()
+                LOGERR('enable_fts(): %s', e)
+                return False
+
     def _search_tokens(self, keyword: str, deep=False, regex=False, markers=False):
         """Converts a keyword into a list of tokens, based on search parameters.
         A token is a varied-length tuple of following values: (SQL field, deep, *SQL params)."""
@@ -1584,29 +2766,233 @@ class BukuDb:
             return tags and [('tags', not keyword.startswith('#,'), *tags)]
         return []
 
+    def _search_conditions(self, tokens, regex=False) -> List[List[Tuple[str, str, str]]]:
+        """Converts a list of tokens into conditions: alternatives of (field, operator, param) conjunctions,
+        with operator being either 'REGEXP' or 'LIKE' (the latter implying a substring match).
+        (See also: BukuDb._search_tokens(), BukuDb._search_clause().)"""
+        border = lambda k, c: (',' if k == 'tags' else r'\b' if c.isalnum() else '')
+
+        if regex:
+            return [[(field, 'REGEXP', param)] for field, deep, param in tokens]
+        return [[((field, 'LIKE', param) if deep else
+                  (field, 'REGEXP', border(field, param[0]) + re.escape(param) + border(field, param[-1])))
+                 for param in params] for field, deep, *params in tokens]
+
     def _search_clause(self, tokens, regex=False) -> Tuple[str, List[str]]:
         """Converts a list of tokens into an SQL clause. (See also: BukuDb._search_tokens().)
         If regex is True, the token is treated as a raw regex and the paired deep parameter is ignored."""
-        border = lambda k, c: (',' if k == 'tags' else r'\b' if c.isalnum() else '')
+        _sql = lambda field, op: (field + " LIKE ('%' || ? || '%')" if op == 'LIKE' else field + ' REGEXP ?')
 
         args, clauses = [], []
-        if regex:
-            for field, deep, param in tokens:
-                clauses += [field + ' REGEXP ?']
-                args += [param]
-        else:
-            for field, deep, *params in tokens:
-                _clauses = []
-                for param in params:
-                    if deep:
-                        _clauses += [field + " LIKE ('%' || ? || '%')"]
-                    else:
-                        _clauses += [field + ' REGEXP ?']
-                        param = border(field, param[0]) + re.escape(param) + border(field, param[-1])
-                    args += [param]
-                clauses += (_clauses if len(_clauses) < 2 else [f'({" AND ".join(_clauses)})'])
+        for conditions in self._search_conditions(tokens, regex=regex):
+            _clauses = [_sql(field, op) for field, op, _ in conditions]
+            args += [param for _, _, param in conditions]
+            clauses += (_clauses if len(_clauses) < 2 else [f'({" AND ".join(_clauses)})'])
         return ' OR '.join(clauses), args
 
+    def _search_fts_expr(self, tokens, trigram=False) -> Optional[str]:
+        """Converts a list of (non-regex) tokens into an FTS5 MATCH expression. (See also: BukuDb._search_tokens().)
+        The expression selects a superset of records matched by the SQL clause of same tokens (so it can be used for
+        narrowing down the search); None is returned if there's no such expression (i.e. the tokens cannot be indexed).
+        If trigram is True, the expression is made for the trigram index (which also supports deep search tokens)."""
+        _phrase = lambda s: '"{}"'.format(s.replace('"', '""'))
+        _indexable = ((lambda s, deep: len(s) >= 3 and not (deep and re.search('[%_]', s))) if trigram else
+                      (lambda s, deep: not deep and any(c.isalnum() for c in s)))
+        exprs = []
+        for field, deep, *params in tokens:
+            if not all(_indexable(param, deep) for param in params):
+                return None
+            exprs += [f'{field} : ({" AND ".join(map(_phrase, params))})']
+        return ' OR '.join(exprs) or None
+
+    def _compile_search(
+            self,
+            keywords: Optional[List[str]] = None,
+            *,
+            all_keywords: bool = False,
+            deep: bool = False,
+            regex: bool = False,
+            markers: bool = False,
+            stag: Optional[str] = None,
+            without: Optional[List[str]] = None,
+            order: List[str] = ['+id'],
+            limit: Optional[int] = None,
+            offset: int = 0,
+            count_only: bool = False,
+            randomize: bool = False,
+            shard: Optional[Tuple[int, int]] = None,
+    ) -> Optional[Tuple[str, list]]:
+        """Compiles search criteria into a single SQL query (with its arguments), or returns None if nothing can match.
+
+        Records are ranked by keywords if these are given (same as in BukuDb.searchdb()), otherwise by tags
+        (same as in BukuDb.search_by_tag()); the tag filter and exclusion keywords only narrow down the results.
+        If shard (an inclusive id range) is given, the query selects unordered (id, score) pairs of matches within it
+        instead (which is only supported for regex searches)."""
+        columns, joins, clauses = [], [], []  # lists of (SQL, args)
+        rank = []
+        if keywords is not None:
+            _clauses, qargs, tokenlists = [], [], []
+            for keyword in keywords:
+                tokens = self._search_tokens(keyword, deep=deep, markers=markers)
+                clause, args = self._search_clause(tokens, regex=regex)
+                if clause and args:
+                    _clauses += [f'({clause})']
+                    qargs += args
+                    tokenlists += [tokens]
+            if not qargs:
+                return None
+
+            _count = lambda x: f'CASE WHEN {x} THEN 1 ELSE 0 END'
+            _special = all_keywords and keywords in (['blank'], ['immutable'])
+            _operator = (' AND ' if all_keywords else ' OR ')
+            _match = lambda trigram=False: ([None] if regex or _special else
+                                            [self._search_fts_expr(tokens, trigram=trigram) for tokens in tokenlists])
+            fts = all(_match()) and self._has_table('bookmarks_fts')
+            _index = []  # extra condition narrowing down the search via trigram index
+            if not fts and all(_match(trigram=True)) and self._has_table('bookmarks_trigram'):
+                _index = [('id IN (SELECT rowid FROM bookmarks_trigram WHERE bookmarks_trigram MATCH ?)',
+                           [_operator.join(f'({x})' for x in _match(trigram=True))])]
+
+            if fts:  # narrowing down the search via full-text index, ranking results by relevance
+                joins += [('JOIN (SELECT rowid AS fts_id, bm25(bookmarks_fts) AS fts_rank\n'
+                           '  FROM bookmarks_fts WHERE bookmarks_fts MATCH ?) ON id = fts_id',
+                           [_operator.join(f'({x})' for x in _match())])]
+                clauses += [('(' + _operator.join(_clauses) + ')', qargs)]
+                rank += ['fts_rank']
+            elif regex or not all_keywords:
+                columns += [('(' + '\n    + '.join(map(_count, _clauses)) + ') AS score', qargs)]
+                clauses += [('score > 0', [])] + _index
+                rank += ['score DESC']
+            elif keywords == ['blank']:
+                clauses += [("(metadata = '' OR tags = ?)", [DELIM])]
+            elif keywords == ['immutable']:
+                clauses += [('flags & 1 == 1', [])]
+            else:
+                clauses += [('\n  AND '.join(_clauses), qargs)] + _index
+
+        if stag is not None:
+            if stag in ('', DELIM):
+                return None
+            qargs, search_operator, excluded_tags = prep_tag_search(stag)
+            if search_operator is None:
+                LOGERR("Cannot use both '+' and ',' in same search")
+                return None
+            LOGDBG('tags: %s, search_operator: %s, excluded_tags: %s', qargs, search_operator, excluded_tags)
+
+            _tags = [s.strip(DELIM) for s in qargs]
+            if search_operator == 'AND':  # an empty tag is matched by any record
+                _tags = [s for s in _tags if s]
+            if _tags and all(_tags):  # looking up the tag index
+                joins += [('JOIN (SELECT bookmark_id, COUNT(*) AS tag_score FROM json_each(?) AS tag '
+                           'JOIN tags ON tags.name = tag.value JOIN bookmark_tags ON tag_id = tags.id GROUP BY bookmark_id' +
+                           ('' if search_operator != 'AND' else ' HAVING tag_score = ?') + ') ON id = bookmark_id',
+                           [json.dumps(_tags)] + ([len(_tags)] if search_operator == 'AND' else []))]
+            elif search_operator == 'AND':
+                clauses += [('(' + ' AND '.join("tags LIKE '%' || ? || '%'" for tag in qargs) + ')', qargs)]
+            else:
+                columns += [(' + '.join("CASE WHEN tags LIKE '%' || ? || '%' THEN 1 ELSE 0 END" for tag in qargs) +
+                             ' AS tag_score', qargs)]
+                clauses += [('tag_score > 0', [])]
+            if excluded_tags:
+                clauses += [('tags NOT REGEXP ?', [excluded_tags])]
+            if keywords is None and search_operator != 'AND':
+                rank += ['tag_score DESC']
+
+        if without:  # excluding records matched by ANY of these keywords
+            _clauses, qargs = [], []
+            for keyword in without:
+                clause, args = self._search_clause(self._search_tokens(keyword, deep=deep, markers=markers))
+                if clause and args:
+                    _clauses += [f'({clause})']
+                    qargs += args
+            if qargs:
+                clauses += [('NOT IFNULL(' + ' OR '.join(_clauses) + ', 0)', qargs)]
+
+        if shard is not None:
+            clauses += [('id BETWEEN ? AND ?', list(shard))]
+        _from = (' FROM bookmarks' + ''.join(f'\n{sql}' for sql, _ in joins) +
+                 ('' if not clauses else '\nWHERE ' + '\n  AND '.join(sql for sql, _ in clauses)))
+        qargs = [arg for part in (columns, joins, clauses) for _, args in part for arg in args]
+        _columns = ''.join(f', {sql}' for sql, _ in columns)
+        if shard is not None:  # ranking is done after merging shards
+            return f'SELECT id, score FROM (SELECT *{_columns}{_from})', qargs
+        if count_only:  # ordering & paging are irrelevant
+            return ('SELECT COUNT(*)' + _from if not columns else f'SELECT COUNT(*) FROM (SELECT *{_columns}{_from})'), qargs
+        _from += '\nORDER BY ' + ('RANDOM()' if randomize else ', '.join(rank + [self._order(order)]))
+        if limit is not None or offset:
+            _from += '\nLIMIT ? OFFSET ?'
+            qargs += [(-1 if limit is None else limit), offset]
+        if not columns:
+            return 'SELECT id, url, metadata, tags, desc, flags' + _from, qargs
+        return f'SELECT id, url, metadata, tags, desc, flags\nFROM (SELECT *{_columns}{_from})', qargs
+
+    def _fetch_search(self, compiled: Optional[Tuple[str, list]], count_only: bool = False) -> List[BookmarkVar] | int:
+        """Runs a query made by BukuDb._compile_search() (returning the number of matches if count_only is True)."""
+        if not compiled:
+            return (0 if count_only else [])
+        query, qargs = compiled
+        LOGDBG('query: "%s", args: %s', query, qargs)
+        try:
+            if not count_only:
+                return self._fetch(query, *qargs)
+            with self.lock:
+                return self.cur.execute(query, qargs).fetchone()[0]
+        except sqlite3.OperationalError as e:
+            LOGERR(e)
+            return (0 if count_only else [])
+
+    def _search(self, processes: Optional[int] = None, **params) -> List[BookmarkVar] | int:
+        """Runs a search compiled by BukuDb._compile_search() from params; if requested, a regex search
+        is sharded by id ranges among worker processes (see BukuDb._search_sharded())."""
+        count_only = params.get('count_only', False)
+        matches = (None if processes is None or not (params.get('regex') and params.get('keywords')) else
+                   self._search_sharded(processes, {k: v for k, v in params.items()
+                                                    if k not in ('order', 'limit', 'offset', 'count_only', 'randomize')}))
+        if matches is None:
+            return self._fetch_search(self._compile_search(**params), count_only)
+        if count_only:
+            return len(matches)
+
+        limit, offset = params.get('limit'), params.get('offset', 0)
+        _order = ('RANDOM()' if params.get('randomize') else 'score DESC, ' + self._order(params.get('order', ['+id'])))
+        return self._fetch('SELECT id, url, metadata, tags, desc, flags FROM bookmarks\n'
+                           "JOIN (SELECT json_extract(value, '$[0]') AS match_id, json_extract(value, '$[1]') AS score\n"
+                           '  FROM json_each(?)) ON id = match_id\n'
+                           f'ORDER BY {_order}\nLIMIT ? OFFSET ?', json.dumps(matches), (-1 if limit is None else limit), offset)
+
+    def _search_sharded(self, processes: int, params: Dict[str, Any]) -> Optional[List[list]]:
+        """Finds matches ([id, score]) of a search compiled from params (without ordering & paging), sharded by id ranges
+        among worker processes (each using a separate read-only connection); returns None if it shouldn't be sharded.
+        Matches of the last sharded search are kept until the DB changes, so paging & counting them doesn't rerun it."""
+        with self.lock:
+            state = (self.cur.execute('PRAGMA data_version').fetchone()[0], self.conn.total_changes)
+        key = (processes, json.dumps(params, sort_keys=True))
+        if self._sharded[:2] == (key, state):
+            return self._sharded[2]
+        workers = processes
+        if workers == 0:  # a process per CPU in a large DB
+            with self.lock:
+                total = self.cur.execute('SELECT COUNT(*) FROM bookmarks').fetchone()[0]
+            workers = (1 if total < REGEX_PARALLEL else os.cpu_count() or 1)
+        max_id = (workers > 1 and self.get_max_id() or 0)
+        if workers < 2 or not max_id or self.conn.in_transaction or not self.dbfile:  # uncommitted changes are only visible here
+            return None
+
+        step = -(-max_id // (workers * REGEX_SHARDS))
+        shards = [(start, start + step - 1) for start in range(1, max_id + 1, step)]
+        queries = [self._compile_search(**params, shard=shard) for shard in shards]
+        if not all(queries):
+            return []
+        LOGDBG('sharded query: "%s", shards: %s', queries[0][0], shards)
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers, len(shards)), mp_context=mp_context()) as pool:
+                matches = [row for rows in pool.map(search_shard, [self.dbfile] * len(queries), *zip(*queries)) for row in rows]
+        except (sqlite3.Error, OSError, BrokenExecutor) as e:
+            LOGERR(e)
+            return []
+        self._sharded = (key, state, matches)
+        return matches
+
     def searchdb(
             self,
             keywords: List[str],
@@ -1615,7 +3001,13 @@ class BukuDb:
             regex: bool = False,
             markers: bool = False,
             order: List[str] = ['+id'],
-    ) -> List[BookmarkVar]:
+            *,
+            limit: Optional[int] = None,
+            offset: int = 0,
+            count_only: bool = False,
+            randomize: bool = False,
+            processes: Optional[int] = None,
+    ) -> List[BookmarkVar] | int:
         """Search DB for entries where tags, URL, or title fields match keywords.
 
         Parameters
@@ -1624,7 +3016,8 @@ class BukuDb:
             Keywords to search.
         order : list of str
             Order description (fields from JSON export or DB, prepended with '+'/'-' for ASC/DESC).
-            Note: this applies to fields with the same number of matched keywords.
+            Note: this applies to fields with the same number of matched keywords
+            (or with the same relevance, when the full-text search index is used).
         all_keywords : bool
             False (default value) to return records matching ANY keyword.
             True to return records matching ALL keywords. This also enables special
@@ -1636,53 +3029,62 @@ class BukuDb:
         regex : bool
             Match a regular expression if True. Default is False.
             Overrides deep, all_keywords, and comma matching in tags with markers.
+        limit : int, optional
+            Maximum number of results to return. Default is None (no limit).
+        offset : int
+            Number of leading results to skip. Default is 0.
+        count_only : bool
+            True to return the number of matching records instead (ignoring limit & offset). Default is False.
+        randomize : bool
+            True to return results in random order (a random sample when limit is set). Default is False.
+        processes : int, optional
+            Number of worker processes to shard a regex search among (by id ranges); 0 means a process per CPU
+            if the DB holds REGEX_PARALLEL records or more. By default, the search is not sharded.
+            (Matches of the last sharded search are reused for paging & counting until the DB changes.)
 
         Returns
         -------
-        list
-            List of search results.
+        list or int
+            List of search results (or their number if count_only is True).
         """
-        _order = self._order(order)
-        clauses, qargs = [], []
-        for keyword in keywords:
-            tokens = self._search_tokens(keyword, deep=deep, markers=markers)
-            clause, args = self._search_clause(tokens, regex=regex)
-            if clause and args:
-                clauses += [f'({clause})']
-                qargs += args
-        if not qargs:
-            return []
+        return self._search(processes, keywords=keywords, all_keywords=all_keywords, deep=deep, regex=regex, markers=markers,
+                            order=order, limit=limit, offset=offset, count_only=count_only, randomize=randomize)
 
-        _count = lambda x: f'CASE WHEN {x} THEN 1 ELSE 0 END'
-        if regex:
-            query = ('SELECT id, url, metadata, tags, desc, flags\nFROM (SELECT *, (' +
-                     '\n    + '.join(map(_count, clauses)) +
-                     f') AS score\n  FROM bookmarks WHERE score > 0 ORDER BY score DESC, {_order})')
-        elif all_keywords:
-            if keywords == ['blank']:
-                qargs, query = [DELIM], "SELECT * FROM bookmarks WHERE metadata = '' OR tags = ?"
-            elif keywords == ['immutable']:
-                qargs, query = [], 'SELECT * FROM bookmarks WHERE flags & 1 == 1'
-            else:
-                query = 'SELECT id, url, metadata, tags, desc, flags FROM bookmarks WHERE ' + '\n  AND '.join(clauses)
-            query += f'\nORDER BY {_order}'
-        elif not all_keywords:
-            query = ('SELECT id, url, metadata, tags, desc, flags\nFROM (SELECT *, (' +
-                     '\n    + '.join(map(_count, clauses)) +
-                     f') AS score\n  FROM bookmarks WHERE score > 0 ORDER BY score DESC, {_order})')
-        else:
-            LOGERR('Invalid search option')
-            return []
+    def search_by_netloc(self, netloc: Optional[str], order: List[str] = ['+id']) -> List[BookmarkVar]:
+        """Search bookmarks for entries with given netloc (case-sensitive, as in the URL).
 
-        LOGDBG('query: "%s", args: %s', query, qargs)
+        Parameters
+        ----------
+        netloc : str
+            Netloc to search for ('' or None matches bookmarks without netloc).
+        order : list of str
+            Order description (fields from JSON export or DB, prepended with '+'/'-' for ASC/DESC).
 
-        try:
-            return self._fetch(query, *qargs)
-        except sqlite3.OperationalError as e:
-            LOGERR(e)
-            return []
+        Returns
+        -------
+        list
+            List of search results.
+        """
+
+        _order = self._order(order)
+        if not netloc:
+            return self._fetch(f'SELECT id, url, metadata, tags, desc, flags FROM bookmarks WHERE netloc IS NULL ORDER BY {_order}')
+        return self._fetch('SELECT id, url, metadata, tags, desc, flags FROM bookmarks '  # (the index is case-insensitive)
+                           f'WHERE netloc = ? AND netloc = ? COLLATE BINARY ORDER BY {_order}', netloc, netloc)
 
-    def search_by_tag(self, tags: Optional[str], order: List[str] = ['+id']) -> List[BookmarkVar]:
+    def search_by_tag(
+            self,
+            tags: Optional[str],
+            order: List[str] = ['+id'],
+            *,
+            without: Optional[List[str]] = None,
+            deep: bool = False,
+            markers: bool = False,
+            limit: Optional[int] = None,
+            offset: int = 0,
+            count_only: bool = False,
+            randomize: bool = False,
+    ) -> List[BookmarkVar] | int:
         """Search bookmarks for entries with given tags.
 
         Parameters
@@ -1696,43 +3098,31 @@ class BukuDb:
         order : list of str
             Order description (fields from JSON export or DB, prepended with '+'/'-' for ASC/DESC).
             Note: this applies to fields with the same number of matched tags.
+        without : list of str
+            Keywords to exclude; ignored if empty. Default is None.
+        deep : bool
+            True to search for matching substrings of excluded keywords. Default is False.
+        markers : bool
+            True to use prefix markers for excluded keywords. Default is False.
+        limit : int, optional
+            Maximum number of results to return. Default is None (no limit).
+        offset : int
+            Number of leading results to skip. Default is 0.
+        count_only : bool
+            True to return the number of matching records instead (ignoring limit & offset). Default is False.
+        randomize : bool
+            True to return results in random order (a random sample when limit is set). Default is False.
 
-        Returns
-        -------
-        list
-            List of search results.
-        """
-
-        _order = self._order(order)
-        LOGDBG(tags)
-        if tags is None or tags == DELIM or tags == '':
-            return []
-
-        qargs, search_operator, excluded_tags = prep_tag_search(tags)
-        if search_operator is None:
-            LOGERR("Cannot use both '+' and ',' in same search")
-            return []
-
-        LOGDBG('tags: %s', qargs)
-        LOGDBG('search_operator: %s', search_operator)
-        LOGDBG('excluded_tags: %s', excluded_tags)
-
-        if search_operator == 'AND':
-            query = ('SELECT id, url, metadata, tags, desc, flags FROM bookmarks WHERE (' +
-                     f' {search_operator} '.join("tags LIKE '%' || ? || '%'" for tag in qargs) +
-                     ')' + ('' if not excluded_tags else ' AND tags NOT REGEXP ?') +
-                     f' ORDER BY {_order}')
-        else:
-            query = ('SELECT id, url, metadata, tags, desc, flags FROM (SELECT *, ' +
-                     ' + '.join("CASE WHEN tags LIKE '%' || ? || '%' THEN 1 ELSE 0 END" for tag in qargs) +
-                     ' AS score FROM bookmarks WHERE score > 0' +
-                     ('' if not excluded_tags else ' AND tags NOT REGEXP ?') +
-                     f' ORDER BY score DESC, {_order})')
-        if excluded_tags:
-            qargs += [excluded_tags]
+        Returns
+        -------
+        list or int
+            List of search results (or their number if count_only is True).
+        """
 
-        LOGDBG('query: "%s", args: %s', query, qargs)
-        return self._fetch(query, *qargs)
+        LOGDBG(tags)
+        compiled = tags is not None and self._compile_search(stag=tags, without=without, deep=deep, markers=markers, order=order,
+                                                             limit=limit, offset=offset, count_only=count_only, randomize=randomize)
+        return self._fetch_search(compiled, count_only)
 
     def search_keywords_and_filter_by_tags(
             self,
@@ -1743,10 +3133,19 @@ class BukuDb:
             stag: Optional[List[str]] = None,
             without: Optional[List[str]] = None,
             markers: bool = False,
-            order: List[str] = ['+id']) -> List[BookmarkVar]:
+            order: List[str] = ['+id'],
+            *,
+            limit: Optional[int] = None,
+            offset: int = 0,
+            count_only: bool = False,
+            randomize: bool = False,
+            processes: Optional[int] = None) -> List[BookmarkVar] | int:
         """Search bookmarks for entries with keywords and specified
         criteria while filtering out entries with matching tags.
 
+        All criteria are combined into a single SQL query; the result is the same as running
+        searchdb() and narrowing it down with search_by_tag() and exclude_results_from_search().
+
         Parameters
         ----------
         keywords : list of str
@@ -1768,16 +3167,29 @@ class BukuDb:
             delimited with ','.
             Retrieves entries matching ALL tags if tags are
             delimited with '+'.
+        order : list of str
+            Order description (fields from JSON export or DB, prepended with '+'/'-' for ASC/DESC).
+        limit : int, optional
+            Maximum number of results to return. Default is None (no limit).
+        offset : int
+            Number of leading results to skip. Default is 0.
+        count_only : bool
+            True to return the number of matching records instead (ignoring limit & offset). Default is False.
+        randomize : bool
+            True to return results in random order (a random sample when limit is set). Default is False.
+        processes : int, optional
+            Number of worker processes to shard a regex search among (by id ranges); 0 means a process per CPU
+            if the DB holds REGEX_PARALLEL records or more. By default, the search is not sharded.
 
         Returns
         -------
-        list
-            List of search results.
+        list or int
+            List of search results (or their number if count_only is True).
         """
 
-        results = self.searchdb(keywords, all_keywords=all_keywords, deep=deep, regex=regex, markers=markers, order=order)
-        results = (results if not stag else filter_from(results, self.search_by_tag(''.join(stag))))
-        return self.exclude_results_from_search(results, without, deep=deep, markers=markers)
+        return self._search(processes, keywords=keywords, all_keywords=all_keywords, deep=deep, regex=regex, markers=markers,
+                            stag=(None if not stag else ''.join(stag)), without=without, order=order,
+                            limit=limit, offset=offset, count_only=count_only, randomize=randomize)
 
     def exclude_results_from_search(self, search_results, without, deep=False, markers=False):
         """Excludes records that match keyword search using without parameters
@@ -1803,6 +3215,57 @@ class BukuDb:
             return search_results
         return filter_from(search_results, self.searchdb(without, deep=deep, markers=markers), exclude=True)
 
+    def refine_results(self, search_results, keywords, deep=False, regex=False, markers=False) -> List[BookmarkVar]:
+        """Narrows down search results to records matching ALL keywords, without querying the DB.
+
+        Keywords are matched the same way as in BukuDb.searchdb(); the order of results is preserved.
+
+        Parameters
+        ----------
+        search_results : list
+            List of search results.
+        keywords : list of str
+            Keywords to match. If empty, returning search_results unchanged.
+        deep : bool
+            True to search for matching substrings. Default is False.
+        regex : bool
+            Match a regular expression if True. Default is False.
+        markers: bool
+            True to use prefix markers for different fields. Default is False.
+
+        Returns
+        -------
+        list
+            List of search results.
+        """
+
+        _fields = {'url': 1, 'metadata': 2, 'tags': 3, 'desc': 4}  # BookmarkVar positions
+
+        def _search(op, arg):
+            if op != 'LIKE':
+                return compile_regex(arg).search
+            search, s = MemoryIndex._like_regex(arg).search, arg.translate(_ASCII_LOWER)
+            if re.search('[%_]', arg):
+                return search
+            return lambda value: (s in value.lower() if value.isascii() else search(value))  # str.lower() is faster
+
+        records = list(bookmark_vars(search_results))
+        try:
+            for keyword in keywords:  # each keyword narrows down the remaining records
+                alternatives = [[(_fields[field], _search(op, arg)) for field, op, arg in conditions]
+                                for conditions in self._search_conditions(self._search_tokens(keyword, deep=deep, markers=markers),
+                                                                          regex=regex)]
+                if all(len(conditions) == 1 for conditions in alternatives):
+                    fields = [conditions[0] for conditions in alternatives]
+                    records = [x for x in records if any(x[i] is not None and search(x[i]) for i, search in fields)]
+                elif alternatives:
+                    records = [x for x in records if any(all(x[i] is not None and search(x[i]) for i, search in conditions)
+                                                         for conditions in alternatives)]
+        except re.error as e:
+            LOGERR(e)
+            return []
+        return records
+
     def swap_recs(self, index1: int, index2: int, *, lock: bool = True, delay_commit: bool = False):
         """Swaps two records with given indices
 
@@ -1873,7 +3336,7 @@ class BukuDb:
                     msg = f'Index {max_id} moved to {index}'
                 if not delay_commit:
                     self.conn.commit()
-                    self.cur.execute('VACUUM')
+                    self._reclaim_space()
             if self.chatty:
                 print(msg)
 
@@ -2012,7 +3475,7 @@ class BukuDb:
                     self.compactdb(low, upto=high, delay_commit=True, retain_order=retain_order)
                     if not delay_commit:
                         self.conn.commit()
-                        self.cur.execute('VACUUM')
+                        self._reclaim_space()
             except IndexError:
                 LOGERR('No matching index')
                 return False
@@ -2042,7 +3505,7 @@ class BukuDb:
                         self.compactdb(index, delay_commit=True, retain_order=retain_order)
                         if not delay_commit:
                             self.conn.commit()
-                            self.cur.execute('VACUUM')
+                            self._reclaim_space()
                     else:
                         LOGERR('No matching index %d', index)
                         return False
@@ -2056,13 +3519,7 @@ class BukuDb:
         return True
 
     def delete_resultset(self, results, retain_order=False):
-        """Delete search results in descending order of DB index.
-
-        Indices are expected to be unique and in ascending order.
-
-        Notes
-        -----
-            This API forces a delayed commit.
+        """Delete search results (in a single operation).
 
         Parameters
         ----------
@@ -2082,18 +3539,72 @@ class BukuDb:
             if resp != 'y':
                 return False
 
-        # delete records in reverse order
-        ids = sorted(set(x[0] for x in results))
-        with self.lock:
-            for pos, id in reversed(list(enumerate(ids))):
-                self.delete_rec(id, delay_commit=True, retain_order=retain_order)
+        count = self.delete_recs([x[0] for x in results], retain_order=retain_order)
+        if count is None:
+            return False
+        if self.chatty:
+            print('%d deleted' % count)
+        return True
 
-                # Commit at every 200th removal, counting from the end
-                if pos % 200 == 0:
-                    self.conn.commit()
-                    self.cur.execute('VACUUM')
+    def delete_recs(self, indices: Iterable[int], *, retain_order: bool = False, delay_commit: bool = False) -> Optional[int]:
+        """Delete multiple records at once, then compact the indices of remaining ones in a single pass.
 
-        return True
+        Without retain_order, the freed positions are filled by the last records (keeping
+        their relative order), same as when deleting a range with delete_rec().
+
+        Parameters
+        ----------
+        indices : int[] | int{} | range
+            DB indices of the records to delete (nonexistent ones are ignored).
+        retain_order : bool
+            Shift indices of following records instead of moving the last ones
+            into the freed positions. Default is False.
+        delay_commit : bool
+            True if the changes should not be committed to the DB,
+            leaving commit responsibility to caller. Default is False.
+
+        Returns
+        -------
+        int
+            Number of deleted records (None on failure).
+        """
+        with self.lock:
+            try:
+                self.cur.execute('CREATE TEMP TABLE deleted_ids (id integer PRIMARY KEY)')
+                self.cur.execute('CREATE TEMP TABLE moved_ids (old integer PRIMARY KEY, new integer NOT NULL)')
+                self.cur.executemany('INSERT OR IGNORE INTO temp.deleted_ids (id) VALUES (?)', ((x,) for x in indices))
+                self.cur.execute('DELETE FROM temp.deleted_ids WHERE id NOT IN (SELECT id FROM bookmarks)')
+                self.cur.execute('DELETE FROM bookmarks WHERE id IN (SELECT id FROM temp.deleted_ids)')
+                count = self.cur.rowcount
+                if retain_order:  # each record is shifted by the number of deleted ones preceding it
+                    self.cur.execute(
+                        'INSERT INTO temp.moved_ids (old, new) SELECT id, new FROM ('
+                        'SELECT id, deleted, id - SUM(deleted) OVER (ORDER BY id) AS new FROM ('
+                        'SELECT id, 0 AS deleted FROM bookmarks WHERE id > (SELECT MIN(id) FROM temp.deleted_ids) '
+                        'UNION ALL SELECT id, 1 FROM temp.deleted_ids)) WHERE NOT deleted')
+                else:  # freed positions are filled by the last records (matched in order)
+                    self.cur.execute(
+                        'WITH remaining AS (SELECT COUNT(*) AS n FROM bookmarks) '
+                        'INSERT INTO temp.moved_ids (old, new) SELECT moved.id, freed.id FROM '
+                        '(SELECT id, ROW_NUMBER() OVER (ORDER BY id DESC) AS pos FROM bookmarks '
+                        ' WHERE id > (SELECT n FROM remaining)) AS moved JOIN '
+                        '(SELECT id, ROW_NUMBER() OVER (ORDER BY id DESC) AS pos FROM temp.deleted_ids '
+                        ' WHERE id <= (SELECT n FROM remaining)) AS freed USING (pos)')
+                # (the new indices are lower, and the records are updated in ascending order)
+                self.cur.execute('UPDATE bookmarks SET id = (SELECT new FROM temp.moved_ids WHERE old = bookmarks.id) '
+                                 'WHERE id IN (SELECT old FROM temp.moved_ids)')
+                if not delay_commit:
+                    self.conn.commit()
+            except sqlite3.Error as e:
+                LOGERR('delete_recs(): %s', e)
+                self.conn.rollback()
+                return None
+            finally:
+                for table in ('deleted_ids', 'moved_ids'):
+                    self.cur.execute(f'DROP TABLE IF EXISTS temp.{table}')
+            if not delay_commit:
+                self._reclaim_space()
+            return count
 
     def delete_rec_all(self, delay_commit=False):
         """Removes all records in the Bookmarks table.
@@ -2115,7 +3626,7 @@ class BukuDb:
                 self.cur.execute('DELETE FROM bookmarks')
                 if not delay_commit:
                     self.conn.commit()
-                    self.cur.execute('VACUUM')
+                    self._reclaim_space()
             return True
         except Exception as e:
             LOGERR('delete_rec_all(): %s', e)
@@ -2227,25 +3738,16 @@ class BukuDb:
             if low > high:
                 low, high = high, low
 
-            try:
-                # If range starts from 0 print all records
-                with self.lock:
-                    if low == 0:
-                        query = f'SELECT * from bookmarks ORDER BY {_order}'
-                        resultset = self.cur.execute(query)
-                    else:
-                        query = f'SELECT * from bookmarks where id BETWEEN ? AND ? ORDER BY {_order}'
-                        resultset = self.cur.execute(query, (low, high))
-            except IndexError:
-                LOGERR('Index out of range')
-                return False
+            # If range starts from 0 print all records
+            resultset = self.iter_rec(order, indices=(None if low == 0 else range(low, high + 1)))
         elif index:  # Show record at index
             try:
                 if isinstance(index, int):
-                    results = self._fetch('SELECT * FROM bookmarks WHERE id = ? LIMIT 1', index)
+                    results = self._fetch('SELECT id, url, metadata, tags, desc, flags FROM bookmarks WHERE id = ? LIMIT 1', index)
                 else:
                     placeholder = ', '.join(['?'] * len(index))
-                    results = self._fetch(f'SELECT * FROM bookmarks WHERE id IN ({placeholder}) ORDER BY {_order}', *index)
+                    results = self._fetch('SELECT id, url, metadata, tags, desc, flags FROM bookmarks '
+                                          f'WHERE id IN ({placeholder}) ORDER BY {_order}', *index)
             except IndexError:
                 results = None
             if not results:
@@ -2262,18 +3764,17 @@ class BukuDb:
 
             return True
         else:  # Show all entries
-            with self.lock:
-                self.cur.execute(f'SELECT * FROM bookmarks ORDER BY {_order}')
-                resultset = self.cur.fetchall()
-
-        if not resultset:
-            LOGERR('0 records')
-            return True
+            resultset = self.iter_rec(order)  # records are streamed rather than loaded at once
+            first = next(resultset, None)
+            if first is None:
+                LOGERR('0 records')
+                return True
+            resultset = chain([first], resultset)
 
         if self.json is None:
             print_rec_with_filter(resultset, self.field_filter)
         elif self.json:
-            write_string_to_file(format_json(resultset, field_filter=self.field_filter), self.json)
+            write_string_to_file(iter_json(resultset, field_filter=self.field_filter), self.json)
         else:
             print_json_safe(resultset, field_filter=self.field_filter)
 
@@ -2289,32 +3790,59 @@ class BukuDb:
              dictionary of {tag: usage_count}).
         """
 
-        tags = []
-        unique_tags = []
-        dic = {}
-        qry = 'SELECT DISTINCT tags, COUNT(tags) FROM bookmarks GROUP BY tags'
         with self.lock:
-            for row in self.cur.execute(qry):
-                tagset = row[0].strip(DELIM).split(DELIM)
-                for tag in tagset:
-                    if tag not in tags:
-                        dic[tag] = row[1]
-                        tags += (tag,)
-                    else:
-                        dic[tag] += row[1]
+            self.cur.execute("SELECT COALESCE(name, ''), count FROM tag_counts LEFT JOIN tags ON tags.id = tag_id WHERE count > 0")
+            counts = dict(self.cur.fetchall())
 
-        if not tags:
-            return tags, dic
+        untagged = counts.pop('', 0)
+        unique_tags = sorted(counts)
+        dic = ({'': untagged} if untagged else {})
+        dic.update((tag, counts[tag]) for tag in unique_tags)
+        return unique_tags, dic
 
-        if tags[0] == '':
-            unique_tags = sorted(tags[1:])
-        else:
-            unique_tags = sorted(tags)
+    def get_netloc_all(self) -> Dict[str, int]:
+        """Get netlocs of all bookmarks in DB.
 
-        return unique_tags, dic
+        Returns
+        -------
+        dict
+            Dictionary of {netloc: usage_count}, sorted alphabetically
+            ('' stands for bookmarks without netloc).
+        """
+
+        with self.lock:
+            self.cur.execute('SELECT netloc, COUNT(*) FROM bookmarks '  # (counted as in the URL, ordered case-insensitively)
+                             'GROUP BY netloc COLLATE BINARY ORDER BY netloc, netloc COLLATE BINARY')
+            return {netloc or '': count for netloc, count in self.cur.fetchall()}
+
+    def get_related_tags(self, tags: Sequence[str], *, limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        """Get tags that go together with the given ones in DB, ranked by co-occurrence.
+
+        Parameters
+        ----------
+        tags : str[]
+            Tags to find related ones for.
+        limit : int, optional
+            Maximum number of tags to return.
+
+        Returns
+        -------
+        list
+            (tag, count) pairs, where count is the number of bookmarks having both the tag and one of given tags
+            (summed over them); ordered by count (descending), then by tag name.
+        """
+
+        tags = json.dumps([tag for tag in tags if tag])
+        query = ('SELECT related.name, SUM(count) AS total FROM json_each(?) AS tag JOIN tags ON tags.name = tag.value '
+                 'JOIN tag_pairs ON tag_pairs.tag_id = tags.id JOIN tags AS related ON related.id = other_id '
+                 'WHERE related.name NOT IN (SELECT value FROM json_each(?)) GROUP BY other_id ORDER BY total DESC, related.name' +
+                 ('' if limit is None else ' LIMIT ?'))
+        with self.lock:
+            self.cur.execute(query, (tags, tags) + (() if limit is None else (limit,)))
+            return self.cur.fetchall()
 
     def suggest_similar_tag(self, tagstr):
-        """Show list of tags those go together in DB.
+        """Show list of tags those go together in DB (most frequent first).
 
         Parameters
         ----------
@@ -2329,29 +3857,11 @@ class BukuDb:
 
         if not tagstr:
             return ''
-        tags = tagstr.split(',')
-
-        qry = 'SELECT DISTINCT tags FROM bookmarks WHERE tags LIKE ?'
-        tagset = set()
-        for tag in tags:
-            if tag == '':
-                continue
-
-            with self.lock:
-                self.cur.execute(qry, ('%' + delim_wrap(tag) + '%',))
-                results = self.cur.fetchall()
-            for row in results:
-                # update tagset with unique tags in row
-                tagset |= set(row[0].strip(DELIM).split(DELIM))
-
-        # remove user supplied tags from tagset
-        tagset.difference_update(tags)
 
-        if not len(tagset):
+        unique_tags = [tag for tag, _ in self.get_related_tags(tagstr.split(DELIM))]
+        if not unique_tags:
             return tagstr
 
-        unique_tags = sorted(tagset)
-
         print('similar tags:\n')
         for count, tag in enumerate(unique_tags):
             print('%d. %s' % (count + 1, tag))
@@ -2386,7 +3896,7 @@ class BukuDb:
         Raises
         -------
         ValueError: Invalid input(s) provided.
-        RuntimeError: Tag deletion failed.
+        RuntimeError: Tag deletion/replacement failed.
 
         """
 
@@ -2403,21 +3913,14 @@ class BukuDb:
         if newtags == DELIM:
             if not self.delete_tag_at_index(0, orig, chatty=self.chatty):
                 raise RuntimeError("Tag deletion failed.")
+            return
 
         # Update bookmarks with original tag
-        with self.lock:
-            query = 'SELECT id, tags FROM bookmarks WHERE tags LIKE ?'
-            self.cur.execute(query, ('%' + orig + '%',))
-            results = self.cur.fetchall()
-            if results:
-                query = 'UPDATE bookmarks SET tags = ? WHERE id = ?'
-                for row in results:
-                    tags = row[1].replace(orig, newtags)
-                    tags = parse_tags([tags])
-                    self.cur.execute(query, (tags, row[0],))
-                    print('Index %d updated' % row[0])
-
-                self.conn.commit()
+        count = self.rewrite_tags({orig.strip(DELIM): newtags})
+        if count is None:
+            raise RuntimeError("Tag replacement failed.")
+        if count > 0:
+            print('%d record(s) updated' % count)
 
     def get_tagstr_from_taglist(self, id_list, taglist):
         """Get a string of delimiter-separated (and enclosed) string
@@ -2616,7 +4119,7 @@ class BukuDb:
         return False
 
     def exportdb(self, filepath: str, resultset: Optional[List[BookmarkVar]] = None,
-                 order: List[str] = ['id'], pick: Optional[int] = None) -> bool:
+                 order: List[str] = ['id'], pick: Optional[int] = None, on_conflict: Optional[str] = None) -> bool:
         """Export DB bookmarks to file.
         Exports full DB, if resultset is None.
         Additionally, if run after a (batch) update with export_on, only export those records.
@@ -2645,7 +4148,10 @@ class BukuDb:
             Order description (fields from JSON export or DB, prepended with '+'/'-' for ASC/DESC).
         pick : int, optional
             Reduce the export to a random subset of up to given (positive) size. Default is None.
-
+        on_conflict : str, optional
+            When exporting to an existing buku database file, merge into it instead of overwriting;
+            bookmarks with URLs already in it are handled as specified ('skip', 'merge_tags' or 'replace').
+            (See BukuDb.add_recs() for details.)
 
         Returns
         -------
@@ -2674,7 +4180,8 @@ class BukuDb:
         if pick and pick < len(resultset):
             resultset = self._sort(random.sample(resultset, pick), order)
 
-        if os.path.exists(filepath):
+        merge = on_conflict is not None and filepath.endswith('.db')
+        if os.path.exists(filepath) and not merge:
             resp = read_in(filepath + ' exists. Overwrite? (y/n): ')
             if resp != 'y':
                 return False
@@ -2683,19 +4190,7 @@ class BukuDb:
                 os.remove(filepath)
 
         if filepath.endswith('.db'):
-            outdb = BukuDb(dbfile=filepath)
-            qry = 'INSERT INTO bookmarks(URL, metadata, tags, desc, flags) VALUES (?, ?, ?, ?, ?)'
-            for row in resultset:
-                _old = old.get(row.url)
-                _add = (f' (OLD URL = {_old})' if isinstance(_old, str) and _old != row.url else
-                        ' (DELETED)' if _old is row else '')
-                title = ((row.title or '') + _add if _add else row.title)
-                outdb.cur.execute(qry, (row.url, title, row.tags_raw, row.desc, row.flags))
-                count += 1
-            outdb.conn.commit()
-            outdb.close()
-            print('%s exported' % count)
-            return True
+            return self._export_db(filepath, resultset, old, on_conflict or 'skip')
 
         with open(filepath, mode='w', encoding='utf-8') as outfp:
             res = {}  # type: Dict
@@ -2723,6 +4218,54 @@ class BukuDb:
             return True
         return False
 
+    def _export_db(self, filepath: str, resultset: List[BookmarkVar], old: Dict[str, str | BookmarkVar], on_conflict: str) -> bool:
+        """Exports bookmarks to a buku database file (attached to the connection)."""
+
+        _fields = 'URL, metadata, tags, desc, flags'
+        _upsert = self._on_conflict(on_conflict)
+        try:
+            conn, cur = BukuDb.initdb(filepath)  # creating/updating the schema
+            cur.close()
+            conn.close()
+        except Exception:
+            return False
+
+        with self.lock:
+            try:
+                self.conn.commit()  # ATTACH is not allowed within a transaction
+                self.cur.execute('ATTACH DATABASE ? AS export', (filepath,))
+            except Exception as e:
+                LOGERR(e)
+                return False
+            try:
+                if old:  # records from a (batch) update with export_on are annotated, and may be missing from DB
+                    rows = []
+                    for row in resultset:
+                        _old = old.get(row.url)
+                        _add = (f' (OLD URL = {_old})' if isinstance(_old, str) and _old != row.url else
+                                ' (DELETED)' if _old is row else '')
+                        title = ((row.title or '') + _add if _add else row.title)
+                        rows += [(row.url, title, row.tags_raw, row.desc, row.flags)]
+                    query = f'INSERT INTO export.bookmarks ({_fields}) VALUES (?, ?, ?, ?, ?) {_upsert}'
+                    result = self._upsert(query, rows, table='export.bookmarks')
+                else:  # copying records in the same order
+                    _picked = 'FROM main.bookmarks AS bm JOIN json_each(?) AS pick ON pick.value = bm.id'
+                    query = f'INSERT INTO export.bookmarks ({_fields}) SELECT {_fields} {_picked} WHERE true ORDER BY pick.key {_upsert}'
+                    result = self._upsert(query, args=[json.dumps([x.id for x in resultset])], table='export.bookmarks',
+                                          urls=f'SELECT bm.URL AS url {_picked}', total=len(resultset))
+                self.conn.commit()
+            except Exception as e:
+                LOGERR(e)
+                self.conn.rollback()
+                return False
+            finally:
+                self.cur.execute('DETACH DATABASE export')
+
+        print('%s exported' % len(resultset))
+        if self.chatty:
+            print('%d added, %d updated, %d skipped' % result[:3])
+        return True
+
     def traverse_bm_folder(self, sublist, unique_tag, folder_name, add_parent_folder_as_tag):
         """Traverse bookmark folders recursively and find bookmarks.
 
@@ -2782,16 +4325,10 @@ class BukuDb:
             data = json.load(datafile)
 
         roots = data['roots']
-        for entry in roots:
-            # Needed to skip 'sync_transaction_version' key from roots
-            if isinstance(roots[entry], str):
-                continue
-            for item in self.traverse_bm_folder(
-                    roots[entry]['children'],
-                    unique_tag,
-                    roots[entry]['name'],
-                    add_parent_folder_as_tag):
-                self.add_rec(*item)
+        items = (item for root in roots.values()
+                 if not isinstance(root, str)  # Needed to skip 'sync_transaction_version' key from roots
+                 for item in self.traverse_bm_folder(root['children'], unique_tag, root['name'], add_parent_folder_as_tag))
+        self.add_recs(items, delay_commit=True)
 
     def load_firefox_database(self, path, unique_tag, add_parent_folder_as_tag):
         """Connect to Firefox sqlite db and import bookmarks into BukuDb.
@@ -2810,6 +4347,15 @@ class BukuDb:
         conn = sqlite3.connect('file:%s?mode=ro' % path, uri=True)
 
         cur = conn.cursor()
+        self.add_recs(self._firefox_items(cur, unique_tag, add_parent_folder_as_tag), delay_commit=True)
+        try:
+            cur.close()
+            conn.close()
+        except Exception as e:
+            LOGERR(e)
+
+    @staticmethod
+    def _firefox_items(cur, unique_tag, add_parent_folder_as_tag):
         res = cur.execute('SELECT DISTINCT fk, parent, title FROM moz_bookmarks WHERE type=1')
         # get id's and remove duplicates
         for row in res.fetchall():
@@ -2850,12 +4396,7 @@ class BukuDb:
             # get the title
             title = row[2] or ''
 
-            self.add_rec(url, title, tags, None, 0, True, False)
-        try:
-            cur.close()
-            conn.close()
-        except Exception as e:
-            LOGERR(e)
+            yield (url, title, tags, None, 0, True, False)
 
     def load_edge_database(self, path, unique_tag, add_parent_folder_as_tag):
         """Open Edge Bookmarks JSON file and import data.
@@ -2874,16 +4415,10 @@ class BukuDb:
             data = json.load(datafile)
 
         roots = data['roots']
-        for entry in roots:
-            # Needed to skip 'sync_transaction_version' key from roots
-            if isinstance(roots[entry], str):
-                continue
-            for item in self.traverse_bm_folder(
-                    roots[entry]['children'],
-                    unique_tag,
-                    roots[entry]['name'],
-                    add_parent_folder_as_tag):
-                self.add_rec(*item)
+        items = (item for root in roots.values()
+                 if not isinstance(root, str)  # Needed to skip 'sync_transaction_version' key from roots
+                 for item in self.traverse_bm_folder(root['children'], unique_tag, root['name'], add_parent_folder_as_tag))
+        self.add_recs(items, delay_commit=True)
 
     def auto_import_from_browser(self, firefox_profile=None, firefox_profiles_dir=None):
         """Import bookmarks from a browser default database file.
@@ -3108,27 +4643,29 @@ n: don't add parent folder as tag
             items = import_html(soup, add_parent_folder_as_tag, newtag, use_nested_folder_structure)
             infp.close()
 
-        with self.lock:
-            for item in items:
-                add_rec_res = self.add_rec(*item)
-                if not add_rec_res and append_tags_resp == 'y':
-                    rec_id = self.get_rec_id(item[0])
-                    self.append_tag_at_index(rec_id, item[2])
-
-            self.conn.commit()
+        result = self.add_recs(items, on_conflict=('merge_tags' if append_tags_resp == 'y' else 'skip'))
+        if self.chatty:
+            print('%d added, %d updated, %d skipped' % result[:3])
+        if result.error:
+            return False
 
         if newtag:
             print('\nAuto-generated tag: %s' % newtag)
 
         return True
 
-    def mergedb(self, path):
+    def mergedb(self, path, on_conflict='skip'):
         """Merge bookmarks from another buku database file.
 
+        The source DB is attached to the connection (read-only), and copied over in a single statement.
+
         Parameters
         ----------
         path : str
             Path to DB file to merge.
+        on_conflict : str
+            Handling of bookmarks whose URL is already in DB: 'skip' (default), 'merge_tags' or 'replace'.
+            (See BukuDb.add_recs() for details.)
 
         Returns
         -------
@@ -3136,30 +4673,33 @@ n: don't add parent folder as tag
             True on success, False on failure.
         """
 
-        try:
-            # Connect to input DB
-            indb_conn = sqlite3.connect('file:%s?mode=ro' % path, uri=True)
-
-            indb_cur = indb_conn.cursor()
-            indb_cur.execute('SELECT * FROM bookmarks')
-        except Exception as e:
-            LOGERR(e)
+        query = ('INSERT INTO main.bookmarks (URL, metadata, tags, desc, flags) '
+                 "SELECT url, IFNULL(metadata, ''), IFNULL(tags, ','), IFNULL(desc, ''), IFNULL(flags, 0) "
+                 'FROM merged.bookmarks WHERE true ORDER BY id ' + self._on_conflict(on_conflict))
+        if not os.path.isfile(path):
+            LOGERR('%s not found', path)
             return False
 
-        resultset = indb_cur.fetchall()
-        if resultset:
-            with self.lock:
-                for row in bookmark_vars(resultset):
-                    self.add_rec(row.url, row.title, row.tags_raw, row.desc, row.flags, True, False)
-
+        with self.lock:
+            try:
+                self.conn.commit()  # ATTACH is not allowed within a transaction
+                self.cur.execute('ATTACH DATABASE ? AS merged', (pathlib.Path(path).resolve().as_uri() + '?mode=ro',))
+            except Exception as e:
+                LOGERR(e)
+                return False
+            try:
+                total = self.cur.execute('SELECT COUNT(*) FROM merged.bookmarks').fetchone()[0]
+                result = self._upsert(query, urls='SELECT url FROM merged.bookmarks', total=total)
                 self.conn.commit()
+            except Exception as e:
+                LOGERR(e)
+                self.conn.rollback()
+                return False
+            finally:
+                self.cur.execute('DETACH DATABASE merged')
 
-        try:
-            indb_cur.close()
-            indb_conn.close()
-        except Exception:
-            pass
-
+        if self.chatty:
+            print('%d added, %d updated, %d skipped' % result[:3])
         return True
 
     def tnyfy_url(
@@ -3217,7 +4757,8 @@ n: don't add parent folder as tag
         LOGERR('Uncached')
         return None
 
-    def fixtags(self):
+    def fixtags(self, *, dry_run: bool = False, chunk_size: int = FIXTAGS_CHUNK,
+                processes: Optional[int] = None, progress: bool = False) -> Optional[int]:
         """Undocumented API to fix tags set in earlier versions.
 
         Functionalities:
@@ -3225,27 +4766,75 @@ n: don't add parent folder as tag
         1. Remove duplicate tags
         2. Sort tags
         3. Use lower case to store tags
-        """
 
-        to_commit = False
-        with self.lock:
-            self.cur.execute('SELECT id, tags FROM bookmarks ORDER BY id ASC')
-            resultset = self.cur.fetchall()
-            query = 'UPDATE bookmarks SET tags = ? WHERE id = ?'
-            for row in resultset:
-                oldtags = row[1]
-                if oldtags == DELIM:
-                    continue
+        Records are read & updated in chunks (each written back in a separate transaction);
+        in a large DB, tags are canonicalized in a process pool.
 
-                tags = parse_tags([oldtags])
-                if tags == oldtags:
-                    continue
+        Parameters
+        ----------
+        dry_run : bool
+            Only count records to fix, without updating them. Default is False.
+        chunk_size : int
+            Number of records per chunk. Default is FIXTAGS_CHUNK.
+        processes : int, optional
+            Number of worker processes (1 disables the pool). By default, it's used from FIXTAGS_PARALLEL records on.
+        progress : bool
+            Report progress to stderr. Default is False.
+
+        Returns
+        -------
+        int | None
+            Number of fixed records (or ones to fix in dry run); None on failure.
+        """
 
-                self.cur.execute(query, (tags, row[0],))
-                to_commit = True
+        query = f"SELECT id, tags FROM bookmarks WHERE id > ? AND tags IS NOT '{DELIM}' ORDER BY id LIMIT {int(chunk_size)}"
+        total = self.get_max_id() or 0
+        workers = (1 if processes is None and total < FIXTAGS_PARALLEL else processes or os.cpu_count() or 1)
+        pool = (ProcessPoolExecutor(max_workers=workers, mp_context=mp_context()) if workers > 1 else None)
 
-            if to_commit:
-                self.conn.commit()
+        def _chunks():
+            last = 0
+            while True:
+                with self.lock:
+                    rows = self.cur.execute(query, (last,)).fetchall()
+                if not rows:
+                    return
+                yield rows
+                last = rows[-1][0]
+
+        def _results():  # (rows, changes) for each chunk, in order
+            if not pool:
+                yield from ((rows, fix_tags(rows)) for rows in _chunks())
+                return
+            pending = collections.deque()
+            for rows in _chunks():  # keeping the pool busy without reading the entire DB in advance
+                pending.append((rows, pool.submit(fix_tags, rows)))
+                if len(pending) > 2 * workers:
+                    rows, future = pending.popleft()
+                    yield rows, future.result()
+            for rows, future in pending:
+                yield rows, future.result()
+
+        done = fixed = 0
+        try:
+            for rows, changes in _results():
+                if changes and not dry_run:
+                    with self.lock:
+                        self.cur.executemany('UPDATE bookmarks SET tags = ? WHERE id = ?', changes)
+                        self.conn.commit()
+                done, fixed = rows[-1][0], fixed + len(changes)
+                if progress:
+                    sys.stderr.write(f'\r{done}/{total} checked, {fixed} {"to fix" if dry_run else "fixed"}')
+            return fixed
+        except (sqlite3.Error, OSError, BrokenExecutor) as e:
+            LOGERR('fixtags(): %s', e)
+            self.conn.rollback()
+            return None
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)
+            if progress and done:
+                sys.stderr.write('\n')
 
     def close(self):
         """Close a DB connection."""
@@ -3354,6 +4943,8 @@ PROMPT KEYS:
     a                      open all results in browser
     s keyword [...]        search for records with ANY keyword
     S keyword [...]        search for records with ALL keywords
+    / keyword [...]        narrow down current results to ALL keywords
+                           (stackable; '/' alone undoes the last one)
     d                      match substrings ('pen' matches 'opened')
     m                      search with markers - search string is split
                            into keywords by prefix markers, which determine
@@ -4601,8 +6192,8 @@ def show_taglist(obj):
 
     Parameters
     ----------
-    obj : BukuDb instance
-        A valid instance of BukuDb class.
+    obj : BukuDb or MemoryIndex instance
+        A valid instance of BukuDb class (or an in-memory index of one).
     """
 
     unique_tags, dic = obj.get_tag_all()
@@ -4617,7 +6208,8 @@ def show_taglist(obj):
         print()
 
 
-def prompt(obj, results, noninteractive=False, deep=False, listtags=False, suggest=False, num=10, markers=False, order=['+id']):
+def prompt(obj, results, noninteractive=False, deep=False, listtags=False, suggest=False, num=10, markers=False, order=['+id'],
+           mem_index=False):
     """Show each matching result from a search and prompt.
 
     Parameters
@@ -4640,19 +6232,24 @@ def prompt(obj, results, noninteractive=False, deep=False, listtags=False, sugge
         Order description (fields from JSON export or DB, prepended with '+'/'-' for ASC/DESC).
     num : int
         Number of results to show per page. Default is 10.
+    mem_index : bool
+        If True, new searches, random picks and tag listings are served from
+        an in-memory index (loaded on first use). Default is False.
     """
 
     if not isinstance(obj, BukuDb):
         LOGERR('Not a BukuDb instance')
         return
     bdb = obj
+    mem_idx = (MemoryIndex(bdb) if mem_index else None)
 
     new_results = bool(results)
     nav = ''
     cur_index = next_index = prev_index = 0
+    refined = []  # undo stack of results preceding each refinement
 
     if listtags:
-        show_taglist(obj)
+        show_taglist(mem_idx or obj)
 
     try:
         columns, _ = os.get_terminal_size()
@@ -4670,23 +6267,24 @@ def prompt(obj, results, noninteractive=False, deep=False, listtags=False, sugge
     skip_print = False
     while True:
         if (new_results or nav in ['n', 'N']) and not skip_print:
-            _total_results = len(results or [])
             cur_index = next_index              # used elsewhere as "most recent page start index"
+            if nav == 'N':
+                cur_index = min(cur_index, prev_index)
+            page = (results[cur_index:cur_index + num] if results else [])  # lazy results are fetched a page at a time
             if not results:
                 print('0 results')
                 new_results = False
-            elif cur_index >= _total_results and nav != 'N':
+            elif not page:
                 print('No more results')
                 new_results = False
             else:
-                if nav == 'N':
-                    cur_index = min(cur_index, prev_index)
                 prev_index = max(0, cur_index - num)
-                next_index = min(cur_index + num, _total_results)
+                next_index = cur_index + len(page)
                 print()
-                for i in range(cur_index, next_index):
-                    print_single_rec(results[i], i + 1, columns)
-                print('%d-%d/%d' % (cur_index + 1, next_index, _total_results))
+                for i, row in enumerate(page, cur_index + 1):
+                    print_single_rec(row, i, columns)
+                count = (results.known_count if isinstance(results, SearchResults) else len(results))
+                print('%d-%d/%s' % (cur_index + 1, next_index, (f'{next_index}+' if count is None else count)))
         skip_print = False
 
         try:
@@ -4711,8 +6309,10 @@ def prompt(obj, results, noninteractive=False, deep=False, listtags=False, sugge
         if (m := re.match(r'^R(?: (-)?([0-9]+))?$', nav.rstrip())) and (n := int(m[2] or 1)) > 0:
             skip_print = True
             if results and not m[1]:  # from search results
-                picked = random.sample(results, min(n, len(results)))
-            else:                     # from all bookmarks
+                picked = (results.sample(n) if isinstance(results, SearchResults) else random.sample(results, min(n, len(results))))
+            elif mem_idx:             # from all bookmarks
+                picked = mem_idx.sample(n)
+            else:
                 ids = range(1, 1 + (bdb.get_max_id() or 0))
                 picked = bdb.get_rec_all_by_ids(random.sample(ids, min(n, len(ids))))
             for row in bdb._sort(picked, order):
@@ -4730,30 +6330,54 @@ def prompt(obj, results, noninteractive=False, deep=False, listtags=False, sugge
         # search ANY match with new keywords
         if nav.startswith('s '):
             keywords = (nav[2:].split() if not markers else split_by_marker(nav[2:]))
-            results = bdb.searchdb(keywords, deep=deep, markers=markers, order=order)
-            new_results = True
+            results = SearchResults((mem_idx or bdb).searchdb, keywords, deep=deep, markers=markers, order=order, page_size=num)
+            new_results, refined = True, []
             cur_index = next_index = 0
             continue
 
         # search ALL match with new keywords
         if nav.startswith('S '):
             keywords = (nav[2:].split() if not markers else split_by_marker(nav[2:]))
-            results = bdb.searchdb(keywords, all_keywords=True, deep=deep, markers=markers, order=order)
-            new_results = True
+            results = SearchResults((mem_idx or bdb).searchdb, keywords, all_keywords=True, deep=deep, markers=markers, order=order,
+                                    page_size=num)
+            new_results, refined = True, []
             cur_index = next_index = 0
             continue
 
         # regular expressions search with new keywords
         if nav.startswith('r '):
             keywords = (nav[2:].split() if not markers else split_by_marker(nav[2:]))
-            results = bdb.searchdb(keywords, all_keywords=True, regex=True, markers=markers, order=order)
-            new_results = True
+            results = SearchResults((mem_idx or bdb).searchdb, keywords, all_keywords=True, regex=True, markers=markers, order=order,
+                                    page_size=num)
+            new_results, refined = True, []
             cur_index = next_index = 0
             continue
 
         # tag search with new keywords
         if nav.startswith('t '):
-            results = bdb.search_by_tag(nav[2:], order=order)
+            results = SearchResults((mem_idx or bdb).search_by_tag, nav[2:], order=order, page_size=num)
+            new_results, refined = True, []
+            cur_index = next_index = 0
+            continue
+
+        # narrow down current results in memory with '/ keyword [...]', undo with '/'
+        # (lazy search results are loaded in full, with a single query, by the first refinement)
+        if nav == '/' or nav.startswith('/ '):
+            if nav == '/' and not refined:
+                print('Nothing to undo')
+                skip_print = True
+                continue
+            if nav == '/':
+                results = refined.pop()
+            elif not results:
+                print('No results to refine')
+                skip_print = True
+                continue
+            else:
+                keywords = (nav[2:].split() if not markers else split_by_marker(nav[2:]))
+                refined += [results]
+                results = bdb.refine_results((results.tolist() if isinstance(results, SearchResults) else results),
+                                             keywords, deep=deep, markers=markers)
             new_results = True
             cur_index = next_index = 0
             continue
@@ -4805,7 +6429,7 @@ def prompt(obj, results, noninteractive=False, deep=False, listtags=False, sugge
 
         # Append or overwrite tags
         if nav.startswith('g '):
-            unique_tags, dic = obj.get_tag_all()
+            unique_tags, dic = (mem_idx or bdb).get_tag_all()
             _count = bdb.set_tag(nav[2:], unique_tags)
             if _count == -1:
                 print('Invalid input')
@@ -4814,8 +6438,8 @@ def prompt(obj, results, noninteractive=False, deep=False, listtags=False, sugge
                     tagid_list = nav[2:].split()
                     tagstr = bdb.get_tagstr_from_taglist(tagid_list, unique_tags)
                     tagstr = tagstr.strip(DELIM)
-                    results = bdb.search_by_tag(tagstr)
-                    new_results = True
+                    results = SearchResults((mem_idx or bdb).search_by_tag, tagstr, page_size=num)
+                    new_results, refined = True, []
                     cur_index = next_index = 0
                 except Exception:
                     print('Invalid input')
@@ -4865,7 +6489,7 @@ def prompt(obj, results, noninteractive=False, deep=False, listtags=False, sugge
 
         # list tags with 't'
         if nav == 't':
-            show_taglist(bdb)
+            show_taglist(mem_idx or bdb)
             continue
 
         if (nav+' ').startswith('DB '):
@@ -4887,9 +6511,10 @@ def prompt(obj, results, noninteractive=False, deep=False, listtags=False, sugge
                         print(f'DB file is being created at {newdb}')
                     _bdb = bdb
                     bdb = BukuDb(json=bdb.json, field_filter=bdb.field_filter, colorize=bdb.colorize, dbfile=newdb,
-                                 default_scheme=bdb.default_scheme)
+                                 default_scheme=bdb.default_scheme, db_profile=bdb.db_profile)
                     _bdb.close()
-                    results, new_results = [], False
+                    mem_idx = (MemoryIndex(bdb) if mem_idx else None)
+                    results, new_results, refined = [], False, []
                     cur_index = next_index = prev_index = 0
                     print(f'Loaded DB file at {bdb.dbfile}')
                 except Exception:
@@ -5103,12 +6728,12 @@ def print_single_rec(row: BookmarkVar, idx: int=0, columns: int=0):  # NOQA
         sys.exit(1)
 
 
-def write_string_to_file(content: str, filepath: str):
+def write_string_to_file(content: str | Iterable[str], filepath: str):
     """Writes given content to file
 
     Parameters
     ----------
-    content : str
+    content : str or iterable of str
     filepath : str
 
     Returns
@@ -5117,7 +6742,10 @@ def write_string_to_file(content: str, filepath: str):
     """
     try:
         with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(content)
+            if isinstance(content, str):
+                f.write(content)
+            else:
+                f.writelines(content)
     except Exception as e:
         LOGERR(e)
 
@@ -5149,6 +6777,42 @@ def format_json(resultset, single_record=False, field_filter=0):
     return json.dumps(marks, sort_keys=True, indent=4)
 
 
+def iter_json(resultset, single_record=False, field_filter=0):
+    """Generate results in JSON format, record by record.
+
+    The concatenated output is the same as returned by format_json(),
+    but the resultset is consumed lazily (so it can be streamed).
+
+    Parameters
+    ----------
+    resultset : iterable
+        Search results from DB query.
+    single_record : bool
+        If True, indicates only one record. Default is False.
+    field_filter : int
+        Indicates format for displaying bookmarks. Default is 0 ("all fields").
+
+    Yields
+    ------
+    str
+        Chunks of JSON text.
+    """
+
+    fields = [(k, JSON_FIELDS.get(k, k)) for k in FIELD_FILTER.get(field_filter, ALL_FIELDS)]
+    marks = ({field: getattr(row, k) for k, field in fields} for row in bookmark_vars(resultset))
+    if single_record:
+        marks = list(marks)
+        yield json.dumps(marks[-1] if marks else {}, sort_keys=True, indent=4)
+        return
+
+    empty = True
+    for mark in marks:
+        text = json.dumps(mark, sort_keys=True, indent=4).replace('\n', '\n    ')
+        yield ('[\n' if empty else ',\n') + '    ' + text
+        empty = False
+    yield ('[]' if empty else '\n]')
+
+
 def print_json_safe(resultset, single_record=False, field_filter=0):
     """Prints json results and handles IOError
 
@@ -5167,7 +6831,9 @@ def print_json_safe(resultset, single_record=False, field_filter=0):
     """
 
     try:
-        print(format_json(resultset, single_record, field_filter))
+        for chunk in iter_json(resultset, single_record, field_filter):
+            sys.stdout.write(chunk)
+        print()
     except IOError:
         try:
             sys.stdout.close()
@@ -5334,7 +7000,28 @@ def regexp(expr, item):
         LOGDBG('expr: [%s], item: [%s]', expr, item)
         return False
 
-    return re.search(expr, item, re.IGNORECASE) is not None
+    return compile_regex(expr).search(item) is not None
+
+
+@lru_cache(maxsize=256)
+def compile_regex(expr):
+    """Compile a (case-insensitive) regular expression, caching recently used ones.
+
+    Unlike the internal cache of the re module, this one is not shared with
+    other code, so patterns used in DB queries are not evicted by unrelated regex calls.
+
+    Parameters
+    ----------
+    expr : str
+        Regular expression to compile.
+
+    Returns
+    -------
+    re.Pattern
+        Compiled regular expression.
+    """
+
+    return re.compile(expr, re.IGNORECASE)
 
 
 def delim_wrap(token):
@@ -6057,6 +7744,11 @@ POSITIONAL ARGUMENTS:
                          (requires --update and --export; specific
                          HTTP response filter can be provided)
     --reorder order...   update DB indices to match specified order
+    --maintain           reclaim free space in DB file, optimize DB
+    --fts N              set up search indices (kept up to date)
+                         N=1: full-text (ranking by relevance)
+                         N=2: trigram (speeds up deep search)
+                         N=3: both; N=0: drop search indices
     --cached index|URL   browse a cached page from Wayback Machine
     --offline            add a bookmark without connecting to web
     --suggest            show similar tags when adding bookmarks
@@ -6065,7 +7757,13 @@ POSITIONAL ARGUMENTS:
     --threads N          max network connections in full refresh
                          default N=4, min N=1, max N=10
     -V                   check latest upstream version available
-    -g, --debug          show debug information and verbose logs''')
+    -g, --debug          show debug information and verbose logs
+    --profile-sql [file] show SQL statement statistics on exit
+                         (also saved into a JSON file if given)
+    --db-profile name    SQLite performance settings to use:
+                         fast, safe, readonly or default
+    --mem-index          keep an in-memory search index for the
+                         interactive prompt (loaded once)''')
     addarg = power_grp.add_argument
     addarg('--ai', action='store_true', help=hide)
     addarg('-e', '--export', nargs=1, help=hide)
@@ -6087,6 +7785,8 @@ POSITIONAL ARGUMENTS:
     addarg('--del-error', nargs='*', help=hide)
     addarg('--export-on', nargs='*', help=hide)
     addarg('--reorder', nargs='+', help=hide)
+    addarg('--maintain', action='store_true', help=hide)
+    addarg('--fts', type=int, choices={0, 1, 2, 3}, help=hide)
     addarg('--cached', nargs=1, help=hide)
     addarg('--offline', action='store_true', help=hide)
     addarg('--suggest', action='store_true', help=hide)
@@ -6095,9 +7795,13 @@ POSITIONAL ARGUMENTS:
     addarg('--threads', type=int, default=4, choices=range(1, 11), help=hide)
     addarg('-V', dest='upstream', action='store_true', help=hide)
     addarg('-g', '--debug', action='store_true', help=hide)
+    addarg('--profile-sql', nargs='?', const='', metavar='file', help=hide)
+    addarg('--db-profile', choices=list(DB_PROFILES), help=hide)
+    addarg('--mem-index', action='store_true', help=hide)
     # Undocumented APIs
     # Fix uppercase tags allowed in releases before v2.7
     addarg('--fixtags', action='store_true', help=hide)
+    addarg('--dry-run', action='store_true', help=hide)
     # App-use only, not for manual usage
     addarg('--db', nargs=1, default=[None], help=hide)
 
@@ -6160,21 +7864,23 @@ POSITIONAL ARGUMENTS:
     # Overriding text browsers is disabled by default
     browse.override_text_browser = False
 
+    if args.profile_sql is not None:
+        enable_sql_profiling(args.profile_sql or None)
     # Handle DB name (--db value without extension and path separators)
     _db = args.db[0]
     if _db and not os.path.dirname(_db) and not os.path.splitext(_db)[1]:
         _db = os.path.join(BukuDb.get_default_dbdir(), _db + '.db')
 
     # Fallback to prompt if no arguments
-    if args._passed <= {'nostdin', 'db'}:
+    if args._passed <= {'nostdin', 'db', 'db_profile', 'profile_sql', 'mem_index'}:
         try:
             _db = _db or os.path.join(BukuDb.get_default_dbdir(), 'bookmarks.db')
             if not os.path.exists(_db):
                 print(f'DB file is being created at {_db}')  # not printed without chatty param
-            bdb = BukuDb(dbfile=_db, default_scheme=args.default_scheme[0])
+            bdb = BukuDb(dbfile=_db, default_scheme=args.default_scheme[0], db_profile=args.db_profile)
         except Exception:
             sys.exit(1)
-        prompt(bdb, None)
+        prompt(bdb, None, mem_index=args.mem_index)
         bdb.close_quit(0)
 
     # Set up debugging
@@ -6247,10 +7953,16 @@ POSITIONAL ARGUMENTS:
 
     # Initialize the database and get handles, set verbose by default
     try:
-        bdb = BukuDb(args.json, args.format, not args.tacit, dbfile=_db, colorize=not args.nc, default_scheme=args.default_scheme[0])
+        bdb = BukuDb(args.json, args.format, not args.tacit, dbfile=_db, colorize=not args.nc, default_scheme=args.default_scheme[0],
+                     db_profile=args.db_profile)
     except Exception:
         sys.exit(1)
 
+    # Build/drop search indices
+    if args.fts is not None:
+        if not all([bdb.enable_fts(bool(args.fts & 1)), bdb.enable_fts(bool(args.fts & 2), trigram=True)]):
+            bdb.close_quit(1)
+
     if args.swap:
         index1, index2 = args.swap
         if bdb.swap_recs(index1, index2):
@@ -6329,6 +8041,14 @@ POSITIONAL ARGUMENTS:
 
     # Search record
     search_results, search_opted = None, True
+    # results only shown in the interactive prompt are fetched lazily (a page at a time)
+    lazy = not (args.np or args.oa or args.format or args.json is not None or args.export is not None or
+                args.delete is not None or args.update is not None)
+
+    def search(method, *params, **kwargs):
+        if args.random:  # sampling within the DB (the sample is ordered as usual)
+            return bdb._sort(method(*params, **kwargs, limit=args.random, randomize=True), order)
+        return (method(*params, **kwargs) if not lazy else SearchResults(method, *params, page_size=args.count or 10, **kwargs))
 
     if args.sany is not None:
         if not args.sany:
@@ -6336,34 +8056,33 @@ POSITIONAL ARGUMENTS:
         else:
             LOGDBG('args.sany')
             # Apply tag filtering, if opted
-            search_results = bdb.search_keywords_and_filter_by_tags(
-                args.sany, deep=args.deep, stag=args.stag, markers=args.markers, without=args.exclude, order=order)
+            search_results = search(bdb.search_keywords_and_filter_by_tags, args.sany, deep=args.deep, stag=args.stag,
+                                    markers=args.markers, without=args.exclude, order=order)
     elif args.sall is not None:
         if not args.sall:
             LOGERR('no keyword')
         else:
             LOGDBG('args.sall')
-            search_results = bdb.search_keywords_and_filter_by_tags(
-                args.sall, all_keywords=True, deep=args.deep, stag=args.stag,
-                markers=args.markers, without=args.exclude, order=order)
+            search_results = search(bdb.search_keywords_and_filter_by_tags, args.sall, all_keywords=True, deep=args.deep,
+                                    stag=args.stag, markers=args.markers, without=args.exclude, order=order)
     elif args.sreg is not None:
         if not args.sreg:
             LOGERR('no expression')
         else:
             LOGDBG('args.sreg')
-            search_results = bdb.search_keywords_and_filter_by_tags(
-                args.sreg, regex=True, stag=args.stag, markers=args.markers, without=args.exclude, order=order)
+            search_results = search(bdb.search_keywords_and_filter_by_tags, args.sreg, regex=True, stag=args.stag,
+                                    markers=args.markers, without=args.exclude, order=order, processes=0)
     elif args.keywords:
         LOGDBG('args.keywords')
-        search_results = bdb.search_keywords_and_filter_by_tags(
-            args.keywords, deep=args.deep, stag=args.stag, markers=args.markers, without=args.exclude, order=order)
+        search_results = search(bdb.search_keywords_and_filter_by_tags, args.keywords, deep=args.deep, stag=args.stag,
+                                markers=args.markers, without=args.exclude, order=order)
     elif args.stag is not None:
         if not args.stag:  # use sub-prompt to list all tags
-            prompt(bdb, None, noninteractive=args.np, listtags=True, suggest=args.suggest, order=order)
+            prompt(bdb, None, noninteractive=args.np, listtags=True, suggest=args.suggest, order=order, mem_index=args.mem_index)
         else:
             LOGDBG('args.stag')
-            search_results = bdb.exclude_results_from_search(
-                bdb.search_by_tag(' '.join(args.stag), order=order), args.exclude, deep=args.deep, markers=args.markers)
+            search_results = search(bdb.search_by_tag, ' '.join(args.stag), order=order, without=args.exclude,
+                                    deep=args.deep, markers=args.markers)
     elif args.exclude is not None:
         LOGERR('No search criteria to exclude results from')
     elif args.markers:
@@ -6383,8 +8102,6 @@ POSITIONAL ARGUMENTS:
 
     update_search_results = False
     if search_results:
-        if args.random and args.random < len(search_results):
-            search_results = bdb._sort(random.sample(search_results, args.random), order)
         single_record = args.random == 1  # matching print_rec() behaviour
 
         oneshot = args.np
@@ -6404,7 +8121,8 @@ POSITIONAL ARGUMENTS:
 
         if args.json is None and not args.format and not args.random:
             num = 10 if not args.count else args.count
-            prompt(bdb, search_results, noninteractive=oneshot, deep=args.deep, markers=args.markers, order=order, num=num)
+            prompt(bdb, search_results, noninteractive=oneshot, deep=args.deep, markers=args.markers, order=order, num=num,
+                   mem_index=args.mem_index)
         elif args.json is None:
             print_rec_with_filter(search_results, field_filter=args.format)
         elif args.json:
@@ -6497,13 +8215,13 @@ POSITIONAL ARGUMENTS:
         elif not args.print:
             if args.count:
                 search_results = bdb.list_using_id(order=order)
-                prompt(bdb, search_results, noninteractive=args.np, num=args.count, order=order)
+                prompt(bdb, search_results, noninteractive=args.np, num=args.count, order=order, mem_index=args.mem_index)
             else:
                 bdb.print_rec(None, order=order)
         else:
             if args.count:
                 search_results = bdb.list_using_id(args.print, order=order)
-                prompt(bdb, search_results, noninteractive=args.np, num=args.count, order=order)
+                prompt(bdb, search_results, noninteractive=args.np, num=args.count, order=order, mem_index=args.mem_index)
             else:
                 bdb.print_rec(id_range, order=order)
 
@@ -6559,13 +8277,21 @@ POSITIONAL ARGUMENTS:
 
     # Fix tags
     if args.fixtags:
-        bdb.fixtags()
+        fixed = bdb.fixtags(dry_run=args.dry_run, progress=sys.stderr.isatty())
+        if fixed is not None:
+            print(f'{fixed} record(s) {"to fix" if args.dry_run else "fixed"}')
 
     if args.reorder:
         size = bdb.get_max_id()
         if size and (args.np or read_in(f'Are you sure you want to reorder all {size} bookmarks? (y/n): ') == 'y'):
-            bdb.reorder(parse_order(args.reorder))
-            print(f'...Reordered {size} bookmarks.')
+            if bdb.reorder(parse_order(args.reorder)):
+                print(f'...Reordered {size} bookmarks.')
+
+    if args.maintain:
+        size = os.path.getsize(bdb.dbfile)
+        if not bdb.maintain():
+            bdb.close_quit(1)
+        print(f'...DB file size: {size} -> {os.path.getsize(bdb.dbfile)} bytes.')
 
     # Close DB connection and quit
     bdb.close_quit(0)
@@ -43,10 +43,16 @@ def entity(bookmark, index=False):
 
 @contextmanager
 def get_bukudb():
-    """get bukudb instance"""
+    """get bukudb instance (from the app connection pool if available; read-only for GET requests)"""
+    pool = current_app.extensions.get('bukudb')
     bukudb = getattr(flask.g, 'bukudb', None)
-    if bukudb:
-        yield bukudb
+    if pool and request.method in ('GET', 'HEAD'):
+        with pool.reader() as bukudb:
+            yield bukudb
+    elif pool and pool.readonly:
+        flask.abort(flask.make_response(Response.READONLY()))
+    elif pool or bukudb:
+        yield (pool.writer if pool else bukudb)
     else:
         db_file = current_app.config.get('BUKUSERVER_DB_FILE', None)
         bukudb = BukuDb(dbfile=db_file)
@@ -62,7 +68,7 @@ def search_tag(
     db:
         buku db instance
     stag:
-        search tag
+        search tag (substring of tag names to match)
     limit:
         positive integer limit
 
@@ -78,20 +84,12 @@ def search_tag(
     """
     if limit is not None and limit < 1:
         raise ValueError("limit must be positive")
-    tags: T.Set[str] = set()
-    counter = collections.Counter()
-    query_list = ["SELECT DISTINCT tags , COUNT(tags) FROM bookmarks"]
+    query = "SELECT name, count FROM tag_counts JOIN tags ON tags.id = tag_id WHERE count > 0"
     if stag:
-        query_list.append("where tags LIKE :search_tag")
-    query_list.append("GROUP BY tags")
-    row: T.Tuple[str, int]
-    for row in db.cur.execute(" ".join(query_list), {"search_tag": f"%{stag}%"}):
-        for tag in row[0].strip(buku.DELIM).split(buku.DELIM):
-            if not tag:
-                continue
-            tags.add(tag)
-            counter[tag] += row[1]
-    return list(sorted(tags)), dict(counter.most_common(limit))
+        query += " AND name LIKE :search_tag"
+    with db.lock:
+        counter = collections.Counter(dict(db.cur.execute(query, {"search_tag": f"%{stag}%"}).fetchall()))
+    return sorted(counter), dict(counter.most_common(limit))
 
 
 def _fetch_data(convert):
@@ -133,8 +131,7 @@ def reorder_bookmarks():
         return Response.invalid(form.errors)
     try:
         with get_bukudb() as bdb:
-            bdb.reorder(form.order.data)
-        return Response.SUCCESS()
+            return Response.from_flag(bdb.reorder(form.order.data))
     except Exception as e:
         current_app.logger.exception(str(e))
         return Response.FAILURE()
@@ -148,6 +145,20 @@ def get_all_tags():
     with get_bukudb() as bdb:
         return Response.SUCCESS(data={"tags": search_tag(db=bdb, limit=5)[0]})
 
+@swag_from('./apidocs/tag_related/get.yml')
+def get_related_tags(tag: str):
+    if not TAG_RE.match(tag):
+        return Response.TAG_NOT_VALID()
+    limit = request.args.get('limit', type=int)
+    if limit is not None and limit < 1:
+        return Response.invalid({'limit': ['must be positive']})
+    with get_bukudb() as bukudb:
+        tag = tag.lower().strip()
+        if tag not in search_tag(db=bukudb, stag=tag)[1]:
+            return Response.TAG_NOT_FOUND()
+        return Response.SUCCESS(data={'tags': [{'name': name, 'count': count}
+                                               for name, count in bukudb.get_related_tags([tag], limit=limit)]})
+
 class ApiTagView(MethodView):
     def get(self, tag: str):
         with get_bukudb() as bukudb:
@@ -172,11 +183,7 @@ class ApiTagView(MethodView):
             tags = search_tag(db=bukudb, stag=tag)
             if tag not in tags[1]:
                 return Response.TAG_NOT_FOUND()
-            try:
-                bukudb.replace_tag(tag, form.tags.data)
-                return Response.SUCCESS()
-            except (ValueError, RuntimeError):
-                return Response.FAILURE()
+            return Response.from_flag(bukudb.rewrite_tags({tag: form.tags.data}) is not None)
 
     def delete(self, tag: str):
         if not TAG_RE.match(tag):
@@ -185,14 +192,19 @@ class ApiTagView(MethodView):
             tag = tag.lower().strip()
             tags = search_tag(db=bukudb, stag=tag)
             return (Response.TAG_NOT_FOUND() if tag not in tags[1] else
-                    Response.from_flag(bukudb.delete_tag_at_index(0, tag, chatty=False)))
+                    Response.from_flag(bukudb.rewrite_tags({tag: None}) is not None))
 
 
 class ApiBookmarksView(MethodView):
     def get(self):
+        limit, offset = request.args.get('limit', type=int), request.args.get('offset', 0, type=int)
+        if limit is not None and limit < 1:
+            return Response.invalid({'limit': ['must be positive']})
+        if offset < 0:
+            return Response.invalid({'offset': ['must not be negative']})
         with get_bukudb() as bukudb:
             order = request.args.getlist('order')
-            all_bookmarks = bukudb.get_rec_all(order=order)
+            all_bookmarks = bukudb.get_rec_all(order=order, limit=limit, offset=offset)
             return Response.SUCCESS(data={'bookmarks': [entity(bookmark, index=order)
                                                         for bookmark in all_bookmarks]})
 
@@ -292,7 +304,7 @@ class ApiBookmarkRangeView(MethodView):
             max_index = bukudb.get_max_id() or 0
             if start_index > end_index or end_index > max_index:
                 return Response.RANGE_NOT_VALID()
-            result_flag = bukudb.delete_rec(None, start_index, end_index, is_range=True, retain_order=True)
+            result_flag = bukudb.delete_recs(range(start_index, end_index + 1), retain_order=True) is not None
             return Response.from_flag(result_flag)
 
 
@@ -311,13 +323,10 @@ class ApiBookmarkSearchView(MethodView):
         if not form.validate():
             return Response.INPUT_NOT_VALID(data={'errors': form.errors})
         with get_bukudb() as bukudb:
-            deleted, failed, indices = 0, 0, {x.id for x in bukudb.searchdb(**form.data)}
+            indices = {x.id for x in bukudb.searchdb(**form.data)}
             current_app.logger.debug('total bookmarks:{}'.format(len(indices)))
-            for index in sorted(indices, reverse=True):
-                if bukudb.delete_rec(index, retain_order=True):
-                    deleted += 1
-                else:
-                    failed += 1
+            deleted = bukudb.delete_recs(indices, retain_order=True) or 0
+            failed = len(indices) - deleted
             return Response.from_flag(failed == 0, data={'deleted': deleted}, errors={'failed': failed})
 
 
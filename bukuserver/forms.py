@@ -3,8 +3,9 @@
 import re
 from flask_wtf import FlaskForm
 from wtforms import Form
-from wtforms.fields import BooleanField, FieldList, URLField, StringField, TextAreaField, HiddenField, SelectMultipleField
-from wtforms.validators import DataRequired, InputRequired, Length, Regexp, StopValidation
+from wtforms.fields import (BooleanField, FieldList, IntegerField, URLField, StringField, TextAreaField, HiddenField,
+                            SelectMultipleField)
+from wtforms.validators import DataRequired, InputRequired, Length, NumberRange, Optional, Regexp, StopValidation
 from buku import DELIM, taglist_str
 from bukuserver import _, _l, LazyString
 
@@ -136,6 +137,8 @@ class ApiBookmarkSearchForm(Form):
     regex = BooleanField(filters=[_parse_bool])
     markers = BooleanField(filters=[_parse_bool])
     order = ValueList(item_validators=[is_string])
+    limit = IntegerField(validators=[Optional(), NumberRange(min=1)])
+    offset = IntegerField(default=0, filters=[lambda x: x or 0], validators=[Optional(), NumberRange(min=0)])
 
 class ApiBookmarksReorderForm(Form):
     order = ValueList(validators=[DataRequired()], item_validators=[is_string])
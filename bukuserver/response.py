@@ -16,6 +16,7 @@ class Response(Enum):
     BOOKMARK_NOT_FOUND = (HTTPStatus.NOT_FOUND, "Bookmark not found.")            # 404
     RANGE_NOT_VALID = (HTTPStatus.NOT_FOUND, "Range not valid.")                  # 404
     TAG_NOT_FOUND = (HTTPStatus.NOT_FOUND, "Tag not found.")                      # 404
+    READONLY = (HTTPStatus.FORBIDDEN, "Read-only mode.")                          # 403
 
     @staticmethod
     def invalid(errors):
@@ -14,7 +14,7 @@ from flask_admin import Admin
 from flask_admin.theme import Bootstrap4Theme
 from flasgger import Swagger
 
-from buku import BukuDb, __version__
+from buku import BukuDb, __version__, enable_sql_profiling
 
 try:
     from .middleware import ReverseProxyPrefixFix
@@ -101,7 +101,14 @@ def create_app(db_file=None):
             print('Warning: reverse proxy path should not include trailing slash')
         app.config['REVERSE_PROXY_PATH'] = reverse_proxy_path
         ReverseProxyPrefixFix(app)
-    bukudb = BukuDb(dbfile=db_file)
+    profile_sql = os.getenv('BUKUSERVER_PROFILE_SQL', '')
+    profile_dump = (profile_sql if profile_sql.endswith('.json') else None)
+    if profile_dump or get_bool_from_env_var('BUKUSERVER_PROFILE_SQL'):
+        enable_sql_profiling(profile_dump)
+    pool = app.extensions['bukudb'] = util.BukuDbPool(db_file, db_profile=os.getenv('BUKUSERVER_DB_PROFILE'),
+                                                      readonly=app.config['BUKUSERVER_READONLY'],
+                                                      immutable=get_bool_from_env_var('BUKUSERVER_IMMUTABLE'))
+    bukudb = pool.writer
     theme = (os.getenv('BUKUSERVER_THEME') or 'default').lower()
     app.config['BUKUSERVER_LOCALE'] = os.getenv('BUKUSERVER_LOCALE') or 'en'
     _dir = os.path.dirname(os.path.realpath(__file__))
@@ -111,6 +118,7 @@ def create_app(db_file=None):
     init_locale(app)
     app.before_request(before_request)
     app.after_request(after_request)
+    app.teardown_request(views.release_request_bukudb)
 
     @app.shell_context_processor
     def shell_context():
@@ -131,6 +139,7 @@ def create_app(db_file=None):
     #  api
     app.add_url_rule('/api/tags', 'get_all_tags', api.get_all_tags, methods=['GET'], strict_slashes=False)
     app.add_url_rule('/api/tags/<tag>', view_func=api.ApiTagView.as_view('tag'), methods=['GET', 'PUT', 'DELETE'])
+    app.add_url_rule('/api/tags/<tag>/related', 'related_tags', api.get_related_tags, methods=['GET'])
     app.add_url_rule('/api/bookmarks', view_func=api.ApiBookmarksView.as_view('bookmarks'), methods=['GET', 'POST', 'DELETE'])
     app.add_url_rule('/api/bookmarks/<int:index>', view_func=api.ApiBookmarkView.as_view('bookmark'), methods=['GET', 'PUT', 'DELETE'])
     app.add_url_rule('/api/bookmarks/refresh', 'bookmarks_refresh', api.refresh_bookmark, defaults={'index': None}, methods=['POST'])
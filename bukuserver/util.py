@@ -1,6 +1,13 @@
 from collections import Counter
+from contextlib import contextmanager
 from urllib.parse import urlparse
+import copy
+import os
 import re
+import sqlite3
+import threading
+
+from buku import BukuDb
 
 get_netloc = lambda x: urlparse(x).netloc  # pylint: disable=no-member
 select_filters = lambda args: {k: v for k, v in args.items() if re.match(r'flt.*_', k)}
@@ -15,3 +22,60 @@ def chunks(arr, n):
 def sorted_counter(keys, *, min_count=0):
     data = Counter(keys)
     return Counter({k: v for k, v in sorted(data.items()) if v > min_count})
+
+
+class BukuDbPool:
+    """DB connection manager for the server: a single shared writer, and a pool of read-only connections.
+
+    Connections are opened once and reused across requests; the DB is switched to WAL journal mode,
+    so that readers aren't blocked by the writer (and vice versa).
+
+    In read-only mode, the DB is opened once without write access (skipping schema setup and the journal mode
+    switch; with 'readonly' performance profile unless specified), and this connection is shared by all readers
+    (each getting its own cursor) if SQLite is built thread-safe; an immutable DB is also opened without locking."""
+
+    def __init__(self, dbfile=None, *, busy_timeout=5000, max_idle=8, db_profile=None, readonly=False, immutable=False):
+        self.readonly = readonly or immutable
+        if self.readonly and not db_profile:
+            db_profile = os.environ.get('BUKU_DB_PROFILE') or 'readonly'
+        self.writer = BukuDb(dbfile=dbfile, readonly=self.readonly, immutable=immutable, db_profile=db_profile)
+        self.busy_timeout, self.max_idle, self.db_profile = busy_timeout, max_idle, db_profile
+        self.shared = self.readonly and sqlite3.threadsafety == 3
+        with self.writer.lock:
+            if not self.writer.readonly:
+                self.writer.conn.execute('PRAGMA journal_mode = WAL')
+            self.writer.conn.execute(f'PRAGMA busy_timeout = {int(busy_timeout)}')
+        self.dbfile = self.writer.dbfile
+        self._idle, self._lock = [], threading.Lock()
+
+    @contextmanager
+    def reader(self):
+        """Checks out a read-only BukuDb instance (opening a new one when none is idle)."""
+        if self.shared:  # a separate cursor (and lock) for the shared connection
+            bukudb = copy.copy(self.writer)
+            bukudb.cur, bukudb.lock = bukudb.conn.cursor(), threading.RLock()
+            try:
+                yield bukudb
+            finally:
+                bukudb.cur.close()
+            return
+        with self._lock:
+            bukudb = (self._idle.pop() if self._idle else None)
+        if bukudb is None:
+            bukudb = BukuDb(dbfile=self.dbfile, readonly=True, db_profile=self.db_profile)
+            bukudb.conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout)}')
+        try:
+            yield bukudb
+        finally:
+            with self._lock:
+                if len(self._idle) < self.max_idle:
+                    self._idle.append(bukudb)
+                    bukudb = None
+            if bukudb is not None:
+                bukudb.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for bukudb in idle + [self.writer]:
+            bukudb.close()
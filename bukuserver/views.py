@@ -8,13 +8,14 @@ import json
 import types
 from argparse import Namespace
 from collections import Counter, namedtuple
+from contextlib import ExitStack
 from typing import Any, List, Optional, Tuple
 from urllib.parse import urlparse
 
 import arrow
 import wtforms
 from jinja2 import pass_context
-from flask import current_app as app, flash, redirect, request, session, url_for
+from flask import current_app as app, flash, g, has_request_context, redirect, request, session, url_for
 from flask_admin.base import AdminIndexView, BaseView, expose
 from flask_admin.model import BaseModelView
 from flask_wtf import FlaskForm
@@ -90,6 +91,34 @@ def readonly_check(self):
         self.can_edit = False
         self.can_delete = False
 
+def request_bukudb(bukudb):
+    """DB for the current request: a reader checked out from the app connection pool for read-only (GET/HEAD) requests
+    (kept until the request teardown, see release_request_bukudb()), or the given bukudb (i.e. the pool writer) otherwise."""
+    pool = (app.extensions.get('bukudb') if has_request_context() else None)
+    if not pool or request.method not in ('GET', 'HEAD'):
+        return bukudb
+    if 'bukudb_reader' not in g:
+        stack = ExitStack()
+        g.bukudb_reader = (stack.enter_context(pool.reader()), stack)
+    return g.bukudb_reader[0]
+
+def release_request_bukudb(_exc=None):
+    """Returns the reader of the current request (if any) to the app connection pool."""
+    _, stack = g.pop('bukudb_reader', (None, None))
+    if stack:
+        stack.close()
+
+class RequestBukuDbMixin:  # pylint: disable=too-few-public-methods
+    """Makes the bukudb attribute of a view resolve to the DB for the current request (see request_bukudb())."""
+
+    @property
+    def bukudb(self):
+        return request_bukudb(self._bukudb)
+
+    @bukudb.setter
+    def bukudb(self, bukudb):
+        self._bukudb = bukudb
+
 class ApplyFiltersMixin:  # pylint: disable=too-few-public-methods
     def _apply_filters(self, models, filters):
         for idx, name, value in filters:
@@ -99,7 +128,7 @@ class ApplyFiltersMixin:  # pylint: disable=too-few-public-methods
         return models
 
 
-class BookmarkModelView(BaseModelView, ApplyFiltersMixin):
+class BookmarkModelView(RequestBukuDbMixin, BaseModelView, ApplyFiltersMixin):
     @staticmethod
     def _filter_arg(flt):
         """Exposes filter slugify logic; works because BookmarkModelView.named_filter_urls = True"""
@@ -258,7 +287,9 @@ class BookmarkModelView(BaseModelView, ApplyFiltersMixin):
         self.after_model_delete(model)
         return res
 
-    def _from_filters(self, filters):
+    def _from_filters(self, filters, **paging):
+        """Applies filters to DB bookmarks; paging parameters (limit, offset, count_only) are passed to the DB query
+        (so they're only applicable when there are no filters other than search & ordering)."""
         bukudb = self.bukudb
         order = bs_filters.BookmarkOrderFilter.value(self._filters, filters)
         buku_filters = [x for x in filters if x[1] == 'buku']
@@ -267,15 +298,15 @@ class BookmarkModelView(BaseModelView, ApplyFiltersMixin):
             mode_id = {x[0] for x in buku_filters}
             if len(mode_id) > 1:
                 flash(_('Invalid search mode combination'), 'error')
-                return 0, []
+                return (0 if paging.get('count_only') else [])
             try:
                 kwargs = self._filters[mode_id.pop()].params
             except IndexError:
                 kwargs = {}
-            bookmarks = bukudb.searchdb(keywords, order=order, **kwargs)
+            bookmarks = bukudb.searchdb(keywords, order=order, **kwargs, **paging)
         else:
-            bookmarks = bukudb.get_rec_all(order=order)
-        return self._apply_filters(bookmarks or [], filters)
+            bookmarks = bukudb.get_rec_all(order=order, **paging)
+        return (bookmarks if paging else self._apply_filters(bookmarks or [], filters))
 
     @expose('/reorder', methods=['POST'])
     def refresh(self):
@@ -286,9 +317,14 @@ class BookmarkModelView(BaseModelView, ApplyFiltersMixin):
         return redirect(url_for('.index_view'))
 
     def get_list(self, page, sort_field, sort_desc, _, filters, page_size=None):
-        bookmarks = self._from_filters(filters)
-        count = len(bookmarks)
-        bookmarks = page_of(bookmarks, page_size, page)
+        if not page_size or any(x[1] not in ('buku', 'order') for x in filters):
+            bookmarks = self._from_filters(filters)
+            count = len(bookmarks)
+            bookmarks = page_of(bookmarks, page_size, page)
+        else:  # fetching only the requested page from DB
+            count = self._from_filters(filters, count_only=True)
+            page = (page if page >= 0 else max(0, (count - 1) // page_size))
+            bookmarks = self._from_filters(filters, limit=page_size, offset=page * page_size)
         data = []
         for bookmark in bookmarks:
             bm_sns = types.SimpleNamespace(id=None, url=None, title=None, tags=None, description=None)
@@ -302,7 +338,7 @@ class BookmarkModelView(BaseModelView, ApplyFiltersMixin):
             bookmarks = self._from_filters(self._get_list_filter_args())
             bookmark = bookmarks and random.choice(bookmarks)
         else:
-            bookmark = self.model.bukudb.get_rec_by_id(id)
+            bookmark = self.bukudb.get_rec_by_id(id)
         if not bookmark:
             return None
         bm_sns = types.SimpleNamespace(id=None, url=None, title=None, tags=None, description=None)
@@ -363,7 +399,8 @@ class BookmarkModelView(BaseModelView, ApplyFiltersMixin):
         elif name == BookmarkField.URL.name.lower():
 
             def netloc_match_func(query, value, index):
-                return filter(lambda x: (buku.get_netloc(x[index]) or '') == value, query)
+                ids = {x.id for x in self.bukudb.search_by_netloc(value)}
+                return filter(lambda x: x[BookmarkField.ID.value] in ids, query)
 
             res += [
                 bs_filters.BookmarkBaseFilter(name, _l('netloc match'), netloc_match_func),
@@ -438,7 +475,7 @@ class BookmarkModelView(BaseModelView, ApplyFiltersMixin):
         return res
 
 
-class TagModelView(BaseModelView, ApplyFiltersMixin):
+class TagModelView(RequestBukuDbMixin, BaseModelView, ApplyFiltersMixin):
     def _create_ajax_loader(self, name, options):
         pass
 
@@ -606,7 +643,7 @@ class TagModelView(BaseModelView, ApplyFiltersMixin):
         pass
 
 
-class StatisticView(BaseView):  # pylint: disable=too-few-public-methods
+class StatisticView(RequestBukuDbMixin, BaseView):  # pylint: disable=too-few-public-methods
     _data = None
     extra_css = ['/static/bukuserver/css/modal.css']
 
@@ -618,13 +655,11 @@ class StatisticView(BaseView):  # pylint: disable=too-few-public-methods
     def index(self):
         data = StatisticView._data
         if not data or request.method == 'POST':
-            all_bookmarks = self.bukudb.get_rec_all()
-            netlocs = [buku.get_netloc(x.url) or '' for x in all_bookmarks]
-            tags = [s for x in all_bookmarks for s in x.taglist]
-            titles = [x.title for x in all_bookmarks]
+            _, tags = self.bukudb.get_tag_all()
+            titles = [x.title for x in self.bukudb.get_rec_all()]
             data = StatisticView._data = {
-                'netlocs': sorted_counter(netlocs),
-                'tags': sorted_counter(tags),
+                'netlocs': sorted_counter(self.bukudb.get_netloc_all()),
+                'tags': sorted_counter({tag: count for tag, count in tags.items() if tag}),
                 'titles': sorted_counter(titles, min_count=1),
                 'generated': arrow.now(),
             }
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+#
+# Benchmarks for buku DB operations (not a part of the test suite)
+#
+# Usage: python -m tests.benchmark [-h] [-n ROWS] [-r REPEAT] [--db FILE] [benchmark ...]
+#
+# A synthetic DB is generated anew unless an existing file is passed via --db
+# (note that benchmarks may modify the DB, e.g. build or drop search indices).
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import statistics
+import sys
+import time
+from tempfile import TemporaryDirectory
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from buku import DB_PROFILES, BukuDb, MemoryIndex, SearchResults, filter_from, parse_tags, regexp  # noqa: E402
+
+SYLLABLES = 'ka ri to ne mo sa lu vi de po gra xen thu bel qui or an ex zo wy'.split()
+HOSTS = ('example.com', 'github.com', 'wikipedia.org', 'news.ycombinator.com', 'docs.python.org', 'lwn.net')
+
+
+def vocabulary(size=20000, seed=0):
+    """Generate a list of unique pseudo-words."""
+    rnd, words = random.Random(seed), set()
+    while len(words) < size:
+        words.add(''.join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4))))
+    return sorted(words)
+
+WORDS = vocabulary()
+
+
+def generate_db(path, rows, seed=42):
+    """Fill a DB file with given number of synthetic bookmarks."""
+    rnd = random.Random(seed)
+    _text = lambda n: ' '.join(rnd.choice(WORDS) for _ in range(n))
+    bdb = BukuDb(dbfile=path)
+    records = ((f'https://{rnd.choice(HOSTS)}/{i}/{_text(2).replace(" ", "-")}', _text(rnd.randint(2, 6)).title(),
+                parse_tags([','.join(rnd.sample(WORDS, rnd.randint(0, 4)))]), _text(rnd.randint(0, 15)))
+               for i in range(rows))
+    with bdb.lock:
+        bdb.cur.executemany('INSERT INTO bookmarks(URL, metadata, tags, desc) VALUES (?, ?, ?, ?)', records)
+        bdb.conn.commit()
+    return bdb
+
+
+def measure(fn, repeat=5):
+    """Returns (median time in ms, last result) of running fn() repeatedly."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), result
+
+
+def report(title, rows):
+    print(f'\n{title}')
+    width = max(len(name) for name, *_ in rows)
+    for name, *values in rows:
+        print(f'  {name:<{width}}  ' + '  '.join(f'{x:>10.2f}' if isinstance(x, float) else f'{x:>10}' for x in values))
+
+
+def bench_deep_search(bdb, repeat):
+    """Deep (substring) search: table scan vs trigram index."""
+    rnd = random.Random(1)
+    _part = lambda: (lambda s: s[1:-1] if len(s) > 5 else s)(rnd.choice(WORDS))
+    queries = [([_part()], {}), ([_part(), _part()], {}), ([f'{rnd.choice(WORDS)} {rnd.choice(WORDS)}'], {}),
+               ([_part(), _part()], {'all_keywords': True}), (['.' + _part(), ':github'], {'markers': True})]
+    bdb.enable_fts(False, trigram=True)
+    scan = [measure(lambda: bdb.searchdb(kw, deep=True, **params), repeat) for kw, params in queries]
+    start = time.perf_counter()
+    bdb.enable_fts(trigram=True)
+    indexing = (time.perf_counter() - start) * 1000
+    indexed = [measure(lambda: bdb.searchdb(kw, deep=True, **params), repeat) for kw, params in queries]
+    for (kw, _), (_, expected), (_, actual) in zip(queries, scan, indexed):
+        assert expected == actual, f'results differ for {kw}'
+    report(f'deep search, ms (trigram index built in {indexing:.0f} ms)',
+           [('query', 'matches', 'scan', 'trigram')] +
+           [(' '.join(kw), len(res), t0, t1) for (kw, _), (t0, res), (t1, _) in zip(queries, scan, indexed)])
+
+
+def bench_regexp(bdb, repeat):
+    """Per-row cost of the REGEXP SQL function: uncached re.search() vs compiled-pattern cache."""
+    rnd = random.Random(2)
+    rows = bdb.get_max_id() or 1
+    _uncached = lambda expr, item: (False if expr is None or item is None else
+                                    re.search(expr, item, re.IGNORECASE) is not None)
+    cases = [('regex search', lambda: bdb.searchdb([f'{rnd.choice(WORDS)}|{rnd.choice(WORDS)}[ -]'], regex=True)),
+             ('tag exclusion', lambda: bdb.search_by_tag(f'- {rnd.choice(WORDS)}, {rnd.choice(WORDS)}'))]
+    results = []
+    for name, fn in cases:
+        bdb.conn.create_function('REGEXP', 2, _uncached)
+        before, _ = measure(fn, repeat)
+        bdb.conn.create_function('REGEXP', 2, regexp, deterministic=True)
+        after, _ = measure(fn, repeat)
+        results += [(name, before * 1000 / rows, after * 1000 / rows)]
+    report('REGEXP cost per row, µs', [('query', 'uncached', 'cached')] + results)
+
+
+def bench_import(bdb, repeat):
+    """Importing bookmarks (half of them new, half already in DB): add_rec() per item vs bulk add_recs()."""
+    rnd, rows = random.Random(3), min(bdb.get_max_id() or 0, 20000)
+    existing = [(x.url, x.title, x.tags_raw, x.desc, 0, True, False) for x in bdb.get_rec_all()[:rows // 2]]
+    _new = lambda n: [(f'https://import.example/{n}/{i}', rnd.choice(WORDS), parse_tags([rnd.choice(WORDS)]), '', 0, True, False)
+                      for i in range(rows // 2)]
+    _cleanup = lambda: bdb.conn.execute("DELETE FROM bookmarks WHERE url LIKE 'https://import.example/%'")
+
+    def _legacy(items):  # the former importdb() loop
+        with bdb.lock:
+            for item in items:
+                if not bdb.add_rec(*item):
+                    bdb.append_tag_at_index(bdb.get_rec_id(item[0]), item[2])
+            bdb.conn.commit()
+
+    results = []
+    for name, fn in [('add_rec loop', _legacy), ('add_recs', lambda items: bdb.add_recs(items, on_conflict='merge_tags'))]:
+        times = []
+        for n in range(repeat):
+            items = existing + _new(n)
+            start = time.perf_counter()
+            fn(items)
+            times.append((time.perf_counter() - start) * 1000)
+            _cleanup()
+            bdb.conn.commit()
+        results += [(name, len(items), statistics.median(times))]
+    report('import, ms', [('method', 'items', 'time')] + results)
+
+
+def bench_reorder(bdb, repeat):
+    """Reordering all bookmarks: an UPDATE per row vs set-based renumbering."""
+    def _legacy(order):  # the former reorder() loop
+        with bdb.lock:
+            sorted_urls = [x.url for x in bdb.get_rec_all(lock=False, order=order)]
+            bdb.cur.execute('UPDATE bookmarks SET id = -id')
+            for idx, url in enumerate(sorted_urls, start=1):
+                bdb.cur.execute('UPDATE bookmarks SET id = ? WHERE url = ?', (idx, url))
+            bdb.conn.commit()
+
+    orders = [['netloc', 'title'], ['-id'], ['url']]
+    results = []
+    for name, fn in [('UPDATE per row', _legacy), ('reorder()', bdb.reorder)]:
+        results += [(name, *[measure(lambda: fn(order), repeat)[0] for order in orders])]
+    bdb.reorder(['id'])
+    report('reorder, ms', [('method', *[','.join(order) for order in orders])] + results)
+
+
+def bench_db_profile(bdb, repeat):
+    """SQLite performance profiles: search, per-record updates (as in refresh) and bulk import, on copies of the DB."""
+    rnd, rows = random.Random(4), bdb.get_max_id() or 1
+    queries = [[rnd.choice(WORDS)] for _ in range(3)]
+    indices = [rnd.randint(1, rows) for _ in range(200)]
+    results, tmpdir = [], TemporaryDirectory(prefix='bukubench_')
+    for name in DB_PROFILES:
+        path = os.path.join(tmpdir.name, f'{name}.db')
+        shutil.copyfile(bdb.dbfile, path)
+        db = BukuDb(dbfile=path, db_profile=name)
+        search, _ = measure(lambda: [db.searchdb(kw) for kw in queries], repeat)
+        if db.readonly:
+            update = insert = '-'
+        else:
+            update, _ = measure(lambda: [db.update_rec(idx, title_in=rnd.choice(WORDS)) for idx in indices], repeat)
+            _items = lambda n: [(f'https://profile.example/{n}/{i}', rnd.choice(WORDS), ',', '', 0) for i in range(5000)]
+            insert, _ = measure(lambda: db.add_recs(_items(rnd.random())), repeat)
+        db.close()
+        results += [(name, search, update, insert)]
+    tmpdir.cleanup()
+    report(f'DB profiles, ms ({len(queries)} searches, {len(indices)} updates, 5000 new records)',
+           [('profile', 'search', 'updates', 'import')] + results)
+
+
+def bench_tag_list(bdb, repeat):
+    """Listing tags with usage counts: aggregating the tag index vs the tag_counts table."""
+    def _legacy():  # the former get_tag_all() queries
+        with bdb.lock:
+            untagged = bdb.cur.execute('SELECT COUNT(*) FROM bookmarks WHERE NOT EXISTS '
+                                       '(SELECT 1 FROM bookmark_tags WHERE bookmark_id = bookmarks.id)').fetchone()[0]
+            counts = dict(bdb.cur.execute('SELECT name, COUNT(*) FROM bookmark_tags JOIN tags ON tags.id = tag_id GROUP BY tag_id'))
+        return dict(({'': untagged} if untagged else {}), **{tag: counts[tag] for tag in sorted(counts)})
+
+    legacy, expected = measure(_legacy, repeat)
+    counted, (tags, actual) = measure(bdb.get_tag_all, repeat)
+    assert expected == actual, 'tag counts differ'
+    report('tag list, ms', [('method', 'tags', 'time'), ('GROUP BY', len(tags), legacy), ('tag_counts', len(tags), counted)])
+
+
+def bench_related_tags(bdb, repeat):
+    """Related tags suggestions: joining the tag index vs the tag_pairs table."""
+    rnd = random.Random(5)
+    with bdb.lock:  # a tag common to many bookmarks (like 'toread' often is)
+        bdb.cur.execute("UPDATE bookmarks SET tags = tags || 'benchpopular,' WHERE id % 5 = 0 AND tags NOT LIKE '%,benchpopular,%'")
+        bdb.conn.commit()
+    popular = sorted(((tag, n) for tag, n in bdb.get_tag_all()[1].items() if tag), key=lambda x: -x[1])
+    queries = [[tag] for tag, _ in popular[:3]] + [rnd.sample(WORDS, 3)]
+
+    def _legacy(tags):  # the former suggest_similar_tag() query
+        with bdb.lock:
+            bdb.cur.execute('SELECT DISTINCT related.name FROM json_each(?) AS tag JOIN tags ON tags.name = tag.value '
+                            'JOIN bookmark_tags AS bt ON bt.tag_id = tags.id '
+                            'JOIN bookmark_tags AS other ON other.bookmark_id = bt.bookmark_id '
+                            'JOIN tags AS related ON related.id = other.tag_id', (json.dumps(tags),))
+            return {name for name, in bdb.cur.fetchall()} - set(tags)
+
+    results = []
+    for tags in queries:
+        (legacy, expected), (ranked, actual) = measure(lambda: _legacy(tags), repeat), measure(lambda: bdb.get_related_tags(tags), repeat)
+        assert expected == {name for name, _ in actual}, f'related tags differ for {tags}'
+        results += [(','.join(tags), len(actual), legacy, ranked)]
+    report('related tags, ms', [('tags', 'related', 'join', 'tag_pairs')] + results)
+
+
+def bench_retag(bdb, repeat):
+    """Renaming a tag common to many bookmarks: an UPDATE per record vs a single-pass rewrite_tags()."""
+    with bdb.lock:
+        bdb.cur.execute("UPDATE bookmarks SET tags = tags || 'benchretag,' WHERE id % 5 = 0 AND tags NOT LIKE '%,benchretag,%'")
+        bdb.conn.commit()
+
+    def _legacy(orig, new):  # the former replace_tag() loop
+        with bdb.lock:
+            bdb.cur.execute('SELECT id, tags FROM bookmarks WHERE id IN (SELECT bookmark_id FROM bookmark_tags '
+                            'JOIN tags ON tags.id = tag_id WHERE name = ?) ORDER BY id', (orig,))
+            for id, tags in bdb.cur.fetchall():
+                bdb.cur.execute('UPDATE bookmarks SET tags = ? WHERE id = ?', (parse_tags([tags.replace(f',{orig},', f',{new},')]), id))
+            bdb.conn.commit()
+
+    results = []
+    for name, fn in [('UPDATE per record', _legacy), ('rewrite_tags()', lambda orig, new: bdb.rewrite_tags({orig: new}))]:
+        results += [(name, measure(lambda: (fn('benchretag', 'benchretag2'), fn('benchretag2', 'benchretag')), repeat)[0] / 2)]
+    report(f'retag, ms ({bdb.get_tag_all()[1]["benchretag"]} bookmarks)', [('method', 'time')] + results)
+
+
+def bench_fixtags(bdb, repeat):
+    """Fixing tags (a third of records in need): an UPDATE per record vs chunked fixtags(), single process & pooled."""
+    def _legacy():  # the former fixtags() loop
+        with bdb.lock:
+            query = 'UPDATE bookmarks SET tags = ? WHERE id = ?'
+            for id, oldtags in bdb.cur.execute('SELECT id, tags FROM bookmarks ORDER BY id ASC').fetchall():
+                if oldtags != ',' and (tags := parse_tags([oldtags])) != oldtags:
+                    bdb.cur.execute(query, (tags, id))
+            bdb.conn.commit()
+
+    results = []
+    for name, fn in [('UPDATE per record', _legacy), ('fixtags() dry run', lambda: bdb.fixtags(dry_run=True, processes=1)),
+                     ('fixtags()', lambda: bdb.fixtags(processes=1)), ('fixtags() pooled', lambda: bdb.fixtags(processes=os.cpu_count()))]:
+        times = []
+        for _ in range(repeat):
+            with bdb.lock:
+                bdb.cur.execute("UPDATE bookmarks SET tags = upper(tags) WHERE id % 3 = 0 AND tags != ','")
+                bdb.conn.commit()
+            start = time.perf_counter()
+            fn()
+            times.append((time.perf_counter() - start) * 1000)
+        results += [(name, statistics.median(times))]
+    bdb.fixtags()
+    report(f'fixtags, ms ({os.cpu_count()} CPUs)', [('method', 'time')] + results)
+
+def bench_combined_search(bdb, repeat):
+    """Keyword search with a tag filter and exclusions: separate queries narrowed down in Python vs a single compiled query."""
+    def _legacy(keywords, stag, without, **params):  # the former search_keywords_and_filter_by_tags()
+        results = bdb.searchdb(keywords, **params)
+        results = filter_from(results, bdb.search_by_tag(stag))
+        return filter_from(results, bdb.searchdb(without, deep=params.get('deep', False)), exclude=True)
+
+    rnd = random.Random(6)
+    with bdb.lock:  # a tag common to many bookmarks
+        bdb.cur.execute("UPDATE bookmarks SET tags = tags || 'benchsearch,' WHERE id % 4 = 0 AND tags NOT LIKE '%,benchsearch,%'")
+        bdb.conn.commit()
+    queries = [([rnd.choice(WORDS)], 'benchsearch', [rnd.choice(WORDS)], {}),
+               ([rnd.choice(WORDS)[:3]], 'benchsearch', [rnd.choice(WORDS)[:3]], {'deep': True}),
+               ([rnd.choice(WORDS), rnd.choice(WORDS)], rnd.choice(WORDS), [rnd.choice(WORDS)], {}),
+               ([rnd.choice(SYLLABLES)], 'benchsearch', [rnd.choice(SYLLABLES)], {'deep': True, 'all_keywords': True})]
+    rows = []
+    for keywords, stag, without, params in queries:
+        t0, expected = measure(lambda: _legacy(keywords, stag, without, **params), repeat)
+        t1, actual = measure(lambda: bdb.search_keywords_and_filter_by_tags(keywords, stag=[stag], without=without, **params), repeat)
+        assert expected == actual, f'results differ for {keywords}'
+        rows += [(f'-s {" ".join(keywords)} -t {stag[:11]} -x {" ".join(without)}', len(actual), t0, t1)]
+    report('combined search, ms', [('query', 'matches', 'separate', 'compiled')] + rows)
+
+def bench_first_page(bdb, repeat):
+    """Showing the first page (10 records) of search results: fetching all matches vs a lazily fetched page (& count)."""
+    rnd = random.Random(7)
+    queries = [([rnd.choice(WORDS)], {}), ([rnd.choice(WORDS)[:3]], {'deep': True}),
+               ([rnd.choice(SYLLABLES)], {'deep': True}), (['https'], {'deep': True})]
+    rows = []
+    for keywords, params in queries:
+        t0, expected = measure(lambda: bdb.searchdb(keywords, **params)[:10], repeat)
+        t1, actual = measure(lambda: SearchResults(bdb.searchdb, keywords, **params)[:10], repeat)
+        t2, count = measure(lambda: bdb.searchdb(keywords, **params, count_only=True), repeat)
+        assert expected == actual, f'results differ for {keywords}'
+        rows += [(' '.join(keywords), count, t0, t1, t2)]
+    report('first page of search results, ms', [('query', 'matches', 'all', 'page', 'count')] + rows)
+
+
+def bench_mem_index(bdb, repeat):
+    """Interactive prompt queries (first page & match count): SQL vs the in-memory index (without cached results)."""
+    rnd = random.Random(8)
+    bdb.enable_fts(False)
+    bdb.enable_fts(False, trigram=True)
+    index = MemoryIndex(bdb)
+    start = time.perf_counter()
+    index.load()
+    loading = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    index.searchdb([rnd.choice(WORDS)])  # building the token index
+    tokens = (time.perf_counter() - start) * 1000
+    tag = bdb.get_tag_all()[0][0]
+    queries = [('s', [rnd.choice(WORDS)], {}),
+               ('S', rnd.sample(SYLLABLES, 2), {'all_keywords': True}),
+               ('s (deep)', [rnd.choice(WORDS)[:4]], {'deep': True}),
+               ('r', [rnd.choice(SYLLABLES) + '.*' + rnd.choice(SYLLABLES)], {'regex': True}),
+               ('t', tag, {})]
+
+    def _first_page(engine, query, params):
+        index._last = (None, [])  # a new query each time
+        results = SearchResults((engine.searchdb if isinstance(query, list) else engine.search_by_tag), query, **params, page_size=10)
+        return results[:10], len(results)
+
+    rows = []
+    for key, query, params in queries:
+        name = f'{key} {" ".join(query) if isinstance(query, list) else query}'
+        t0, expected = measure(lambda: _first_page(bdb, query, params), repeat)
+        t1, actual = measure(lambda: _first_page(index, query, params), repeat)
+        assert expected == actual, f'results differ for {name}'
+        rows += [(name, expected[1], t0, t1)]
+    t0, expected = measure(bdb.get_tag_all, repeat)
+    t1, actual = measure(index.get_tag_all, repeat)
+    assert expected == actual, 'tag lists differ'
+    rows += [('t (tag list)', len(expected[0]), t0, t1)]
+    t0, _ = measure(lambda: bdb.get_rec_all_by_ids(random.sample(range(1, 1 + bdb.get_max_id()), 10)), repeat)
+    t1, _ = measure(lambda: index.sample(10), repeat)
+    rows += [('R -10', 10, t0, t1)]
+    report(f'prompt queries, ms (index loaded in {loading:.0f} ms, tokens indexed in {tokens:.0f} ms)',
+           [('query', 'matches', 'SQL', 'memory')] + rows)
+
+
+def bench_refine(bdb, repeat):
+    """Narrowing down results of a broad search: re-querying the DB (with ALL keywords) vs refining results in memory."""
+    rnd = random.Random(9)
+    bdb.enable_fts(False)
+    bdb.enable_fts(False, trigram=True)
+    base = rnd.choice(WORDS)[:4]  # matching a sizeable fraction of the DB
+    results = bdb.searchdb([base], deep=True)
+    rows = []
+    for keywords in ([rnd.choice(SYLLABLES)], [rnd.choice(SYLLABLES), rnd.choice(SYLLABLES)], [rnd.choice(WORDS)]):
+        t0, expected = measure(lambda: bdb.searchdb([base] + keywords, all_keywords=True, deep=True), repeat)
+        t1, actual = measure(lambda: bdb.refine_results(results, keywords, deep=True), repeat)
+        assert expected == actual, f'results differ for {keywords}'
+        rows += [(' '.join(keywords), len(actual), t0, t1)]
+    report(f'refining {len(results)} results of "{base}" (deep), ms', [('keywords', 'matches', 'SQL', 'refine')] + rows)
+
+
+def bench_regex_shards(bdb, repeat):
+    """Regex search: a single connection vs id ranges sharded among worker processes."""
+    rnd = random.Random(10)
+    queries = [[rnd.choice(SYLLABLES) + '.*' + rnd.choice(SYLLABLES)], [r'\b' + rnd.choice(WORDS)[:4]], [rnd.choice(WORDS)]]
+    counts = sorted({1, 2, 4, os.cpu_count() or 1})
+    rows = []
+    for keywords in queries:
+        times, expected = [], None
+        for processes in counts:
+            t, results = measure(lambda: bdb.searchdb(keywords, regex=True, processes=processes), repeat)
+            assert expected is None or results == expected, f'results differ for {keywords} with {processes} processes'
+            times, expected = times + [t], results
+        rows += [(' '.join(keywords), len(expected), *times)]
+    report(f'regex search, ms ({os.cpu_count()} CPUs)', [('query', 'matches', *(f'{n} proc' for n in counts))] + rows)
+
+
+BENCHMARKS = {
+    'deep-search': bench_deep_search,
+    'regexp': bench_regexp,
+    'import': bench_import,
+    'reorder': bench_reorder,
+    'db-profile': bench_db_profile,
+    'tag-list': bench_tag_list,
+    'related-tags': bench_related_tags,
+    'retag': bench_retag,
+    'fixtags': bench_fixtags,
+    'combined-search': bench_combined_search,
+    'first-page': bench_first_page,
+    'mem-index': bench_mem_index,
+    'refine': bench_refine,
+    'regex-shards': bench_regex_shards,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m tests.benchmark', description='Run buku DB benchmarks.')
+    parser.add_argument('-n', '--rows', type=int, default=1000000, help='number of synthetic bookmarks (default 1M)')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='number of runs per measurement (default 5)')
+    parser.add_argument('--db', help='use an existing DB file instead of generating one')
+    parser.add_argument('benchmark', nargs='*', help=f'benchmarks to run: {", ".join(BENCHMARKS)} (default all)')
+    args = parser.parse_args(argv)
+    if set(args.benchmark) - set(BENCHMARKS):
+        parser.error(f'unknown benchmark(s): {", ".join(sorted(set(args.benchmark) - set(BENCHMARKS)))}')
+
+    with TemporaryDirectory(prefix='bukubench_') as tmpdir:
+        if args.db:
+            bdb = BukuDb(dbfile=args.db)
+        else:
+            start = time.perf_counter()
+            bdb = generate_db(os.path.join(tmpdir, 'bookmarks.db'), args.rows)
+            print(f'generated {args.rows} bookmarks in {time.perf_counter() - start:.1f} s')
+        try:
+            for name in (args.benchmark or BENCHMARKS):
+                BENCHMARKS[name](bdb, args.repeat)
+        finally:
+            bdb.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -12,8 +12,8 @@ from urllib.parse import urlparse
 
 import pytest
 
-from buku import DELIM, FIELD_FILTER, ALL_FIELDS, SortKey, FetchResult, is_int, prep_tag_search, \
-                 print_rec_with_filter, get_netloc, extract_auth, parse_range, split_by_marker
+from buku import DELIM, FIELD_FILTER, ALL_FIELDS, BookmarkVar, SortKey, FetchResult, is_int, prep_tag_search, \
+                 print_rec_with_filter, get_netloc, extract_auth, parse_range, split_by_marker, format_json, iter_json
 
 
 def check_import_html_results_contains(result, expected_result):
@@ -271,6 +271,15 @@ def test_format_json(field_filter, single_record):
         assert res == m_json.dumps.return_value
 
 
+@pytest.mark.parametrize('single_record', [True, False])
+@pytest.mark.parametrize('field_filter', [0, 1, 3, 10, 50])
+@pytest.mark.parametrize('count', [0, 1, 3])
+def test_iter_json(field_filter, single_record, count):
+    records = [BookmarkVar(i, f'http://example.com/{i}', 'Title\n"quoted"', ',tag,ünïcode,', f'desc {i}', 0) for i in range(1, count + 1)]
+    chunks = iter_json(iter(records), single_record, field_filter)
+    assert ''.join(chunks) == format_json(records, single_record, field_filter)
+
+
 @pytest.mark.parametrize(
     "string, exp_res",
     [
@@ -348,6 +357,16 @@ def test_regexp(exp, item, exp_res):
     assert res == exp_res
 
 
+def test_compile_regex():
+    """test func."""
+    import buku
+
+    buku.compile_regex.cache_clear()
+    assert buku.regexp("CAT.y", "catty") and buku.regexp("CAT.y", "CATTY")
+    assert buku.compile_regex("CAT.y") is buku.compile_regex("CAT.y")
+    assert buku.compile_regex.cache_info().misses == 1
+
+
 @pytest.mark.parametrize("token, exp_res", [("text", ",text,")])
 def test_delim_wrap(token, exp_res):
     """test func."""
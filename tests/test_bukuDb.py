@@ -2,13 +2,17 @@
 #
 # Unit test cases for buku
 #
+import json
 import math
 import os
 import re
 import sqlite3
 import sys
 import unittest
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from genericpath import exists
+from itertools import product
 from tempfile import NamedTemporaryFile, TemporaryDirectory
 from random import shuffle
 from unittest import mock
@@ -18,7 +22,8 @@ import yaml
 from hypothesis import example, given, settings
 from hypothesis import strategies as st
 
-from buku import PERMANENT_REDIRECTS, BukuDb, FetchResult, BookmarkVar, bookmark_vars, parse_tags, prompt
+from buku import (DB_PROFILES, FIXTAGS_CHUNK, PERMANENT_REDIRECTS, BukuDb, FetchResult, BookmarkVar, MemoryIndex,
+                  SearchResults, SqlProfiler, bookmark_vars, filter_from, get_netloc, parse_tags, prompt, sql_netloc)
 from tests.util import mock_fetch, _add_rec, _tagset
 
 
@@ -1230,6 +1235,142 @@ def test_list_tags(capsys, bukuDb):
     assert err == ""
 
 
+@pytest.mark.parametrize('retain_order', [False, True])
+@pytest.mark.parametrize('indices', [[], [1], [10], [2, 5], [3, 8], [2, 9], [9, 10, 2], range(3, 8), [1, 4, 6, 7, 10, 42], range(1, 11)])
+def test_delete_recs(bukuDb, tmp_path, indices, retain_order):
+    expected, bdb = bukuDb(dbfile=tmp_path / 'expected.db'), bukuDb()
+    for db in (expected, bdb):
+        db.add_recs([(f'http://example.com/{i}', f'Title {i}', f',tag{i % 3},', '', 0) for i in range(1, 11)])
+    if retain_order:
+        for index in sorted(set(indices), reverse=True):
+            expected.delete_rec(index, retain_order=True)
+    else:  # freed positions are taken by the last records, in the same order
+        remaining = [i for i in range(1, 11) if i not in indices]
+        moved = dict(zip([i for i in remaining if i > len(remaining)], [i for i in indices if i <= len(remaining)]))
+        expected.delete_rec_all()
+        expected.add_recs([(f'http://example.com/{i}', f'Title {i}', f',tag{i % 3},', '', 0)
+                           for i in sorted(remaining, key=lambda i: moved.get(i, i))])
+    assert bdb.delete_recs(indices, retain_order=retain_order) == len(set(indices) - {42})
+    assert bdb.get_rec_all() == expected.get_rec_all()
+    assert _tag_index(bdb) == _tag_index(expected)
+
+
+def test_delete_recs_gaps(bukuDb):
+    bdb = bukuDb()
+    bdb.add_recs([(f'http://example.com/{i}', '', ',', '', 0) for i in range(1, 9)])
+    bdb.cur.execute('DELETE FROM bookmarks WHERE id IN (3, 6)')
+    assert bdb.delete_recs([2, 5], retain_order=True) == 2
+    assert [x.url for x in bdb.get_rec_all()] == [f'http://example.com/{i}' for i in (1, 4, 7, 8)]
+    assert [x.id for x in bdb.get_rec_all()] == [1, 3, 5, 6]
+    assert not bdb.cur.execute('SELECT name FROM sqlite_temp_master').fetchall()
+
+
+def test_delete_resultset(bukuDb, capsys):
+    bdb = bukuDb()
+    bdb.add_recs([(f'http://example.com/{i}', '', ',', '', 0) for i in range(1, 6)])
+    bdb.chatty = True
+    with mock.patch('buku.read_in', return_value='y'):
+        assert bdb.delete_resultset(bdb.searchdb(['example.com/2', 'example.com/4']), retain_order=True)
+    assert capsys.readouterr().out == '2 deleted\n'
+    assert [x.url for x in bdb.get_rec_all()] == [f'http://example.com/{i}' for i in (1, 3, 5)]
+    bdb.chatty = False
+    assert bdb.delete_resultset(bdb.searchdb(['example.com/3']))
+    assert capsys.readouterr().out == ''
+    assert [x.url for x in bdb.get_rec_all()] == [f'http://example.com/{i}' for i in (1, 5)]
+
+
+@pytest.mark.parametrize('rewrites, index, expected', [
+    ({}, None, [',a,b,', ',b,c,', ',', ',a,c,d,']),
+    ({'a': ['x']}, None, [',b,x,', ',b,c,', ',', ',c,d,x,']),
+    ({'A': 'x,Y', 'nonexistent': 'z'}, None, [',b,x,y,', ',b,c,', ',', ',c,d,x,y,']),
+    ({'a': None, 'd': []}, None, [',b,', ',b,c,', ',', ',c,']),
+    ({'a': ['c'], 'b': 'c'}, None, [',c,', ',c,', ',', ',c,d,']),  # merging
+    ({'a': ['b'], 'b': ['a']}, None, [',a,b,', ',a,c,', ',', ',b,c,d,']),  # swapping
+    ({'c': ''}, [2, 3], [',a,b,', ',b,', ',', ',a,c,d,']),
+    ({'a': 'new'}, range(2, 5), [',a,b,', ',b,c,', ',', ',c,d,new,']),
+])
+def test_rewrite_tags(bukuDb, rewrites, index, expected):
+    bdb = bukuDb()
+    bdb.add_recs([(f'http://example.com/{i}', '', tags, '', 0) for i, tags in enumerate([',a,b,', ',b,c,', ',', ',a,c,d,'])])
+    statements = []
+    bdb.conn.set_trace_callback(statements.append)
+    matching = [x.id for x in bdb.get_rec_all() if _tagset(x.tags_raw) & {tag.lower() for tag in rewrites}]
+    assert bdb.rewrite_tags(rewrites, index) == len([id for id in matching if not index or id in index])
+    assert [x.tags_raw for x in bdb.get_rec_all()] == expected
+    assert len({x for x in statements if x.startswith('UPDATE bookmarks')}) == (1 if rewrites else 0)  # (and its triggers)
+    assert _tag_index(bdb) == {x.id: _tagset(x.tags_raw) for x in bdb.get_rec_all() if _tagset(x.tags_raw)}
+    assert not bdb.cur.execute('SELECT name FROM sqlite_temp_master').fetchall()
+
+
+def test_rewrite_tags_invalid(bukuDb, caplog):
+    bdb = bukuDb()
+    _add_rec(bdb, 'http://example.com', '', ',a,b,')
+    assert bdb.rewrite_tags({'a,b': 'c'}) is None
+    assert 'Tags cannot contain delimiter' in caplog.text
+    assert bdb.get_rec_by_id(1).tags_raw == ',a,b,'
+
+
+@pytest.mark.parametrize('chunk_size, processes', [(FIXTAGS_CHUNK, None), (2, 1), (3, 2)])
+def test_fixtags(bukuDb, capsys, chunk_size, processes):
+    bdb = bukuDb()
+    tags = [',', ',b,A,a,', ',ok,', None, ',c, B ,c,', ',x,y,', ',,Z,']
+    bdb.cur.executemany('INSERT INTO bookmarks (URL, tags) VALUES (?, ?)', [(f'http://example.com/{i}', x) for i, x in enumerate(tags)])
+    bdb.conn.commit()
+    expected = [',', ',a,b,', ',ok,', ',', ',b,c,', ',x,y,', ',z,']
+    assert bdb.fixtags(dry_run=True, chunk_size=chunk_size, processes=processes, progress=True) == 4
+    assert [x.tags_raw for x in bdb.get_rec_all()] == tags
+    assert capsys.readouterr().err.endswith('\r7/7 checked, 4 to fix\n')
+    with mock.patch('buku.ProcessPoolExecutor', wraps=ProcessPoolExecutor) as pool:
+        assert bdb.fixtags(chunk_size=chunk_size, processes=processes) == 4
+    assert pool.called == bool(processes and processes > 1)
+    assert all(x.kwargs['mp_context'].get_start_method() != 'fork' for x in pool.call_args_list)
+    assert [x.tags_raw for x in bdb.get_rec_all()] == expected
+    assert {id: {x.lower() for x in tags} for id, tags in _tag_index(bdb).items()} == \
+        {i: _tagset(x) for i, x in enumerate(expected, start=1) if _tagset(x)}  # (tag names keep the case they were added with)
+    assert bdb.fixtags(chunk_size=chunk_size, processes=processes) == 0
+    assert not capsys.readouterr().err
+
+
+@pytest.mark.parametrize('legacy', [False, True])
+def test_reclaim_space(bukuDb, tmp_path, legacy):
+    dbfile = str(tmp_path / 'test.db')
+    if legacy:  # created without auto-vacuum
+        sqlite3.connect(dbfile).execute('CREATE TABLE bookmarks (id integer PRIMARY KEY, URL text NOT NULL UNIQUE, '
+                                        "metadata text default '', tags text default ',', desc text default '', flags integer default 0)")
+    bdb = bukuDb(dbfile=dbfile)
+    _pragma = lambda name: bdb.cur.execute(f'PRAGMA {name}').fetchone()[0]
+    assert _pragma('auto_vacuum') == (0 if legacy else 2)
+    bdb.add_recs([(f'http://example.com/{i}', 'title', ',tag,', 'x' * 1000, 0) for i in range(200)])
+    statements = []
+    bdb.conn.set_trace_callback(statements.append)
+    assert bdb.delete_rec(1)
+    assert 'VACUUM' not in statements
+    with mock.patch('buku.VACUUM_FREE_PAGES', 0), mock.patch('buku.VACUUM_FREE_RATIO', 0):
+        bdb.delete_resultset(bdb.get_rec_all()[:20])
+        assert _pragma('auto_vacuum') == 2
+        assert _pragma('freelist_count') == 0
+        bdb.delete_resultset(bdb.get_rec_all()[:20])
+        assert _pragma('freelist_count') == 0
+    assert bdb.get_max_id() == 159
+
+
+def test_maintain(bukuDb, tmp_path):
+    dbfile = str(tmp_path / 'test.db')
+    sqlite3.connect(dbfile).execute('CREATE TABLE bookmarks (id integer PRIMARY KEY, URL text NOT NULL UNIQUE, '
+                                    "metadata text default '', tags text default ',', desc text default '', flags integer default 0)")
+    bdb = bukuDb(dbfile=dbfile)
+    bdb.add_recs([(f'http://example.com/{i}', 'title', ',tag,', 'x' * 1000, 0) for i in range(200)])
+    bdb.cur.execute('DELETE FROM bookmarks WHERE id > 10')
+    bdb.conn.commit()
+    size = os.path.getsize(dbfile)
+    assert bdb.cur.execute('PRAGMA auto_vacuum').fetchone()[0] == 0
+    assert bdb.maintain()
+    assert bdb.cur.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+    assert os.path.getsize(dbfile) < size / 4
+    assert bdb.maintain()
+    assert len(bdb.get_rec_all()) == 10
+
+
 def test_compactdb(bukuDb):
     bdb = bukuDb()
 
@@ -1261,6 +1402,267 @@ def test_compactdb(bukuDb):
     assert bdb.get_rec_by_id(3) is None
 
 
+def _tag_index(bdb):
+    bdb.cur.execute('SELECT bookmark_id, name FROM bookmark_tags JOIN tags ON tags.id = tag_id')
+    index = {}
+    for id, tag in bdb.cur.fetchall():
+        index.setdefault(id, set()).add(tag)
+    return index
+
+
+def test_tag_index(bukuDb):
+    bdb = bukuDb()
+    for bookmark in TEST_BOOKMARKS:
+        _add_rec(bdb, *bookmark)
+    expected = {id: _tagset(tags) for id, _, _, tags, _, _ in bdb.get_rec_all()}
+    assert _tag_index(bdb) == expected
+
+    bdb.update_rec(1, tags_in=',old,new,')
+    bdb.append_tag_at_index(3, ',foo,')
+    assert _tag_index(bdb) == {**expected, 1: {'old', 'new'}, 3: expected[3] | {'foo'}}
+    bdb.swap_recs(1, 3)
+    assert _tag_index(bdb) == {**expected, 3: {'old', 'new'}, 1: expected[3] | {'foo'}}
+    bdb.delete_rec(2)  # moves the last record in its place
+    assert _tag_index(bdb) == {2: {'old', 'new'}, 1: expected[3] | {'foo'}}
+    bdb.cur.execute('SELECT name FROM tags ORDER BY name')
+    assert [x for x, in bdb.cur.fetchall()] == ['es', 'est', 'foo', 'new', 'old', 'tes', 'test']
+
+
+def test_tag_index_existing_db(bukuDb, tmp_path):
+    conn = sqlite3.connect(tmp_path / 'legacy.db')
+    conn.execute("CREATE TABLE bookmarks (id integer PRIMARY KEY, URL text NOT NULL UNIQUE, "
+                 "metadata text default '', tags text default ',', desc text default '', flags integer default 0)")
+    conn.executemany('INSERT INTO bookmarks (URL, metadata, tags, desc) VALUES (?, ?, ?, ?)', TEST_BOOKMARKS)
+    conn.commit()
+    conn.close()
+
+    bdb = bukuDb(dbfile=tmp_path / 'legacy.db')
+    assert _tag_index(bdb) == {i: _tagset(x[2]) for i, x in enumerate(TEST_BOOKMARKS, start=1)}
+    assert [x.id for x in bdb.search_by_tag('NEWS, es')] == [1, 3]
+    assert [x.id for x in bdb.search_by_tag('est + es - news')] == [3]
+    assert bdb.get_tag_all()[1] == {tag: 1 for tag in sorted(set.union(*[_tagset(x[2]) for x in TEST_BOOKMARKS]))}
+
+
+def test_tag_counts(bukuDb, tmp_path):
+    def _expected(db):
+        counts = Counter(tag for x in db.get_rec_all() for tag in _tagset(x.tags_raw))
+        untagged = sum(1 for x in db.get_rec_all() if not _tagset(x.tags_raw))
+        return sorted(counts), dict(({'': untagged} if untagged else {}), **{tag: counts[tag] for tag in sorted(counts)})
+
+    bdb = bukuDb(dbfile=tmp_path / 'test.db')
+    for bookmark in TEST_BOOKMARKS + [['http://untagged.com', 'Untagged', ',', ''], ['http://none.org', 'None', None, '']]:
+        _add_rec(bdb, *bookmark)
+    assert bdb.get_tag_all() == _expected(bdb)
+    assert bdb.get_tag_all()[1][''] == 2
+    bdb.update_rec(1, tags_in=',old,test,')
+    bdb.update_rec(4, tags_in=',new,')
+    bdb.append_tag_at_index(2, ',foo,')
+    bdb.replace_tag('test', ['tset'])
+    bdb.delete_tag_at_index(3, 'es')
+    assert bdb.get_tag_all() == _expected(bdb)
+    bdb.update_rec(2, tags_in=',')
+    bdb.swap_recs(1, 5)
+    bdb.reorder(['-id'])
+    bdb.add_recs([('http://new.com', 'New', ',new,old,', '', 0), ('http://slashdot.org', '', ',extra,', '', 0)], on_conflict='merge_tags')
+    assert bdb.get_tag_all() == _expected(bdb)
+    bdb.delete_recs([1, 3])
+    bdb.delete_rec(1, retain_order=True)
+    assert bdb.get_tag_all() == _expected(bdb)
+    bdb.cur.execute('SELECT tag_id FROM tag_counts WHERE tag_id NOT IN (SELECT id FROM tags)')
+    assert bdb.cur.fetchall() == [(0,)]  # no leftovers from removed tags
+    expected = _expected(bdb)
+    bdb.cur.execute('DROP TABLE tag_counts')
+    bdb.cur.execute('PRAGMA user_version = 3')  # before tag_counts existed
+    bdb.close()
+    bdb = bukuDb(dbfile=tmp_path / 'test.db')
+    assert bdb.get_tag_all() == expected
+    bdb.delete_rec_all()
+    assert bdb.get_tag_all() == ([], {})
+
+
+def test_tag_pairs(bukuDb, tmp_path):
+    def _expected(db):
+        pairs = Counter((a, b) for x in db.get_rec_all() for a in _tagset(x.tags_raw) for b in _tagset(x.tags_raw) if a != b)
+        return dict(pairs)
+
+    def _pairs(db):
+        db.cur.execute('SELECT a.name, b.name, count FROM tag_pairs JOIN tags AS a ON a.id = tag_id JOIN tags AS b ON b.id = other_id')
+        return {(a, b): count for a, b, count in db.cur.fetchall()}
+
+    bdb = bukuDb(dbfile=tmp_path / 'test.db')
+    for bookmark in TEST_BOOKMARKS + [['http://test.com', 'Test', ',test,es,news,', ''], ['http://untagged.com', 'Untagged', ',', '']]:
+        _add_rec(bdb, *bookmark)
+    assert _pairs(bdb) == _expected(bdb)
+    assert bdb.get_related_tags(['test']) == [('es', 2), ('est', 1), ('news', 1), ('tes', 1)]
+    assert bdb.get_related_tags(['TEST', 'old'], limit=2) == [('es', 2), ('news', 2)]
+    assert bdb.get_related_tags(['test', 'es']) == [('est', 2), ('news', 2), ('tes', 2)]
+    assert bdb.get_related_tags(['nonexistent']) == []
+    bdb.update_rec(1, tags_in=',old,test,')
+    bdb.append_tag_at_index(5, ',foo,bar,')
+    bdb.replace_tag('test', ['tset', 'foo'])
+    bdb.delete_tag_at_index(3, 'es')
+    assert _pairs(bdb) == _expected(bdb)
+    bdb.swap_recs(1, 5)
+    bdb.reorder(['-id'])
+    bdb.add_recs([('http://new.com', 'New', ',new,old,', '', 0), ('http://slashdot.org', '', ',extra,', '', 0)], on_conflict='merge_tags')
+    assert _pairs(bdb) == _expected(bdb)
+    bdb.delete_recs([1, 3])
+    bdb.delete_rec(1, retain_order=True)
+    assert _pairs(bdb) == _expected(bdb)
+    assert 0 not in _pairs(bdb).values()
+    expected = _expected(bdb)
+    bdb.cur.execute('DROP TABLE tag_pairs')
+    bdb.cur.execute('PRAGMA user_version = 4')  # before tag_pairs existed
+    bdb.close()
+    bdb = bukuDb(dbfile=tmp_path / 'test.db')
+    assert _pairs(bdb) == expected
+    bdb.delete_rec_all()
+    assert _pairs(bdb) == {}
+
+
+def test_migrate(bukuDb, tmp_path):
+    dbfile = tmp_path / 'legacy.db'
+    conn = sqlite3.connect(dbfile)
+    conn.execute("CREATE TABLE bookmarks (id integer PRIMARY KEY, URL text NOT NULL UNIQUE, "
+                 "metadata text default '', tags text default ',', desc text default '', flags integer default 0)")
+    conn.executemany('INSERT INTO bookmarks (URL, metadata, tags, desc) VALUES (?, ?, ?, ?)', TEST_BOOKMARKS)
+    conn.commit()
+    conn.close()
+    _version = lambda db: db.cur.execute('PRAGMA user_version').fetchone()[0]
+
+    def _fail(cur):
+        cur.execute('CREATE TABLE foo (bar)')
+        raise sqlite3.OperationalError('failed')
+
+    with mock.patch('buku.BukuDb.MIGRATIONS', BukuDb.MIGRATIONS[:1] + (_fail,)):
+        with pytest.raises(sqlite3.OperationalError):
+            bukuDb(dbfile=dbfile)
+    bdb = bukuDb(dbfile=dbfile, readonly=True)
+    assert _version(bdb) == 1
+    assert not bdb._has_table('foo')
+    bdb.close()
+
+    bdb = bukuDb(dbfile=dbfile)
+    assert _version(bdb) == len(BukuDb.MIGRATIONS)
+    assert bdb.get_rec_all() == [BookmarkVar(i, *x) for i, x in enumerate(TEST_BOOKMARKS, start=1)]
+    assert bdb.get_tag_all()[0] == sorted({tag for x in TEST_BOOKMARKS for tag in x[2].split(',') if tag})
+    assert [x.id for x in bdb.search_by_netloc('example.com')] == [3]
+    bdb.close()
+
+    profiler = SqlProfiler()
+    bdb = bukuDb(dbfile=dbfile, profiler=profiler)
+    assert list(profiler.stats) == ['PRAGMA user_version']  # nothing to do
+    bdb.close()
+
+    bdb = bukuDb(dbfile=dbfile)
+    bdb.cur.execute('PRAGMA user_version = 1000')  # created by a newer version
+    bdb.close()
+    with mock.patch('buku.BukuDb.MIGRATIONS', [_fail]):
+        assert _version(bukuDb(dbfile=dbfile)) == 1000
+
+
+@pytest.mark.parametrize('immutable', [False, True])
+def test_readonly_legacy_db(bukuDb, tmp_path, immutable):
+    dbfile = tmp_path / 'legacy.db'
+    conn = sqlite3.connect(dbfile)
+    conn.execute("CREATE TABLE bookmarks (id integer PRIMARY KEY, URL text NOT NULL UNIQUE, "
+                 "metadata text default '', tags text default ',', desc text default '', flags integer default 0)")
+    conn.executemany('INSERT INTO bookmarks (URL, metadata, tags, desc) VALUES (?, ?, ?, ?)', TEST_BOOKMARKS)
+    conn.commit()
+    conn.close()
+    expected = bukuDb(dbfile=tmp_path / 'migrated.db')
+    for x in TEST_BOOKMARKS:
+        expected.add_rec(*x)
+
+    bdb = bukuDb(dbfile=dbfile, readonly=True, immutable=immutable)
+    assert bdb.cur.execute('PRAGMA user_version').fetchone()[0] == 0  # the file is left as is
+    assert not bdb._has_table('bookmark_tags')
+    assert bdb.get_rec_all() == [BookmarkVar(i, *x) for i, x in enumerate(TEST_BOOKMARKS, start=1)]
+    assert bdb.get_tag_all() == expected.get_tag_all()
+    assert bdb.get_related_tags(['news']) == expected.get_related_tags(['news'])
+    assert bdb.search_by_tag('news') == expected.search_by_tag('news')
+    assert [x.id for x in bdb.search_by_netloc('example.com')] == [3]
+    assert bdb.searchdb(['nerds'], order=['netloc']) == expected.searchdb(['nerds'], order=['netloc'])
+    bdb.close()
+
+
+@pytest.mark.parametrize('profile, env', [('fast', None), ('safe', None), ('readonly', None),
+                                          (None, 'fast'), (None, 'bogus'), ('bogus', None)])
+def test_db_profile(bukuDb, tmp_path, monkeypatch, caplog, profile, env):
+    dbfile = tmp_path / 'test.db'
+    bukuDb(dbfile=dbfile).close()  # creating the DB
+    if env:
+        monkeypatch.setenv('BUKU_DB_PROFILE', env)
+    name = (profile or env) if (profile or env) in DB_PROFILES else 'default'
+    bdb = bukuDb(dbfile=dbfile, db_profile=profile)
+    _pragma = lambda name: bdb.cur.execute(f'PRAGMA {name}').fetchone()[0]
+    settings = DB_PROFILES[name]
+    assert bdb.db_profile == name
+    assert bdb.readonly == (name == 'readonly')
+    assert _pragma('cache_size') == settings.get('cache_size', -2000)
+    assert _pragma('synchronous') == {'OFF': 0, 'NORMAL': 1, 'FULL': 2}[settings.get('synchronous', 'FULL')]
+    assert _pragma('journal_mode') == (settings.get('journal_mode') or 'delete').lower()
+    assert ('Unknown DB profile: bogus' in caplog.text) == (name == 'default')
+    if bdb.readonly:
+        with pytest.raises(sqlite3.OperationalError, match='readonly'):
+            bdb.cur.execute("INSERT INTO bookmarks (URL) VALUES ('https://example.com')")
+    else:
+        assert bdb.add_rec('https://example.com')
+    bdb.close()
+
+
+def test_netloc_column(bukuDb, tmp_path):
+    conn = sqlite3.connect(tmp_path / 'legacy.db')
+    conn.execute("CREATE TABLE bookmarks (id integer PRIMARY KEY, URL text NOT NULL UNIQUE, "
+                 "metadata text default '', tags text default ',', desc text default '', flags integer default 0)")
+    conn.executemany('INSERT INTO bookmarks (URL, metadata, tags, desc) VALUES (?, ?, ?, ?)', TEST_BOOKMARKS)
+    conn.commit()
+    conn.close()
+
+    bdb = bukuDb(dbfile=tmp_path / 'legacy.db')
+    _netlocs = lambda: dict(bdb.conn.execute('SELECT id, netloc FROM bookmarks'))
+    assert _netlocs() == {1: 'slashdot.org', 2: 'www.zażółćgęśląjaźń.pl', 3: 'example.com'}
+    _add_rec(bdb, 'https://Example.com:8080/foo', 'test')
+    _add_rec(bdb, 'file:///etc/hosts', 'test')
+    bdb.conn.execute("UPDATE bookmarks SET url = '//lwn.net/Articles' WHERE id = 1")
+    assert _netlocs() == {1: 'lwn.net', 2: 'www.zażółćgęśląjaźń.pl', 3: 'example.com', 4: 'Example.com:8080', 5: None}
+    bdb.conn.execute("UPDATE bookmarks SET netloc = 'invalid' WHERE id = 2")
+    assert _netlocs()[2] == 'www.zażółćgęśląjaźń.pl'
+
+    _add_rec(bdb, 'http://EXAMPLE.com/bar', 'test')
+    assert bdb.get_netloc_all() == {'': 1, 'example.com': 1, 'EXAMPLE.com': 1, 'Example.com:8080': 1,
+                                    'lwn.net': 1, 'www.zażółćgęśląjaźń.pl': 1}
+    assert [x.id for x in bdb.search_by_netloc('example.com')] == [3]
+    assert [x.id for x in bdb.search_by_netloc('EXAMPLE.com')] == [6]  # matched as in the URL
+    assert [x.id for x in bdb.search_by_netloc('')] == [5]
+    assert not bdb.search_by_netloc('slashdot.org')
+    assert [x.id for x in bdb.get_rec_all(order=['netloc'])] == [5, 3, 6, 4, 1, 2]
+    plan = bdb.conn.execute('EXPLAIN QUERY PLAN SELECT netloc, COUNT(*) FROM bookmarks GROUP BY netloc').fetchall()
+    assert any('bookmarks_netloc' in row[-1] for row in plan)
+    plan = bdb.conn.execute('EXPLAIN QUERY PLAN SELECT id FROM bookmarks WHERE netloc = ? AND netloc = ? COLLATE BINARY',
+                            ('example.com',) * 2).fetchall()
+    assert any('bookmarks_netloc' in row[-1] for row in plan)
+    bdb.close()
+
+    conn = sqlite3.connect(tmp_path / 'legacy.db')  # no custom SQL functions
+    conn.execute("INSERT INTO bookmarks (URL) VALUES ('https://sqlite.org/cli.html')")
+    conn.execute("UPDATE bookmarks SET URL = 'http://news.ycombinator.com' WHERE id = 1")
+    conn.commit()
+    assert dict(conn.execute('SELECT id, netloc FROM bookmarks WHERE id IN (1, 7)')) == {1: 'news.ycombinator.com', 7: 'sqlite.org'}
+    conn.close()
+
+
+@pytest.mark.parametrize('url', [
+    'http://slashdot.org', 'https://Example.com:8080/foo?x#y', 'file:///etc/hosts', '//lwn.net/Articles', 'example.com?', 'example.com#',
+    'example.com:8080/x', 'mailto:a@b.c', 'javascript:void(0)', ' \t http://a.b/c', 'ht\ntp://x.y', 'http:x.y', 'http://[::1]:80/',
+    'http://[::1/', 'http://a]b/', '1http://x.y/', 'a+b-c.d://host/p', 'a_b://host/', '/path', '///x', 'http://user:pw@host.com/',
+    '', 'http://', 'www.zażółćgęśląjaźń.pl/x', 'x:', ':foo', '\x01http://ctl.com/',
+])
+def test_sql_netloc(url):
+    conn = sqlite3.connect(':memory:')
+    assert conn.execute(f'SELECT {sql_netloc("?")}', (url,)).fetchone()[0] == get_netloc(url)
+
+
 @pytest.mark.vcr()
 @pytest.mark.parametrize(
     "low, high, delay_commit, input_retval, exp_res",
@@ -1618,9 +2020,10 @@ def test_load_chrome_database(bukuDb, chrome_db, add_pt):
                 res_yaml = yaml.load(f, Loader=PrettySafeLoader)
     # init
     bdb = bukuDb()
-    bdb.add_rec = mock.Mock()
+    items = []
+    bdb.add_recs = mock.Mock(side_effect=lambda records, **kwargs: items.extend(records))
     bdb.load_chrome_database(json_file, None, add_pt)
-    call_args_list_dict = dict(bdb.add_rec.call_args_list)
+    call_args_list_dict = {tuple(item): {} for item in items}
     # test
     if not dump_data:
         assert call_args_list_dict == res_yaml
@@ -1656,9 +2059,10 @@ def test_load_firefox_database(bukuDb, firefox_db, add_pt):
             res_yaml = yaml.load(f, Loader=PrettySafeLoader)
     # init
     bdb = bukuDb()
-    bdb.add_rec = mock.Mock()
+    items = []
+    bdb.add_recs = mock.Mock(side_effect=lambda records, **kwargs: items.extend(records))
     bdb.load_firefox_database(ff_db_path, None, add_pt)
-    call_args_list_dict = dict(bdb.add_rec.call_args_list)
+    call_args_list_dict = {tuple(item): {} for item in items}
     # test
     if not dump_data:
         assert call_args_list_dict == res_yaml
@@ -1703,16 +2107,41 @@ def test_sort_and_reorder(bukuDb, fields, ignore_case, expected):
     bdb.reorder(fields, ignore_case=ignore_case)
     assert [x.url for x in bdb.get_rec_all()] == expected
 
+
+def test_reorder_indices(bukuDb):
+    bdb = bukuDb()
+    bdb.enable_fts()
+    bdb.enable_fts(trigram=True)
+    for url, title, tags, desc in TEST_BOOKMARKS:
+        _add_rec(bdb, url, title, tags, desc)
+    _triggers = lambda: bdb.cur.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' ORDER BY name").fetchall()
+    triggers, before = _triggers(), {x.url: x[1:] for x in bdb.get_rec_all()}
+    tags = {x.url: _tag_index(bdb).get(x.id) for x in bdb.get_rec_all()}
+    with mock.patch.object(bdb, 'cur', mock.Mock(wraps=bdb.cur)) as cur:
+        assert bdb.reorder(['-id'])
+    assert mock.call('VACUUM') not in cur.execute.call_args_list
+    records = bdb.get_rec_all()
+    assert [x.url for x in records] == list(reversed(before))
+    assert {x.url: x[1:] for x in records} == before
+    assert {x.url: _tag_index(bdb).get(x.id) for x in records} == tags
+    assert [x.url for x in bdb.searchdb(['slashdot'])] == ['http://slashdot.org']
+    assert [x.url for x in bdb.searchdb(['lashdo'], deep=True)] == ['http://slashdot.org']
+    assert _triggers() == triggers
+    assert not bdb.cur.execute('SELECT name FROM sqlite_temp_master').fetchall()
+    assert bdb.reorder(['-id'], vacuum=True)
+    assert [x.url for x in bdb.get_rec_all()] == list(before)
+
+
 @pytest.mark.parametrize('ignore_case, fields, expected', [
     (True, ['+id'], 'id ASC'),
     (True, [], 'id ASC'),
-    (False, ['-metadata', '+netloc', 'url', 'id'], 'metadata DESC, LOWER(NETLOC(url)) ASC, url ASC, id ASC'),
-    (True, ['-metadata', '+netloc', '-url', 'id'], 'LOWER(metadata) DESC, LOWER(NETLOC(url)) ASC, LOWER(url) DESC, id ASC'),
+    (False, ['-metadata', '+netloc', 'url', 'id'], 'metadata DESC, netloc ASC, url ASC, id ASC'),
+    (True, ['-metadata', '+netloc', '-url', 'id'], 'LOWER(metadata) DESC, netloc ASC, LOWER(url) DESC, id ASC'),
     (False, ['+title', '-tags', 'description', 'index', 'uri'], 'metadata ASC, tags DESC, desc ASC, id ASC, url ASC'),
     (True, ['+title', '-tags', 'description', 'index', 'uri'],
      'LOWER(metadata) ASC, LOWER(tags) DESC, LOWER(desc) ASC, id ASC, LOWER(url) ASC'),
     (True, ['#foo', '# BaR ', "-# b'A'z ", '# invalid, tag '],
-     "tags LIKE '%,foo,%' ASC, tags LIKE '%,bar,%' ASC, tags LIKE '%,b''a''z,%' DESC")
+     "tags LIKE '%,foo,%' ASC, tags LIKE '%,bar,%' ASC, tags LIKE '%,b''a''z,%' DESC, id ASC")
 ])
 def test_order(bukuDb, fields, ignore_case, expected):
     assert bukuDb()._order(fields, ignore_case=ignore_case) == expected
@@ -1734,6 +2163,35 @@ def test_order_by_netloc(bukuDb, order, expected):
         _add_rec(bdb, *bookmark)
     assert [x.url for x in bdb.get_rec_all(order=order)] == expected
 
+
+@pytest.mark.parametrize('order', [['+id'], ['-id'], ['netloc'], ['-netloc', 'title'], ['-title', '#es'], ['#test', '-desc', 'url']])
+@pytest.mark.parametrize('batch_size', [1, 2, 1000])
+def test_iter_rec(bukuDb, order, batch_size):
+    bdb = bukuDb()
+    _EXTRA = ['https://example.com', '//example.com#', 'example.com?', 'file:///etc/hosts']
+    for bookmark in (TEST_BOOKMARKS + [(url, 'test', parse_tags(['test,tes,est,es']), 'a case for replace_tag test') for url in _EXTRA]):
+        _add_rec(bdb, *bookmark)
+    bdb.conn.execute('UPDATE bookmarks SET metadata = NULL, desc = NULL WHERE id = 5')  # NULLs come first
+    expected = bdb.get_rec_all(order=order)
+    assert list(bdb.iter_rec(order, batch_size=batch_size)) == expected
+    assert list(bdb.iter_rec(order, limit=3, batch_size=batch_size)) == expected[:3]
+    for i, rec in enumerate(expected):
+        assert list(bdb.iter_rec(order, after=rec.id, batch_size=batch_size)) == expected[i+1:]
+    assert list(bdb.iter_rec(order, indices=range(2, 5), batch_size=batch_size)) == [x for x in expected if 2 <= x.id < 5]
+    assert not list(bdb.iter_rec(order, after=100))
+
+
+@pytest.mark.parametrize('order, queries', [(['+id'], 2), (['-id'], 2), (['netloc'], 1), (['-title', '#es'], 1)])
+def test_iter_rec_queries(bukuDb, order, queries):
+    profiler = SqlProfiler(explain=False)
+    bdb = bukuDb(profiler=profiler)
+    for bookmark in TEST_BOOKMARKS:
+        _add_rec(bdb, *bookmark)
+    expected = bdb.get_rec_all(order=order)
+    profiler.stats.clear()
+    assert list(bdb.iter_rec(order, batch_size=2)) == expected
+    assert sum(x['calls'] for x in profiler.stats.values()) == queries  # keyset pagination is only used for id
+
 @pytest.mark.parametrize('keyword, params, expected', [
     ('', {}, []),
     ('', {'markers': True}, []),
@@ -1839,15 +2297,410 @@ def test_searchdb(bukuDb, keywords, params, expected):
     assert [x.url for x in bdb.searchdb(keywords, **params)] == expected
 
 
-@pytest.mark.parametrize('keyword_results, stag_results, exp_res', [
-    ([], [], []),
-    (["item1"], ["item1", "item2"], ["item1"]),
-    (["item2"], ["item1"], []),
+@pytest.mark.parametrize('tokens, expected', [
+    ([], None),
+    ([('metadata', False, 'foo "bar"')], 'metadata : ("foo ""bar""")'),
+    ([('url', False, 'foo'), ('tags', False, 'bar', 'baz')], 'url : ("foo") OR tags : ("bar" AND "baz")'),
+    ([('url', False, 'foo'), ('tags', True, 'bar', 'baz')], None),
+    ([('desc', False, 'c++'), ('desc', False, '++')], None),
 ])
-def test_search_keywords_and_filter_by_tags(bukuDb, keyword_results, stag_results, exp_res):
-    with mock.patch('buku.BukuDb.searchdb', return_value=keyword_results):
-        with mock.patch('buku.BukuDb.search_by_tag', return_value=stag_results):
-            assert exp_res == bukuDb().search_keywords_and_filter_by_tags(['keywords'], stag=['stag'])
+def test_search_fts_expr(bukuDb, tokens, expected):
+    assert bukuDb()._search_fts_expr(tokens) == expected
+
+
+@pytest.mark.parametrize('keywords, params', [
+    (['slashdot'], {}),
+    (['news', 'test'], {}),
+    (['news', 'nerds'], {'all_keywords': True}),
+    (['zażółć'], {}),
+    (['ZAZOLC'], {}),
+    (['old,news'], {}),
+    (['#es,test', '.slashdot'], {'markers': True}),
+    (['>for', ':com'], {'markers': True, 'all_keywords': True}),
+    (['stuff that'], {}),
+    (["doesn't"], {}),
+    (['c++', 'matter'], {}),
+])
+def test_searchdb_fts(bukuDb, keywords, params):
+    bdb = bukuDb()
+    for bookmark in TEST_BOOKMARKS:
+        _add_rec(bdb, *bookmark)
+    _add_rec(bdb, 'http://news.com', 'Old news', ',news,', 'Test for nerds')
+    expected = bdb.searchdb(keywords, **params)
+    assert bdb.enable_fts()
+    assert sorted(bdb.searchdb(keywords, **params)) == sorted(expected)
+    bdb.delete_rec(1)
+    bdb.update_rec(2, title_in='SLASHDOT zażółć', tags_in=',old,news,')
+    expected = bdb.searchdb(keywords, **params)
+    assert bdb.enable_fts(False)
+    assert sorted(bdb.searchdb(keywords, **params)) == sorted(expected)
+
+
+@pytest.mark.parametrize('keywords, params', [
+    (['ews'], {}),
+    (['zażółć', 'test'], {}),
+    (['ZAŻ'], {}),
+    (['ż'], {}),
+    (['ol_'], {}),
+    (['%la'], {}),
+    (['ews', 'ner'], {'all_keywords': True}),
+    (['ews', 'ner'], {'all_keywords': True, 'deep': False}),
+    (['#,es', '.shd'], {'markers': True}),
+    (['#,tes', '>car'], {'markers': True, 'all_keywords': True}),
+])
+def test_searchdb_trigram(bukuDb, keywords, params):
+    bdb = bukuDb()
+    for bookmark in TEST_BOOKMARKS:
+        _add_rec(bdb, *bookmark)
+    _add_rec(bdb, 'http://news.com', 'Old news', ',news,', 'Test for nerds, 100% care')
+    params = {'deep': True, **params}
+    expected = bdb.searchdb(keywords, **params)
+    assert bdb.enable_fts(trigram=True)
+    assert bdb.searchdb(keywords, **params) == expected
+    bdb.delete_rec(1)
+    bdb.update_rec(2, title_in='SLASHDOT zażółć', tags_in=',old,news,')
+    expected = bdb.searchdb(keywords, **params)
+    assert bdb.enable_fts(False, trigram=True)
+    assert bdb.searchdb(keywords, **params) == expected
+
+
+def test_searchdb_fts_ranking(bukuDb):
+    bdb = bukuDb()
+    _add_rec(bdb, 'http://one.com', 'One nerd', ',nerds,', 'Stuff for nerds and nerds only')
+    _add_rec(bdb, 'http://two.com', 'Two', ',misc,', 'Some long text about various things, with nerds mentioned once')
+    _add_rec(bdb, 'http://three.com', 'Three', ',misc,', 'Nothing to see here')
+    assert bdb.enable_fts()
+    assert [x.id for x in bdb.searchdb(['nerds'])] == [1, 2]
+
+
+def _legacy_search(bdb, keywords, *, stag=None, without=None, order=['+id'], deep=False, markers=False, **params):
+    """Search via separate queries, narrowed down in Python (as done prior to the query compiler)."""
+    if keywords is None:
+        results = bdb.search_by_tag(stag, order=order)
+    else:
+        results = bdb.searchdb(keywords, deep=deep, markers=markers, order=order, **params)
+        results = (results if not stag else filter_from(results, bdb.search_by_tag(''.join(stag))))
+    return bdb.exclude_results_from_search(results, without, deep=deep, markers=markers)
+
+
+@pytest.mark.parametrize('index', [None, 'fts', 'trigram'])
+@pytest.mark.parametrize('keywords, params', [
+    (['news', 'test'], {}),
+    (['news', 'nerds'], {'all_keywords': True}),
+    (['ews', 'zaż'], {'deep': True}),
+    (['ews', 'ner'], {'deep': True, 'all_keywords': True}),
+    (['n.*s', 'ZA'], {'regex': True}),
+    (['#,es', '.slashdot', ':com'], {'markers': True}),
+    (['>for', '#news'], {'markers': True, 'all_keywords': True}),
+    (['blank'], {'all_keywords': True}),
+    (['immutable'], {'all_keywords': True}),
+    ([], {}),
+    (None, {}),
+])
+def test_search_compiled(bukuDb, index, keywords, params):
+    bdb = bukuDb()
+    for bookmark in TEST_BOOKMARKS:
+        _add_rec(bdb, *bookmark)
+    _add_rec(bdb, 'http://news.com', 'Old news', ',news,test,', 'Test for nerds, 100% care')
+    _add_rec(bdb, 'http://blank.com', '', ',', 'Immutable, untagged', immutable=True)
+    _add_rec(bdb, 'http://nerds.org', 'Nerds', ',nerds,old,', '')
+    if index:
+        assert bdb.enable_fts(trigram=index == 'trigram')
+    stags = ['', ',', 'news', 'news, test', 'old + nerds', 'news + ', 'news - test', '- old', 'test + es - zażółć', 'news + old, test']
+    withouts = [None, [], ['slashdot'], ['old', 'care'], ['#test', ':.org', '>'], ['ner']]
+    for stag, without, order in product(stags, withouts, [['+id'], ['-title', 'url']]):
+        _params = {'deep': 'ner' in (without or []), 'markers': '>' in (without or []), **params}
+        if keywords is None:
+            expected = _legacy_search(bdb, None, stag=stag, without=without, order=order, **_params)
+            assert bdb.search_by_tag(stag, order, without=without, **_params) == expected, (stag, without, order)
+            assert bdb.search_by_tag(stag, order, without=without, limit=2, **_params) == expected[:2]
+        else:
+            expected = _legacy_search(bdb, keywords, stag=[stag], without=without, order=order, **_params)
+            results = bdb.search_keywords_and_filter_by_tags(keywords, stag=[stag], without=without, order=order, **_params)
+            assert results == expected, (stag, without, order)
+            results = bdb.search_keywords_and_filter_by_tags(keywords, stag=[stag], without=without, order=order, limit=2, **_params)
+            assert results == expected[:2]
+
+
+@pytest.mark.parametrize('keywords, params', [
+    (['n.*s', 'ZA'], {}),
+    (['n.*s', 'ZA'], {'stag': ['news'], 'without': ['slashdot']}),
+    (['test'], {'order': ['-title', 'netloc'], 'limit': 2, 'offset': 1}),
+    (['nothing'], {}),
+    (['bad(regex'], {}),
+])
+def test_search_sharded(bukuDb, keywords, params):
+    bdb = bukuDb()
+    for bookmark in TEST_BOOKMARKS:
+        _add_rec(bdb, *bookmark)
+    _add_rec(bdb, 'http://news.com', 'Old news', ',news,test,', 'Test for nerds, 100% care')
+    _add_rec(bdb, 'http://nerds.org', 'Nerds', ',nerds,old,', '')
+    expected = bdb.search_keywords_and_filter_by_tags(keywords, regex=True, **params)
+    with mock.patch('buku.ProcessPoolExecutor', wraps=ProcessPoolExecutor) as pool:
+        assert bdb.search_keywords_and_filter_by_tags(keywords, regex=True, **params, processes=1) == expected
+        pool.assert_not_called()
+        assert bdb.search_keywords_and_filter_by_tags(keywords, regex=True, **params, processes=2) == expected
+        assert bdb.search_keywords_and_filter_by_tags(keywords, regex=True, **params, processes=2, count_only=True) == \
+            bdb.search_keywords_and_filter_by_tags(keywords, regex=True, **params, count_only=True)
+        calls = (2 if keywords == ['bad(regex'] else 1)  # matches are reused for counting (unless the search failed)
+        assert pool.call_count == calls
+        assert bdb.searchdb(keywords, regex=True, processes=3) == bdb.searchdb(keywords, regex=True)
+        assert pool.call_count == calls + 1
+        assert bdb.searchdb(keywords, processes=2) == bdb.searchdb(keywords)  # not a regex search
+        bdb.conn.execute("UPDATE bookmarks SET metadata = 'news' WHERE id = 1")  # uncommitted changes
+        assert bdb.searchdb(keywords, regex=True, processes=2) == bdb.searchdb(keywords, regex=True)
+        assert pool.call_count == calls + 1
+        assert all(x.kwargs['mp_context'].get_start_method() != 'fork' for x in pool.call_args_list)
+
+
+@pytest.mark.parametrize('parallel, sharded', [(1, True), (5, True), (6, False)])
+def test_search_sharded_auto(bukuDb, monkeypatch, parallel, sharded):
+    bdb = bukuDb()
+    for bookmark in TEST_BOOKMARKS:
+        _add_rec(bdb, *bookmark)
+    _add_rec(bdb, 'http://news.com', 'Old news', ',news,test,', 'Test for nerds, 100% care')
+    _add_rec(bdb, 'http://nerds.org', 'Nerds', ',nerds,old,', '')
+    bdb.conn.execute('UPDATE bookmarks SET id = 100 WHERE id = 5')  # max id is not the number of records
+    bdb.conn.commit()
+    expected = bdb.searchdb(['n.*s'], regex=True)
+    monkeypatch.setattr('buku.REGEX_PARALLEL', parallel)
+    monkeypatch.setattr(os, 'cpu_count', lambda: 2)
+    with mock.patch('buku.ProcessPoolExecutor', wraps=ProcessPoolExecutor) as pool:
+        assert bdb.searchdb(['n.*s'], regex=True) == expected
+        pool.assert_not_called()  # only sharded on request
+        assert bdb.searchdb(['n.*s'], regex=True, processes=0) == expected
+        assert pool.called == sharded
+
+
+def test_search_sharded_paging(bukuDb):
+    bdb = bukuDb()
+    for bookmark in TEST_BOOKMARKS:
+        _add_rec(bdb, *bookmark)
+    _add_rec(bdb, 'http://news.com', 'Old news', ',news,test,', 'Test for nerds, 100% care')
+    _add_rec(bdb, 'http://nerds.org', 'Nerds', ',nerds,old,', '')
+    expected = bdb.searchdb(['n.*s'], regex=True)
+    with mock.patch('buku.ProcessPoolExecutor', wraps=ProcessPoolExecutor) as pool:
+        results = SearchResults(bdb.searchdb, ['n.*s'], regex=True, processes=2, page_size=2)
+        assert (results[0], results[2:4], len(results)) == (expected[0], expected[2:4], len(expected))
+        assert pool.call_count == 1  # a single sharded scan for all pages & the count
+        assert bdb.searchdb(['n.*s'], regex=True, processes=2, order=['-id'], limit=1) == expected[-1:]
+        assert pool.call_count == 1
+        _add_rec(bdb, 'http://nerds.com', 'More nerds')
+        assert bdb.searchdb(['n.*s'], regex=True, processes=2, count_only=True) == len(expected) + 1
+        assert pool.call_count == 2  # rerun after the DB has changed
+
+
+def test_search_compiled_single_scan(bukuDb):
+    bdb = bukuDb()
+    for bookmark in TEST_BOOKMARKS:
+        _add_rec(bdb, *bookmark)
+    query, args = bdb._compile_search(['news'], stag='old', without=['matter'], deep=True)
+    plan = [row[-1] for row in bdb.conn.execute('EXPLAIN QUERY PLAN ' + query, args)]
+    assert len([s for s in plan if s.startswith('SCAN') and 'bookmarks' in s.split()]) <= 1, plan
+    statements = set()
+    bdb.conn.set_trace_callback(statements.add)
+    try:
+        results = bdb.search_keywords_and_filter_by_tags(['news'], deep=True, stag=['old'], without=['baz'])
+    finally:
+        bdb.conn.set_trace_callback(None)
+    assert [x.id for x in results] == [1]
+    assert len([s for s in statements if 'sqlite_master' not in s]) == 1
+    assert [x.id for x in bdb.search_keywords_and_filter_by_tags(['news'], deep=True, stag=['old'], without=['stuff'])] == []
+    assert [x.id for x in bdb.search_keywords_and_filter_by_tags(['news'], deep=True, stag=['old'], without=['test'])] == [1]
+
+
+@pytest.mark.parametrize('method, args, kwargs', [
+    ('searchdb', [['news', 'test', 'nerds']], {}),
+    ('searchdb', [['es', 'o']], {'deep': True, 'order': ['-url']}),
+    ('search_by_tag', ['news, test, old'], {}),
+    ('search_keywords_and_filter_by_tags', [['news', 'test']], {'stag': ['news, old, test'], 'without': ['zażółć']}),
+    ('get_rec_all', [], {'order': ['title']}),
+])
+def test_search_paging(bukuDb, method, args, kwargs):
+    bdb = bukuDb()
+    for bookmark in TEST_BOOKMARKS:
+        _add_rec(bdb, *bookmark)
+    _add_rec(bdb, 'http://news.com', 'Old news', ',news,test,', 'Test for nerds')
+    _add_rec(bdb, 'http://nerds.org', 'Nerds', ',nerds,old,', '')
+    search = getattr(bdb, method)
+    expected = search(*args, **kwargs)
+    assert len(expected) > 2
+    assert search(*args, **kwargs, count_only=True) == len(expected)
+    for limit, offset in [(None, 1), (2, 0), (2, 1), (1, len(expected) - 1), (3, len(expected))]:
+        assert search(*args, **kwargs, limit=limit, offset=offset) == expected[offset:][:limit]
+    if method != 'get_rec_all':
+        sample = search(*args, **kwargs, limit=2, randomize=True)
+        assert len(sample) == 2 and set(sample) <= set(expected)
+        assert sorted(search(*args, **kwargs, randomize=True)) == sorted(expected)
+
+
+def test_search_results(bukuDb):
+    bdb = bukuDb()
+    for i in range(25):
+        _add_rec(bdb, f'http://example.com/{i}', f'Title {i}', ',test,')
+    expected = bdb.searchdb(['test'])
+    with mock.patch.object(bdb, 'searchdb', wraps=bdb.searchdb) as searchdb:
+        results = SearchResults(bdb.searchdb, ['test'], page_size=10)
+        assert results and results[:10] == expected[:10]
+        assert searchdb.call_args_list == [mock.call(['test'], limit=10, offset=0)]
+        assert len(results) == 25 and searchdb.call_args.kwargs == {'count_only': True}
+        assert results[-1] == expected[-1] and results[12:22:3] == expected[12:22:3] and results[20:] == expected[20:]
+        assert list(results) == expected and list(reversed(results)) == expected[::-1]
+        assert len(searchdb.call_args_list) == 4  # each page is fetched once
+        with pytest.raises(IndexError):
+            results[25]
+        sample = results.sample(3)
+        assert len(sample) == 3 and set(sample) <= set(expected)
+        searchdb.reset_mock()
+        assert results.tolist() == expected and len(searchdb.call_args_list) == 0  # all pages are cached
+        results = SearchResults(bdb.searchdb, ['test'], page_size=10)
+        assert results.tolist() == expected and list(results) == expected and len(results) == 25
+        assert searchdb.call_args_list == [mock.call(['test'])]
+    empty = SearchResults(bdb.searchdb, ['nothing'])
+    assert not empty and len(empty) == 0 and list(empty) == [] and empty.tolist() == []
+
+
+def test_prompt_lazy_results(bukuDb, capsys):
+    bdb = bukuDb()
+    for i in range(25):
+        _add_rec(bdb, f'http://example.com/{i}', f'Title {i}', ',test,')
+    with mock.patch.object(bdb, 'searchdb', wraps=bdb.searchdb) as searchdb:
+        with mock.patch('buku.read_in', side_effect=['n', 'n', 'n', 'N', EOFError]):
+            prompt(bdb, SearchResults(bdb.searchdb, ['test'], page_size=10), num=10)
+    out = capsys.readouterr().out
+    assert [s for s in out.splitlines() if re.fullmatch(r'[0-9]+-[0-9]+/[0-9]+\+?|No more results', s)] == \
+        ['1-10/10+', '11-20/20+', '21-25/25', 'No more results', '11-20/25']  # not counted until the last page
+    assert [call.kwargs for call in searchdb.call_args_list] == [
+        {'limit': 10, 'offset': 0}, {'limit': 10, 'offset': 10}, {'limit': 10, 'offset': 20}]
+
+
+@pytest.mark.parametrize('mem_index', [False, True])
+def test_prompt_search_after_browse(bukuDb, capsys, mem_index):
+    bdb = bukuDb()
+    for i in range(5):
+        _add_rec(bdb, f'http://example.com/{i}', f'Title {i}', ',test,')
+    with mock.patch('buku.browse') as browse:
+        with mock.patch('buku.read_in', side_effect=['s title', '2', 'a', 's title', 't test', 't', EOFError]):
+            prompt(bdb, None, num=10, mem_index=mem_index)
+    assert [call.args[0] for call in browse.call_args_list] == [f'http://example.com/{i}' for i in [1, 0, 1, 2, 3, 4]]
+    out = capsys.readouterr().out
+    assert [s for s in out.splitlines() if re.fullmatch(r'[0-9]+-[0-9]+/[0-9]+', s)] == ['1-5/5'] * 3
+    assert '1. test (5)' in out
+
+
+@pytest.mark.parametrize('keywords, refine, params', [
+    (['news', 'test'], ['NEWS'], {}),
+    (['news', 'test', 'old'], ['news', 'nerds'], {}),
+    (['test'], ['ZAŻ', '100%', 'c_re'], {'deep': True}),
+    (['test', 'news'], ['n.*s', 'ZA'], {'regex': True}),
+    (['news'], ['#,es', ':com', '>for'], {'markers': True}),
+    (['news'], ['bad(regex'], {'regex': True}),
+    (['news'], [], {}),
+])
+def test_refine_results(bukuDb, keywords, refine, params):
+    bdb = bukuDb()
+    for bookmark in TEST_BOOKMARKS:
+        _add_rec(bdb, *bookmark)
+    _add_rec(bdb, 'http://News.com', 'Old NEWS', ',news,test,', 'Test for nerds, 100% care')
+    _add_rec(bdb, 'http://nerds.org', 'Nerds', ',nerds,old,test,', None)
+    results = bdb.searchdb(keywords, order=['-url'], **params)
+    expected = (results if not refine else
+                filter_from(results, bdb.searchdb(refine, all_keywords=True, **params)) if 'regex' not in params else
+                [x for x in results if all(bdb.searchdb([s], **params, count_only=True) and x in bdb.searchdb([s], **params)
+                                           for s in refine)])
+    assert bdb.refine_results(results, refine, **params) == expected
+
+
+def test_prompt_refine(bukuDb, capsys):
+    bdb = bukuDb()
+    for i in range(30):
+        _add_rec(bdb, f'http://example.com/{i}', f'Title {i} ' + ('even' if i % 2 == 0 else 'odd'), (',test,' if i % 3 == 0 else ','))
+    with mock.patch.object(bdb, 'searchdb', wraps=bdb.searchdb) as searchdb:
+        with mock.patch('buku.read_in', side_effect=['/ even', 's title', '/ even', 'n', '/ #test', '/ odd', '/', '/', '/', '/',
+                                                     'S title', '/', EOFError]):
+            prompt(bdb, None, num=10, markers=True)
+    out = capsys.readouterr().out
+    _status = r'[0-9]+-[0-9]+/[0-9]+\+?|[0-9]+ results|Nothing to undo|No results to refine'
+    assert [s for s in out.splitlines() if re.fullmatch(_status, s)] == [
+        'No results to refine', '1-10/10+', '1-10/15', '11-15/15', '1-5/5', '0 results', '1-5/5', '1-10/15', '1-10/30',
+        'Nothing to undo', '1-10/10+', 'Nothing to undo']
+    calls = [call for call in searchdb.call_args_list if not call.kwargs.get('count_only')]
+    assert [(call.args[0], call.kwargs.get('limit')) for call in calls] == [(['title'], 10), (['title'], None), (['title'], 10)]
+
+
+@pytest.mark.parametrize('keywords, params', [
+    (['news', 'TEST'], {}),
+    (['news', 'nerds'], {'all_keywords': True}),
+    (['ews', 'ZAŻ', '100%', 'c_re'], {'deep': True}),
+    (['ews', 'ner'], {'deep': True, 'all_keywords': True}),
+    (['n.*s', 'ZA', 'c++'], {'regex': True}),
+    (['#,es', '.slashdot', ':com', '>Nerds,'], {'markers': True}),
+    (['>for', '#news'], {'markers': True, 'all_keywords': True}),
+    (['blank'], {'all_keywords': True}),
+    (['immutable'], {'all_keywords': True}),
+    (['zażółć', 'Gęślą'], {}),
+])
+def test_memory_index(bukuDb, keywords, params):
+    bdb = bukuDb()
+    for bookmark in TEST_BOOKMARKS:
+        _add_rec(bdb, *bookmark)
+    _add_rec(bdb, 'http://News.com', 'Old NEWS', ',news,test,', 'Test for nerds, 100% care')
+    _add_rec(bdb, 'http://blank.com', '', ',', 'Immutable, untagged', immutable=True)
+    _add_rec(bdb, 'http://nerds.org', 'Nerds', ',nerds,old,', None)
+    index = MemoryIndex(bdb)
+    for order in [['+id'], ['-title', 'url'], ['netloc', '-#news'], ['-desc']]:
+        expected = bdb.searchdb(keywords, order=order, **params)
+        assert index.searchdb(keywords, order=order, **params) == expected, order
+        assert index.searchdb(keywords, order=order, limit=2, offset=1, **params) == expected[1:3]
+        assert index.searchdb(keywords, order=order, count_only=True, **params) == len(expected)
+    for stag in ['news', 'News, test', 'old + nerds', 'news + ', 'news - test', '- old', 'test + es - zażółć', 'ws,ne']:
+        assert index.search_by_tag(stag, ['-url']) == bdb.search_by_tag(stag, ['-url']), stag
+    assert index.get_tag_all() == bdb.get_tag_all()
+
+
+def test_memory_index_reload(bukuDb):
+    bdb = bukuDb()
+    for bookmark in TEST_BOOKMARKS:
+        _add_rec(bdb, *bookmark)
+    index = MemoryIndex(bdb)
+    assert index.load()
+    assert not index.load()
+    assert not index.searchdb(['renamed'])
+    bdb.update_rec(1, title_in='Renamed')  # same connection
+    assert index.searchdb(['renamed']) == bdb.searchdb(['renamed']) != []
+    other = bukuDb()
+    _add_rec(other, 'http://example.org', 'Renamed too')
+    assert [x.id for x in index.searchdb(['renamed'])] == [1, len(TEST_BOOKMARKS) + 1]
+    assert not index.load()
+    assert index.load(force=True)
+
+
+def test_memory_index_fallback(bukuDb):
+    bdb = bukuDb()
+    for bookmark in TEST_BOOKMARKS:
+        _add_rec(bdb, *bookmark)
+    index = MemoryIndex(bdb)
+    assert bdb.enable_fts()
+    with mock.patch.object(bdb, 'searchdb', wraps=bdb.searchdb) as searchdb:
+        assert index.searchdb(['news'], limit=1) == bdb.searchdb(['news'], limit=1) != []
+    searchdb.assert_any_call(['news'], False, False, False, False, ['+id'], limit=1, offset=0, count_only=False, randomize=False)
+    with mock.patch.object(bdb, 'search_by_tag', wraps=bdb.search_by_tag) as search_by_tag:
+        assert index.search_by_tag('news', without=['old']) == bdb.search_by_tag('news', without=['old'])
+    assert search_by_tag.call_count == 2
+
+
+def test_prompt_mem_index(bukuDb, capsys):
+    bdb = bukuDb()
+    for i in range(25):
+        _add_rec(bdb, f'http://example.com/{i}', f'Title {i}', ',test,')
+    with mock.patch.object(bdb, 'searchdb') as searchdb, mock.patch.object(bdb, 'search_by_tag') as search_by_tag:
+        with mock.patch('buku.read_in', side_effect=['s title', 'n', 't test', 'R -3', EOFError]):
+            prompt(bdb, None, num=10, mem_index=True)
+    searchdb.assert_not_called()
+    search_by_tag.assert_not_called()
+    out = capsys.readouterr().out
+    assert [s for s in out.splitlines() if re.fullmatch(r'[0-9]+-[0-9]+/[0-9]+\+?', s)] == ['1-10/10+', '11-20/20+', '1-10/10+']
+    assert len(re.findall(r'^[0-9]+\. Title', out, re.MULTILINE)) == 33
 
 
 @pytest.mark.parametrize('search_results, exclude_results, exp_res', [
@@ -1880,7 +2733,7 @@ def test_exportdb_single_rec(bukuDb, tmpdir):
         assert f2.read()
 
 
-def test_exportdb_to_db(bukuDb):
+def test_exportdb_to_db(bukuDb, capsys):
     f1 = NamedTemporaryFile(delete=False)
     f1.close()
     f2 = NamedTemporaryFile(delete=False, suffix=".db")
@@ -1892,6 +2745,109 @@ def test_exportdb_to_db(bukuDb):
         db.exportdb(f2.name)
     db2 = bukuDb(dbfile=f2.name)
     assert db.get_rec_all() == db2.get_rec_all()
+    db2.close()
+    capsys.readouterr()
+    assert db.exportdb(f2.name, on_conflict='skip')  # merging into the existing file
+    assert capsys.readouterr().out == '2 exported\n'  # (all records of the result set)
+
+
+@pytest.mark.parametrize('on_conflict, counts, expected', [
+    ('skip', (1, 0, 3), [(1, 'http://one.com', 'One', ',a,', 'desc', 0), (2, 'http://two.com', 'Two', ',b,', '', 0)]),
+    ('merge_tags', (1, 1, 2), [(1, 'http://one.com', 'One', ',a,c,d,', 'desc', 0), (2, 'http://two.com', 'Two', ',b,', '', 0)]),
+    ('replace', (1, 1, 2), [(1, 'http://one.com', 'One!', ',c,d,', '', 1), (2, 'http://two.com', 'Two', ',b,', '', 0)]),
+])
+def test_add_recs(bukuDb, caplog, on_conflict, counts, expected):
+    bdb = bukuDb()
+    _add_rec(bdb, 'http://one.com', 'One', ',a,', 'desc')
+    records = [('http://two.com', 'Two', 'B', None, 0, True, False),
+               ('', 'Invalid'),
+               ('http://one.com', 'One!', ',D,c,', None, 1),
+               ('http://two.com', 'Two', ',b,', '')]
+    result = bdb.add_recs(iter(records), on_conflict=on_conflict, chunk_size=2)
+    assert result == (*counts, None)
+    assert bdb.get_rec_all() == [BookmarkVar(*x) for x in expected]
+    assert _tag_index(bdb) == {x[0]: _tagset(x[3]) for x in expected}
+    assert caplog.record_tuples == [('root', 40, 'Invalid URL')]
+
+
+def test_add_recs_counts(bukuDb):
+    bdb, queries = bukuDb(), []
+    _add_rec(bdb, 'http://one.com', 'One')
+    bdb.conn.set_trace_callback(queries.append)
+    records = [('http://two.com', 'Two'), ('http://one.com', 'One!'), ('http://two.com', 'Two!'), ('http://one.com', 'One!')]
+    assert bdb.add_recs(records, on_conflict='replace') == (1, 2, 1, None)
+    assert [x.title for x in bdb.get_rec_all()] == ['One!', 'Two!']
+    assert not [q for q in queries if 'COUNT(*)' in q]  # no table scans
+
+
+def test_add_recs_error(bukuDb, caplog):
+    bdb = bukuDb()
+    records = [('http://one.com',), ('',), ('http://two.com',), ('http://three.com', {'bad': 'title'}), ('http://four.com',)]
+    result = bdb.add_recs(records, chunk_size=2)
+    assert result[:3] == (2, 0, 1) and 'not supported' in result.error  # earlier chunks are counted & committed
+    assert [x.url for x in bdb.get_rec_all()] == ['http://one.com', 'http://two.com']
+    assert caplog.record_tuples[-1] == ('root', 40, f'add_recs(): {result.error}')
+
+
+def test_add_recs_invalid(bukuDb):
+    with pytest.raises(ValueError):
+        bukuDb().add_recs([], on_conflict='invalid')
+
+
+@pytest.mark.parametrize('append_tags', ['y', 'n'])
+def test_importdb(bukuDb, tmp_path, append_tags):
+    bdb = bukuDb()
+    _add_rec(bdb, 'http://one.com', 'One', ',a,', 'desc')
+    (tmp_path / 'bookmarks.md').write_text('- [One](http://one.com) <!-- TAGS: b -->\n'
+                                           '- [Two](http://two.com) <!-- TAGS: c,d -->\n'
+                                           '- <http://three.com>\n', encoding='utf-8')
+    with mock.patch('builtins.input', side_effect=['n', append_tags]):
+        assert bdb.importdb(str(tmp_path / 'bookmarks.md'))
+    assert [(x.url, x.title, x.tags_raw) for x in bdb.get_rec_all()] == [
+        ('http://one.com', 'One', (',a,b,' if append_tags == 'y' else ',a,')),
+        ('http://two.com', 'Two', ',c,d,'), ('http://three.com', '', ',')]
+
+
+@pytest.mark.parametrize('on_conflict, counts, expected', [
+    ('skip', (1, 0, 1), ('One', ',a,', 'desc', 0)),
+    ('merge_tags', (1, 1, 0), ('One', ',a,c,', 'desc', 0)),
+    ('replace', (1, 1, 0), ('One!', ',c,', '', 1)),
+])
+def test_mergedb(bukuDb, tmp_path, capsys, on_conflict, counts, expected):
+    bdb, other = bukuDb(), bukuDb(dbfile=tmp_path / 'other.db')
+    _add_rec(bdb, 'http://one.com', 'One', ',a,', 'desc')
+    _add_rec(other, 'http://two.com', 'Two', ',b,', 'desc 2', immutable=True)
+    _add_rec(other, 'http://one.com', 'One!', ',c,', '', immutable=True)
+    capsys.readouterr()
+    bdb.chatty = True
+    assert bdb.mergedb(str(tmp_path / 'other.db'), on_conflict=on_conflict)
+    assert capsys.readouterr().out == '%d added, %d updated, %d skipped\n' % counts
+    assert bdb.get_rec_all() == [BookmarkVar(1, 'http://one.com', *expected),
+                                 BookmarkVar(2, 'http://two.com', 'Two', ',b,', 'desc 2', 1)]
+    assert _tag_index(bdb) == {1: _tagset(expected[1]), 2: {'b'}}
+    assert not bdb.mergedb(str(tmp_path / 'missing.db'))
+    assert not os.path.exists(tmp_path / 'missing.db')
+    with mock.patch.object(bdb, '_upsert', side_effect=lambda *_, **__: bdb.cur.execute('DELETE FROM merged.bookmarks')):
+        assert not bdb.mergedb(str(tmp_path / 'other.db'))  # attached read-only
+    assert len(other.get_rec_all()) == 2
+
+
+@pytest.mark.parametrize('on_conflict, expected', [
+    (None, [(1, 'http://two.com', 'Two', ',b,', '', 0), (2, 'http://one.com', 'One', ',a,', '', 0)]),
+    ('skip', [(1, 'http://one.com', 'Old', ',c,', '', 0), (2, 'http://two.com', 'Two', ',b,', '', 0)]),
+    ('merge_tags', [(1, 'http://one.com', 'Old', ',a,c,', '', 0), (2, 'http://two.com', 'Two', ',b,', '', 0)]),
+    ('replace', [(1, 'http://one.com', 'One', ',a,', '', 0), (2, 'http://two.com', 'Two', ',b,', '', 0)]),
+])
+def test_exportdb_to_existing_db(bukuDb, tmp_path, on_conflict, expected):
+    outfile = str(tmp_path / 'export.db')
+    bdb, out = bukuDb(), bukuDb(dbfile=outfile)
+    _add_rec(out, 'http://one.com', 'Old', ',c,')
+    out.close()
+    _add_rec(bdb, 'http://one.com', 'One', ',a,')
+    _add_rec(bdb, 'http://two.com', 'Two', ',b,')
+    with mock.patch('builtins.input', return_value='y'):
+        assert bdb.exportdb(outfile, order=['-url'], on_conflict=on_conflict)
+    assert bukuDb(dbfile=outfile).get_rec_all() == [BookmarkVar(*x) for x in expected]
 
 
 @pytest.mark.parametrize('pick', [None, 0, 3, 7, 10])
@@ -1941,6 +2897,53 @@ def test_get_max_id(bukuDb, urls, exp_res):
         assert db.get_max_id() == exp_res
 
 
+def test_sql_profiler(bukuDb, tmp_path, capsys):
+    profiler = SqlProfiler()
+    bdb = bukuDb(profiler=profiler)
+    bdb.add_recs([(f'http://example.com/{i}', f'Title {i}', ',tag,', '', 0) for i in range(5)])
+    assert len(bdb.get_rec_all()) == 5
+    assert len(bdb.get_rec_all()) == 5
+    assert bdb.get_rec_ids(['http://example.com/1', 'http://example.com/2', 'http://example.com/3']) == [2, 3, 4]
+    assert bdb.get_rec_ids(['http://example.com/1', 'http://example.com/9']) == [2]
+    assert list(bdb.conn.execute('SELECT id FROM bookmarks WHERE id = ?', (3,))) == [(3,)]
+
+    stats = profiler.stats['SELECT id, url, metadata, tags, desc, flags FROM bookmarks ORDER BY id ASC']
+    assert (stats['calls'], stats['rows'], stats['args']) == (2, 10, {'()'})
+    assert stats['time'] >= stats['max_time'] > 0
+    assert stats['plan'] == ['SCAN bookmarks'] and stats['full_scans'] == ['bookmarks']
+    stats = profiler.stats['SELECT id FROM bookmarks WHERE url IN (?, ...)']
+    assert (stats['calls'], stats['rows'], stats['args']) == (2, 4, {'(str, str)', '(str, str, str)'})
+    assert stats['full_scans'] == []
+    assert profiler.stats['SELECT id FROM bookmarks WHERE id = ?']['rows'] == 1
+    assert profiler.stats['COMMIT']['calls'] >= 1
+    assert next(x for x in profiler.stats.values() if x['statement'].startswith('INSERT INTO bookmarks'))['args'] == \
+        {'5 × (str, str, str, str, int)'}
+
+    capsys.readouterr()
+    profiler.report(limit=3, file=sys.stdout)
+    out = capsys.readouterr().out.splitlines()
+    assert out[0].startswith(f'SQL profile: {sum(x["calls"] for x in profiler.stats.values())} calls of {len(profiler.stats)} statements')
+    assert len(out) == 5
+    profiler.dump(tmp_path / 'profile.json')
+    with open(tmp_path / 'profile.json', encoding='utf-8') as fp:
+        dump = json.load(fp)
+    assert len(dump['statements']) == len(profiler.stats)
+    assert [x['time'] for x in dump['statements']] == sorted([x['time'] for x in dump['statements']], reverse=True)
+
+
+@pytest.mark.parametrize('value, dump', [('0', None), ('1', None), ('profile.json', 'profile.json')])
+def test_sql_profiler_env(bukuDb, monkeypatch, value, dump):
+    monkeypatch.setenv('BUKU_PROFILE_SQL', value)
+    with mock.patch('buku.SQL_PROFILER', None), mock.patch('atexit.register') as register:
+        bdb = bukuDb()
+        assert bukuDb().profiler is bdb.profiler
+    if value == '0':
+        assert bdb.profiler is None and not register.called
+    else:
+        assert isinstance(bdb.profiler, SqlProfiler) and bdb.profiler.stats
+        assert register.call_args_list == [mock.call(bdb.profiler.report)] + ([mock.call(bdb.profiler.dump, dump)] if dump else [])
+
+
 # Helper functions for testcases
 
 
@@ -61,10 +61,13 @@ def test_help(BukuDb, exit, piped_input, argv):
     print_help.assert_called_with()
     exit.assert_called_with(0)
 
+
+@pytest.mark.parametrize('db_profile', [None, 'fast'])
 @pytest.mark.parametrize('nostdin', [True, False])
 @pytest.mark.parametrize('db', [None, './foo.db'])
-def test_prompt(BukuDb, bdb, piped_input, prompt, nostdin, db):
-    argv = (['--nostdin'] if nostdin else []) + (['--db', db] if db else [])
+def test_prompt(BukuDb, bdb, piped_input, prompt, monkeypatch, nostdin, db, db_profile):
+    monkeypatch.delenv('BUKU_DB_PROFILE', raising=False)
+    argv = (['--nostdin'] if nostdin else []) + (['--db', db] if db else []) + (['--db-profile', db_profile] if db_profile else [])
     BukuDb.get_default_dbdir.return_value = '/default/db/dir'
     with pytest.raises(SystemExit):
         buku.main(argv)
@@ -72,8 +75,10 @@ def test_prompt(BukuDb, bdb, piped_input, prompt, nostdin, db):
         piped_input.assert_called_with(argv, [])
     else:
         piped_input.assert_not_called()
-    BukuDb.assert_called_with(dbfile=db or os.path.join('/default/db/dir', 'bookmarks.db'), default_scheme=buku.SCHEME_HTTP)
-    prompt.assert_called_with(bdb, None)
+    BukuDb.assert_called_with(dbfile=db or os.path.join('/default/db/dir', 'bookmarks.db'), default_scheme=buku.SCHEME_HTTP,
+                              db_profile=db_profile)
+    assert 'BUKU_DB_PROFILE' not in os.environ  # not passed on to child processes
+    prompt.assert_called_with(bdb, None, mem_index=False)
     bdb.close_quit.assert_called_with(0)
 
 
@@ -172,7 +177,8 @@ def test_order_print(bdb, stdin, prompt, order, indices, command, count, np):
             bdb.list_using_id.assert_called_with(order=order)
         else:
             bdb.list_using_id.assert_called_with(command['print'], order=order)
-        prompt.assert_called_with(bdb, result, noninteractive=('np' in command), num=int(_count[0]), order=order)
+        prompt.assert_called_with(bdb, result, noninteractive=('np' in command), num=int(_count[0]), order=order,
+                                  mem_index=False)
 
 @pytest.mark.parametrize('search', ['', 'sany', 'sall', 'sreg', 'stag'])
 @pytest.mark.parametrize('exclude', [None, ['xyzzy', 'grue']])
@@ -193,22 +199,21 @@ def test_order_search(bdb, stdin, prompt, search, exclude, keywords, rest):
         buku.main(argv)
     if search == 'stag':
         if not keywords:
-            prompt.assert_called_with(bdb, None, noninteractive=False, listtags=True, suggest=False, order=order)
+            prompt.assert_called_with(bdb, None, noninteractive=False, listtags=True, suggest=False, order=order, mem_index=False)
         else:
-            bdb.search_by_tag.assert_called_with(' '.join(keywords), order=order)
-            bdb.exclude_results_from_search.assert_called_with(
-                bdb.search_by_tag.return_value, exclude, deep=deep, markers=markers)
+            bdb.search_by_tag.assert_called_with(' '.join(keywords), order=order, without=exclude, deep=deep, markers=markers,
+                                                 limit=10, offset=0)  # first page of lazy results
     if search == 'stag' or not keywords:
         bdb.search_keywords_and_filter_by_tags.assert_not_called()
     elif search in ('', 'sany'):
         bdb.search_keywords_and_filter_by_tags.assert_called_with(
-            keywords, deep=deep, stag=stag, markers=markers, without=exclude, order=order)
+            keywords, deep=deep, stag=stag, markers=markers, without=exclude, order=order, limit=10, offset=0)
     elif search == 'sall':
         bdb.search_keywords_and_filter_by_tags.assert_called_with(
-            keywords, all_keywords=True, deep=deep, stag=stag, markers=markers, without=exclude, order=order)
+            keywords, all_keywords=True, deep=deep, stag=stag, markers=markers, without=exclude, order=order, limit=10, offset=0)
     elif search == 'sreg':
         bdb.search_keywords_and_filter_by_tags.assert_called_with(
-            keywords, regex=True, stag=stag, markers=markers, without=exclude, order=order)
+            keywords, regex=True, stag=stag, markers=markers, without=exclude, order=order, processes=0, limit=10, offset=0)
 
 @pytest.mark.parametrize('json', [None, '', 'output.json'])
 @pytest.mark.parametrize('indices', [None, '', '1-10', '-10'])  # None = search
@@ -247,11 +252,12 @@ def test_random(_print_json_safe, _format_json, _write_string_to_file, _print_re
                   [mock.call.random_sample(range(1, 43), random),
                    mock.call.bdb.print_rec('sampled', order=[])])
     else:                      # --sall foo
+        lazy = not random and json is None  # only the first page is fetched before prompt
+        paging = ({'limit': random, 'randomize': True} if random else {'limit': 10, 'offset': 0} if lazy else {})
         calls += [mock.call.bdb.search_keywords_and_filter_by_tags(
-                      ['foo'], all_keywords=True, deep=False, stag=None, markers=False, without=None, order=[])]
+                      ['foo'], all_keywords=True, deep=False, stag=None, markers=False, without=None, order=[], **paging)]
         if random:
-            calls += [mock.call.random_sample('found', random),
-                      mock.call.bdb._sort('sampled', [])]
+            calls += [mock.call.bdb._sort('found', [])]
         res = ('sorted' if random else 'found')
         if json:
             calls += [mock.call.format_json(res, (random == 1), field_filter=0),
@@ -261,7 +267,9 @@ def test_random(_print_json_safe, _format_json, _write_string_to_file, _print_re
         elif random:
             calls += [mock.call.print_rec_with_filter(res, field_filter=0)]
         else:
-            calls += [mock.call.prompt(bdb, res, noninteractive=False, deep=False, markers=False, order=[], num=10)]
+            calls += [mock.call.prompt(bdb, mock.ANY, noninteractive=False, deep=False, markers=False, order=[], num=10,
+                                       mem_index=False)]
+            assert isinstance(prompt.call_args.args[1], buku.SearchResults)
     calls += [mock.call.bdb.close_quit(0)]
     assert wrap.mock_calls == calls
 
@@ -286,16 +294,16 @@ def test_random_export(_print_rec_with_filter, _sample, bdb, stdin, prompt, rand
     if not search:
         calls += [mock.call.bdb.exportdb('export.md', order=[], pick=random)]
     else:
+        paging = ({} if not random else {'limit': random, 'randomize': True})
         calls += [mock.call.bdb.search_keywords_and_filter_by_tags(
-                      ['foo'], all_keywords=True, deep=False, stag=None, markers=False, without=None, order=[])]
+                      ['foo'], all_keywords=True, deep=False, stag=None, markers=False, without=None, order=[], **paging)]
         if random:
-            calls += [mock.call.random_sample('found', random),
-                      mock.call.bdb._sort('sampled', [])]
+            calls += [mock.call.bdb._sort('found', [])]
         res = ('sorted' if random else 'found')
         if random:
             calls += [mock.call.print_rec_with_filter(res, field_filter=0)]
         else:
-            calls += [mock.call.prompt(bdb, res, noninteractive=True, deep=False, markers=False, order=[], num=10)]
+            calls += [mock.call.prompt(bdb, res, noninteractive=True, deep=False, markers=False, order=[], num=10, mem_index=False)]
         calls += [mock.call.bdb.exportdb('export.md', res)]
     calls += [mock.call.bdb.close_quit(0)]
     assert wrap.mock_calls == calls
@@ -323,9 +331,19 @@ def test_custom_db(_BukuCrypt, BukuDb, stdin, db, action):
     else:
         if action == 'unlock':
             calls += [mock.call.BukuCrypt.decrypt_file(8, dbfile=_db)]
-        calls += [mock.call.BukuDb(None, 0, True, dbfile=_db, colorize=True, default_scheme=buku.SCHEME_HTTP)]
+        calls += [mock.call.BukuDb(None, 0, True, dbfile=_db, colorize=True, default_scheme=buku.SCHEME_HTTP, db_profile=None)]
         if action == 'print':
             calls += [mock.call.bdb.get_max_id(),
                       mock.call.bdb.print_rec(None, order=[])]
         calls += [mock.call.bdb.close_quit(0)]
     assert wrap.mock_calls == calls
+
+
+@pytest.mark.parametrize('dry_run, fixed, output', [(False, 3, '3 record(s) fixed\n'), (True, 5, '5 record(s) to fix\n'),
+                                                    (False, None, '')])
+def test_fixtags(bdb, stdin, capsys, dry_run, fixed, output):
+    bdb.fixtags.return_value = fixed
+    with pytest.raises(SystemExit):
+        buku.main(['--nostdin', '--fixtags'] + (['--dry-run'] if dry_run else []))
+    bdb.fixtags.assert_called_once_with(dry_run=dry_run, progress=False)
+    assert capsys.readouterr().out == output
@@ -1,6 +1,8 @@
 import os
+import sqlite3
 from typing import Any, Dict
 from http import HTTPStatus
+from unittest import mock
 import pytest
 import flask
 from click.testing import CliRunner
@@ -8,6 +10,7 @@ from buku import FetchResult
 from bukuserver import server
 from bukuserver.response import Response
 from bukuserver.server import get_bool_from_env_var
+from bukuserver.util import BukuDbPool
 from tests.util import mock_fetch
 
 
@@ -71,6 +74,7 @@ def test_api_empty_db(client, method, url, exp_res, data):
 @pytest.mark.parametrize('url, methods', [
     ('api/tags', ['post', 'put', 'delete']),
     ('/api/tags/tag1', ['post']),
+    ('/api/tags/tag1/related', ['post', 'put', 'delete']),
     ('api/bookmarks', ['put']),
     ('/api/bookmarks/1', ['post']),
     ('/api/bookmarks/refresh', ['get', 'put', 'delete']),
@@ -90,6 +94,8 @@ def test_api_not_allowed(client, url, methods):
     ('get', '/api/tags/tag1,tag2', None, Response.TAG_NOT_VALID),
     ('put', '/api/tags/tag1,tag2', {'tags': ['tag2']}, Response.TAG_NOT_VALID),
     ('delete', '/api/tags/tag1,tag2', None, Response.TAG_NOT_VALID),
+    ('get', '/api/tags/tag1/related', None, Response.TAG_NOT_FOUND),
+    ('get', '/api/tags/tag1,tag2/related', None, Response.TAG_NOT_VALID),
     ('get', '/api/bookmarks/1', None, Response.BOOKMARK_NOT_FOUND),
     ('put', '/api/bookmarks/1', {'title': 'none'}, Response.BOOKMARK_NOT_FOUND),
     ('delete', '/api/bookmarks/1', None, Response.BOOKMARK_NOT_FOUND),
@@ -141,6 +147,17 @@ def test_api_tag(client):
     assert_response(rd, Response.SUCCESS, {'description': '', 'tags': ['tag2', 'tag5'], 'title': 'Google', 'url': url})
 
 
+def test_api_related_tags(client):
+    for url, tags in [('http://one.com', ['foo', 'bar']), ('http://two.com', ['foo', 'baz', 'bar']), ('http://three.com', ['baz'])]:
+        rd = client.post('/api/bookmarks', json={'url': url, 'tags': tags})
+    rd = client.get('/api/tags/FOO/related')
+    assert_response(rd, Response.SUCCESS, {'tags': [{'name': 'bar', 'count': 2}, {'name': 'baz', 'count': 1}]})
+    rd = client.get('/api/tags/baz/related', query_string={'limit': 1})
+    assert_response(rd, Response.SUCCESS, {'tags': [{'name': 'bar', 'count': 1}]})
+    rd = client.get('/api/tags/baz/related', query_string={'limit': 0})
+    assert_response(rd, Response.INPUT_NOT_VALID, {'errors': {'limit': ['must be positive']}})
+
+
 def test_api_bookmark(client):
     url = 'http://google.com'
     rd = client.post('/api/bookmarks', json={})
@@ -288,6 +305,110 @@ def test_api_bookmark_search(client):
     assert_response(rd, Response.SUCCESS, {'bookmarks': []})
 
 
+def test_api_bookmark_search_delete_retains_order(client):
+    for url in ['http://one.com', 'http://two.org', 'http://three.com', 'http://four.org']:
+        rd = client.post('/api/bookmarks', json={'url': url})
+    rd = client.delete('/api/bookmarks/search', data={'keywords': ['.com']})
+    assert_response(rd, Response.SUCCESS, {'deleted': 2})
+    rd = client.get('/api/bookmarks')
+    assert [x['url'] for x in rd.get_json()['bookmarks']] == ['http://two.org', 'http://four.org']
+    rd = client.get('/api/bookmarks/3')
+    assert_response(rd, Response.BOOKMARK_NOT_FOUND)
+
+
+def test_api_bookmarks_paging(client):
+    urls = ['http://one.com', 'http://two.org', 'http://three.com', 'http://four.org', 'http://five.com']
+    for url in urls:
+        rd = client.post('/api/bookmarks', json={'url': url})
+    rd = client.get('/api/bookmarks', query_string={'limit': 2, 'offset': 1})
+    assert [x['url'] for x in rd.get_json()['bookmarks']] == urls[1:3]
+    rd = client.get('/api/bookmarks', query_string={'offset': 3, 'order': '-url'})
+    assert [x['url'] for x in rd.get_json()['bookmarks']] == ['http://four.org', 'http://five.com']
+    rd = client.get('/api/bookmarks/search', query_string={'keywords': ['com'], 'limit': 2, 'offset': 1})
+    assert [(x['index'], x['url']) for x in rd.get_json()['bookmarks']] == [(3, 'http://three.com'), (5, 'http://five.com')]
+    rd = client.get('/api/bookmarks', query_string={'limit': 0})
+    assert_response(rd, Response.INPUT_NOT_VALID, {'errors': {'limit': ['must be positive']}})
+    rd = client.get('/api/bookmarks', query_string={'offset': -1})
+    assert_response(rd, Response.INPUT_NOT_VALID, {'errors': {'offset': ['must not be negative']}})
+    rd = client.get('/api/bookmarks/search', query_string={'keywords': ['com'], 'limit': 0})
+    assert_response(rd, Response.INPUT_NOT_VALID, {'errors': {'limit': ['Number must be at least 1.']}})
+
+
+def test_bukudb_pool(tmp_path):
+    pool = BukuDbPool((tmp_path / 'test.db').as_posix(), max_idle=1)
+    try:
+        assert pool.writer.conn.execute('PRAGMA journal_mode').fetchone() == ('wal',)
+        pool.writer.add_rec('http://example.com', 'Example', delay_commit=True)
+        with pool.reader() as reader1:
+            assert not reader1.get_rec_all()  # uncommitted changes are not visible
+            pool.writer.conn.commit()
+            assert [x.url for x in reader1.get_rec_all()] == ['http://example.com']
+            with pytest.raises(sqlite3.OperationalError, match='readonly'):
+                reader1.conn.execute('DELETE FROM bookmarks')
+            with pool.reader() as reader2:
+                assert reader2 is not reader1
+        with pool.reader() as reader:
+            assert reader is reader2  # reused (reader1 was closed as exceeding max_idle)
+    finally:
+        pool.close()
+
+
+def test_bukudb_pool_db_profile(tmp_path, monkeypatch):
+    monkeypatch.setenv('BUKUSERVER_DB_PROFILE', 'fast')
+    app = server.create_app((tmp_path / 'test.db').as_posix())
+    pool = app.extensions['bukudb']
+    try:
+        assert pool.writer.conn.execute('PRAGMA synchronous').fetchone() == (1,)  # NORMAL
+        with pool.reader() as reader:
+            assert reader.conn.execute('PRAGMA mmap_size').fetchone() == (256 << 20,)
+    finally:
+        pool.close()
+
+
+@pytest.mark.parametrize('immutable', [False, True])
+def test_bukudb_pool_readonly(tmp_path, monkeypatch, immutable):
+    dbfile = (tmp_path / 'test.db').as_posix()
+    pool = BukuDbPool(dbfile)
+    pool.writer.add_rec('http://example.com', 'Example', fetch=False)
+    pool.close()
+    monkeypatch.setenv('BUKUSERVER_READONLY', 'true')
+    monkeypatch.setenv('BUKUSERVER_IMMUTABLE', str(immutable))
+    app = server.create_app(dbfile)
+    pool = app.extensions['bukudb']
+    try:
+        assert pool.readonly and pool.writer.readonly and pool.db_profile == 'readonly'
+        if not immutable:  # (immutable DB is not journalled)
+            assert pool.writer.conn.execute('PRAGMA journal_mode').fetchone() == ('wal',)  # left as is
+        assert pool.writer.conn.execute('PRAGMA mmap_size').fetchone() == (1 << 30,)
+        with pool.reader() as reader1, pool.reader() as reader2:
+            assert reader1.conn is reader2.conn is pool.writer.conn
+            assert reader1.cur is not reader2.cur and reader1.lock is not reader2.lock
+            assert [x.url for x in reader1.get_rec_all()] == ['http://example.com']
+            with pytest.raises(sqlite3.OperationalError, match='readonly'):
+                reader2.cur.execute('DELETE FROM bookmarks')
+        client = app.test_client()
+        assert_response(client.get('/api/bookmarks/1'), Response.SUCCESS,
+                        {'url': 'http://example.com', 'title': 'Example', 'tags': [], 'description': ''})
+        assert_response(client.post('/api/bookmarks', json={'url': 'http://example.org'}), Response.READONLY)
+        assert_response(client.delete('/api/bookmarks/1'), Response.READONLY)
+        assert [x.url for x in pool.writer.get_rec_all()] == ['http://example.com']
+    finally:
+        pool.close()
+
+
+@pytest.mark.parametrize('env_val, dump', [(None, None), ('false', None), ('true', None), ('/tmp/profile.json', '/tmp/profile.json')])
+def test_create_app_profile_sql(monkeypatch, tmp_path, env_val, dump):
+    if env_val is not None:
+        monkeypatch.setenv('BUKUSERVER_PROFILE_SQL', env_val)
+    with mock.patch('bukuserver.server.enable_sql_profiling') as enable_sql_profiling:
+        app = server.create_app((tmp_path / 'test.db').as_posix())
+    app.extensions['bukudb'].close()
+    if env_val in (None, 'false'):
+        enable_sql_profiling.assert_not_called()
+    else:
+        enable_sql_profiling.assert_called_once_with(dump)
+
+
 @pytest.mark.parametrize('env_val, exp_val', [
     ['true', True],
     ['false', False],
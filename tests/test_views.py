@@ -440,3 +440,33 @@ def test_env_locale(bukudb, locale, client):
     dom = assert_response(client.get('/bookmark/'), '/bookmark/')
     for k, v in strings.items():
         assert [s.strip() for s in dom.xpath(k) if s.strip()] == v
+
+
+@pytest.mark.parametrize('search', [False, True])
+def test_bmv_get_list_paging(app, bmv_instance, bukudb, search):
+    urls = ['http://one.com', 'http://two.org', 'http://three.com', 'http://four.org', 'http://five.com']
+    for url in urls:
+        _add_rec(bukudb, url)
+    _filters = bmv_instance._filters
+    idx = next(i for i, flt in enumerate(_filters) if flt.name == 'buku' and not any(flt.params.values()))
+    filters, expected = ([(idx, 'buku', 'com')], [s for s in urls if s.endswith('.com')]) if search else ([], urls)
+    with app.test_request_context():
+        with mock.patch.object(BukuDb, 'searchdb', autospec=True, side_effect=BukuDb.searchdb) as searchdb:
+            count, data = bmv_instance.get_list(1, None, None, None, filters, page_size=2)
+            assert (count, [x.url for x in data]) == (len(expected), expected[2:4])
+            count, data = bmv_instance.get_list(-1, None, None, None, filters, page_size=2)
+            assert (count, [x.url for x in data]) == (len(expected), expected[(len(expected) - 1) // 2 * 2:])
+        if search:  # fetching a count & a page from DB
+            assert [call.kwargs.get('limit') for call in searchdb.call_args_list] == [None, 2, None, 2]
+            assert all(call.args[0].readonly and call.args[0] is not bukudb for call in searchdb.call_args_list)
+
+
+def test_bmv_request_bukudb(app, bmv_instance, bukudb):
+    with app.test_request_context():  # GET
+        reader = bmv_instance.bukudb
+        assert reader is not bukudb and reader.readonly
+        assert bmv_instance.bukudb is reader  # reused within the request
+    with app.test_request_context(method='POST'):
+        assert bmv_instance.bukudb is bukudb
+    with app.app_context():
+        assert bmv_instance.bukudb is bukudb  # no request